@@ -5,33 +5,88 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
-from flask import Flask
-from database import init_database, add_sample_data
+from flask import Flask, g, jsonify, request
+from config import LibraryConfig, active_config, enter_config, leave_config
+from database import init_database, add_sample_data, enter_branch, leave_branch
+from http_encoding import FastJSONProvider, compress_response
 from routes import register_blueprints
+from services.template_cache import install_template_cache, precompile_templates
 
 
-def create_app():
+def create_app(config: LibraryConfig = None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        config: Settings for this app (database file, SQLite tuning, payments);
+                defaults to the process-wide config built from LIBRARY_* variables
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.json = FastJSONProvider(app)
+    app.config['LIBRARY_CONFIG'] = config
     
-    # Initialize the database
-    init_database()
+    token = enter_config(config)
+    try:
+        settings = active_config()
+        
+        # Initialize the database
+        init_database()
+        
+        # Add sample data for testing and demonstration
+        add_sample_data()
+    finally:
+        leave_config(token)
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Share compiled templates between workers through a persistent bytecode cache
+    if settings.template_cache_dir != '':
+        install_template_cache(app, settings.template_cache_dir)
     
     # Register all route blueprints
     register_blueprints(app)
     
+    # Compile every template now so no request pays for it
+    if settings.precompile_templates:
+        precompile_templates(app)
+    
+    # Serve each request with this app's config (database file, PRAGMAs, payment settings)
+    @app.before_request
+    def select_config():
+        if app.config['LIBRARY_CONFIG'] is not None:
+            g.config_token = enter_config(app.config['LIBRARY_CONFIG'])
+    
+    # Compress large responses for clients that accept gzip or brotli
+    app.after_request(compress_response)
+    
+    # Route each request to its branch's database shard
+    @app.before_request
+    def select_branch():
+        branch_id = request.headers.get('X-Branch-Id') or request.args.get('branch')
+        if branch_id:
+            try:
+                g.branch_token = enter_branch(branch_id)
+            except KeyError as e:
+                return jsonify({'error': e.args[0]}), 404
+    
+    @app.teardown_request
+    def release_routing(exc):
+        token = g.pop('branch_token', None)
+        if token is not None:
+            leave_branch(token)
+        token = g.pop('config_token', None)
+        if token is not None:
+            leave_config(token)
+    
     return app
 
 
 if __name__ == '__main__':
+    from services.overdue_sweeper import start_overdue_sweeper
+    from services.fee_ledger import start_fee_accrual
     app = create_app()
+    start_overdue_sweeper()
+    start_fee_accrual()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,203 @@
+"""
+ASGI entry point for the Library Management System.
+
+Serves the async variants of the JSON API (routes/async_api_routes.py)
+directly on the event loop, and runs every other request (HTML pages,
+batch endpoints) through the Flask WSGI app on a thread pool.
+
+Run with any ASGI server, for example:
+    uvicorn asgi:app
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote
+
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.exceptions import HTTPException
+
+import database
+from app import create_app
+from config import use_config
+from http_encoding import compress_body
+from routes.async_api_routes import async_api_map, async_api_handlers
+from services.overdue_sweeper import start_overdue_sweeper, stop_overdue_sweeper
+from services.fee_ledger import start_fee_accrual, stop_fee_accrual
+
+
+class AsyncRequest:
+    """The parts of an HTTP request the async handlers need."""
+
+    def __init__(self, method: str, path: str, args: MultiDict, body: bytes, json_loads, headers: Headers = None):
+        self.method = method
+        self.path = path
+        self.args = args
+        self.headers = headers if headers is not None else Headers()
+        self.body = body
+        self._json_loads = json_loads
+
+    def get_json(self, silent: bool = False):
+        try:
+            return self._json_loads(self.body) if self.body else None
+        except ValueError:
+            if silent:
+                return None
+            raise
+
+
+class LibraryASGIApp:
+    """ASGI application: async API routes natively, everything else via Flask."""
+
+    def __init__(self, flask_app=None, wsgi_threads: int = 16):
+        """
+        Args:
+            flask_app: Flask app for non-async routes (default: create_app())
+            wsgi_threads: Threads used to run Flask requests
+        """
+        self.flask_app = flask_app if flask_app is not None else create_app()
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='library-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = await self._read_body(receive)
+        adapter = async_api_map.bind('localhost', url_scheme=scope.get('scheme', 'http'))
+        try:
+            endpoint, url_args = adapter.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            await self._call_wsgi(scope, body, send)
+            return
+
+        query = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope.get('headers', [])])
+        request = AsyncRequest(scope['method'], scope['path'], query, body, self.flask_app.json.loads, headers)
+        with use_config(self.flask_app.config.get('LIBRARY_CONFIG')):
+            payload, status = await self._call_async(endpoint, request, url_args)
+            body, encoding = compress_body(self.flask_app.json.dumps(payload).encode('utf-8'), 'application/json',
+                                           headers.get('Accept-Encoding'))
+        response_headers = [(b'content-type', b'application/json'), (b'vary', b'Accept-Encoding')]
+        if encoding is not None:
+            response_headers.append((b'content-encoding', encoding.encode()))
+        await self._send(send, status, response_headers, body)
+
+    @staticmethod
+    async def _call_async(endpoint, request: AsyncRequest, url_args):
+        # Route the request to its branch's database shard, as the Flask select_branch hook does
+        branch_id = request.headers.get('X-Branch-Id') or request.args.get('branch')
+        token = None
+        if branch_id:
+            try:
+                token = database.enter_branch(branch_id)
+            except KeyError as e:
+                return {'error': e.args[0]}, 404
+        try:
+            return await async_api_handlers[endpoint](request, **url_args)
+        finally:
+            if token is not None:
+                database.leave_branch(token)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                with use_config(self.flask_app.config.get('LIBRARY_CONFIG')):
+                    start_overdue_sweeper()
+                    start_fee_accrual()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                stop_overdue_sweeper()
+                stop_fee_accrual()
+                self.wsgi_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        return b''.join(chunks)
+
+    @staticmethod
+    async def _send(send, status: int, headers, body: bytes):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers + [(b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _call_wsgi(self, scope, body: bytes, send):
+        environ = self._build_environ(scope, body)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers
+                                   if k.lower() != 'content-length']
+
+        def run():
+            result = self.flask_app(environ, start_response)
+            try:
+                return b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(self.wsgi_executor, run)
+        await self._send(send, response['status'], response['headers'], content)
+
+    @staticmethod
+    def _build_environ(scope, body: bytes) -> dict:
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': unquote(scope['path'], encoding='latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'CONTENT_LENGTH':
+                key = f'HTTP_{name}'
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def create_asgi_app(flask_app=None, wsgi_threads: int = 16) -> LibraryASGIApp:
+    """Create the ASGI application (async serving mode)."""
+    return LibraryASGIApp(flask_app, wsgi_threads)
+
+
+_default_app = None
+
+
+async def app(scope, receive, send):
+    """ASGI callable for `uvicorn asgi:app`; builds the application on first use."""
+    global _default_app
+    if _default_app is None:
+        _default_app = create_asgi_app()
+    await _default_app(scope, receive, send)
@@ -0,0 +1,97 @@
+"""
+Load test: concurrent late fee payments in WSGI mode vs the ASGI serving mode.
+
+Every request pays an overdue fee through the real PaymentGateway, whose
+simulated network delay blocks for 0.5s. In WSGI mode each in-flight
+request holds one worker thread, so throughput is capped by the worker
+count. In ASGI mode requests wait on the event loop and only the gateway
+call uses a pool thread, so the cap is the pool size instead.
+
+Usage:
+    python benchmarks/bench_async_concurrency.py [requests] [wsgi_workers]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import create_app
+from asgi import create_asgi_app
+from services.async_service import DB_EXECUTOR
+
+
+def seed_overdue_loans(count: int):
+    """Give patrons 100000..100000+count one overdue loan each on book 1."""
+    database.update_book_availability(1, count)
+    now = datetime.now()
+    for i in range(count):
+        database.insert_borrow_record(str(100000 + i), 1, now - timedelta(days=20), now - timedelta(days=6))
+
+
+def run_wsgi(flask_app, count: int, workers: int) -> float:
+    client = flask_app.test_client()
+
+    def pay(i):
+        return client.post(f'/api/late_fee/{100000 + i}/1/pay').status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(pay, range(count)))
+    elapsed = time.perf_counter() - start
+    assert all(status == 200 for status in statuses), statuses
+    return elapsed
+
+
+def run_asgi(asgi_app, count: int) -> float:
+    async def pay(i):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': f'/api/late_fee/{100000 + i}/1/pay',
+                 'query_string': b'', 'headers': []}
+        await asgi_app(scope, receive, send)
+        return sent[0]['status']
+
+    async def main():
+        return await asyncio.gather(*(pay(i) for i in range(count)))
+
+    start = time.perf_counter()
+    statuses = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    assert all(status == 200 for status in statuses), statuses
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        flask_app = create_app()
+        seed_overdue_loans(count)
+        wsgi_time = run_wsgi(flask_app, count, workers)
+
+        asgi_time = run_asgi(create_asgi_app(flask_app), count)
+
+    print(f'requests:                 {count} (gateway delay 0.5s each)')
+    print(f'WSGI, {workers:3d} workers:        {wsgi_time:6.2f}s  {count / wsgi_time:6.1f} req/s  '
+          f'max in flight {workers}')
+    print(f'ASGI, {DB_EXECUTOR._max_workers:3d} pool threads:   {asgi_time:6.2f}s  {count / asgi_time:6.1f} req/s  '
+          f'max in flight {count}')
+
+
+if __name__ == '__main__':
+    main()
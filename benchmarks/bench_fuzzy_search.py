@@ -0,0 +1,94 @@
+"""
+Benchmark: typo-tolerant search latency on a large catalog.
+
+Builds a catalog of synthetic titles (2-5 words from a 60k word vocabulary),
+then times search_books_fuzzy() for misspelled query words: the n-gram word
+index plus the full-text index, against fuzzy_scan(), which checks every book.
+
+Usage:
+    python benchmarks/bench_fuzzy_search.py [titles] [queries]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import library_service
+from config import LibraryConfig, use_config
+from services.fuzzy_search import fuzzy_scan, get_catalog_words, max_edits
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tas', 'vor', 'bel', 'dun', 'shi', 'ar', 'quin', 'te', 'pol', 'mar', 'ix', 'ul']
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def misspell(rng: random.Random, word: str) -> str:
+    """Apply up to max_edits(word) random insertions, deletions or substitutions."""
+    for _ in range(rng.randint(1, max(max_edits(word), 1))):
+        i = rng.randrange(len(word))
+        edit = rng.choice('ids')
+        letter = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        word = {'i': word[:i] + letter + word[i:], 'd': word[:i] + word[i + 1:], 's': word[:i] + letter + word[i + 1:]}[edit]
+    return word
+
+
+def build_catalog(rng: random.Random, vocabulary, count: int):
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 1)',
+        ((' '.join(rng.sample(vocabulary, rng.randint(2, 5))).title(), f'Author {i % 20000}', f'{i:013d}')
+         for i in range(count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng, 60_000)
+
+    with tempfile.TemporaryDirectory() as tmp, use_config(LibraryConfig(database_path=os.path.join(tmp, 'fuzzy.db'),
+                                                                        pragma_profile='tmpfs')):
+        database.init_database()
+        start = time.perf_counter()
+        build_catalog(rng, vocabulary, count)
+        print(f'catalog:            {count} titles, built in {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        get_catalog_words()
+        print(f'word index load:    {time.perf_counter() - start:.2f}s (once per process)')
+
+        terms = [misspell(rng, rng.choice(vocabulary)) for _ in range(queries)]
+        latencies, hits = [], 0
+        for term in terms:
+            start = time.perf_counter()
+            books, total = library_service.search_books_fuzzy(term, 'title')
+            latencies.append(time.perf_counter() - start)
+            hits += total > 0
+        latencies.sort()
+        print(f'indexed, {queries} queries: p50 {statistics.median(latencies) * 1000:.1f} ms  '
+              f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms  '
+              f'({hits} with matches)')
+
+        books = database.get_all_books()
+        start = time.perf_counter()
+        for term in terms[:3]:
+            fuzzy_scan(books, term, 'title', 20)
+        print(f'full scan:          {(time.perf_counter() - start) / 3 * 1000:.0f} ms per query')
+
+
+if __name__ == '__main__':
+    main()
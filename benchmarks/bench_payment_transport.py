@@ -0,0 +1,63 @@
+"""
+Throughput benchmark: a new connection per charge vs the shared keep-alive transport.
+
+Runs against the local stub gateway (benchmarks/payment_stub_server.py), so
+no network access is needed. The per-call path mirrors the old
+`requests.post(...)` sketch in PaymentGateway.process_payment.
+
+Usage:
+    python benchmarks/bench_payment_transport.py [charges] [threads]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.payment_stub_server import PaymentStubServer
+from services.payment_service import PaymentGateway
+from services.payment_transport import HTTPPaymentTransport
+
+
+def charge_per_call(url: str, i: int):
+    response = requests.post(f'{url}/charges', headers={'Authorization': 'Bearer test_key_12345'},
+                             json={'customer_id': f'{100000 + i}', 'amount': 5.0, 'currency': 'usd'},
+                             timeout=(3.05, 10))
+    assert response.json()['status'] == 'succeeded'
+
+
+def run(label: str, func, count: int, threads: int, server: PaymentStubServer):
+    opened_before = server.connections
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(func, range(count)))
+    elapsed = time.perf_counter() - start
+    print(f'{label:28s} {elapsed:6.2f}s  {count / elapsed:8.1f} charges/s  '
+          f'{server.connections - opened_before:5d} connections')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with PaymentStubServer() as server:
+        run('new connection per charge', lambda i: charge_per_call(server.url, i), count, threads, server)
+
+        transport = HTTPPaymentTransport(server.url, 'test_key_12345', pool_size=threads)
+        gateway = PaymentGateway(transport=transport)
+
+        def charge_pooled(i):
+            ok, _, message = gateway.process_payment(f'{100000 + i}', 5.0, 'Late fees')
+            assert ok, message
+
+        run('shared keep-alive transport', charge_pooled, count, threads, server)
+        print(f'transport metrics: {transport.metrics()}')
+        transport.close()
+
+
+if __name__ == '__main__':
+    main()
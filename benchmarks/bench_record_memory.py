@@ -0,0 +1,63 @@
+"""
+Memory benchmark: bytes per catalog record as dicts vs slotted Book records.
+
+Usage:
+    python benchmarks/bench_record_memory.py [record_count]
+"""
+
+import os
+import sqlite3
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import BOOK_COLUMNS, book_row_factory
+
+
+def build_catalog(count: int) -> sqlite3.Connection:
+    """Create an in-memory books table with `count` rows."""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Title {i}', f'Author {i % 500}', f'{i:013d}', 3, 3) for i in range(count))
+    )
+    return conn
+
+
+def measure(conn: sqlite3.Connection, row_factory, convert) -> int:
+    """Return the bytes allocated to hold the fetched catalog."""
+    conn.row_factory = row_factory
+    tracemalloc.start()
+    records = convert(conn.execute(f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title').fetchall())
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    conn = build_catalog(count)
+
+    before = measure(conn, sqlite3.Row, lambda rows: [dict(row) for row in rows])
+    after = measure(conn, book_row_factory, lambda rows: rows)
+
+    print(f'records:          {count}')
+    print(f'dict rows:        {before / count:8.1f} bytes/record')
+    print(f'Book records:     {after / count:8.1f} bytes/record')
+    print(f'saving:           {100 * (1 - after / before):8.1f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: first-render latency of the HTML pages with and without precompiled templates.
+
+Each trial builds a fresh app, as a new worker would after a deploy or a
+scale-out, and times its startup and the first and second request to every
+page. Three setups are compared:
+- lazy: no bytecode cache; each template is compiled on its first render
+- bytecode cache: templates are loaded from a cache filled by the build step
+- precompiled: the cache, plus create_app() loading every template at startup
+
+Usage:
+    python benchmarks/bench_template_render.py [trials]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import LibraryConfig
+from services.template_cache import build_template_cache
+
+PAGES = ['/catalog', '/search?q=gatsby&type=title', '/add_book', '/return', '/patron/123456']
+
+
+def time_trial(config: LibraryConfig):
+    """Return (startup seconds, {page: (first request seconds, second request seconds)})."""
+    start = time.perf_counter()
+    app = create_app(config)
+    startup = time.perf_counter() - start
+    client = app.test_client()
+    pages = {}
+    for page in PAGES:
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            assert client.get(page).status_code == 200, page
+            timings.append(time.perf_counter() - start)
+        pages[page] = tuple(timings)
+    return startup, pages
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'jinja')
+        build_template_cache(cache_dir)
+        setups = {
+            'lazy': dict(template_cache_dir='', precompile_templates=False),
+            'bytecode cache': dict(template_cache_dir=cache_dir, precompile_templates=False),
+            'precompiled': dict(template_cache_dir=cache_dir, precompile_templates=True),
+        }
+
+        print(f'trials: {trials}, median milliseconds')
+        print(f"{'setup':16s} {'startup':>8s} {'first (mean)':>13s} {'first (worst)':>13s} {'warm':>7s}")
+        for name, options in setups.items():
+            startups, firsts, warms = [], [], []
+            for trial in range(trials):
+                config = LibraryConfig(database_path=os.path.join(tmp, f'{trial}.db'), pragma_profile='tmpfs', **options)
+                startup, pages = time_trial(config)
+                startups.append(startup)
+                firsts.append([first for first, _ in pages.values()])
+                warms.extend(warm for _, warm in pages.values())
+            first = statistics.median(sum(times) / len(times) for times in firsts)
+            worst = statistics.median(max(times) for times in firsts)
+            print(f'{name:16s} {statistics.median(startups) * 1000:8.2f} {first * 1000:13.2f} '
+                  f'{worst * 1000:13.2f} {statistics.median(warms) * 1000:7.2f}')
+            for trial in range(trials):
+                os.remove(os.path.join(tmp, f'{trial}.db'))
+
+
+if __name__ == '__main__':
+    main()
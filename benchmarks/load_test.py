@@ -0,0 +1,345 @@
+"""
+Load generator: a realistic mix of library traffic against the Flask app.
+
+Worker threads act as a synthetic population of patrons. Each request is
+drawn from a weighted mix of catalog views, searches, borrows, returns, late
+fee lookups and fee payments. Requests go through Flask's test client
+(in-process) or over a local socket to a threaded werkzeug server. Payments
+are charged over HTTP against the local stub gateway
+(benchmarks/payment_stub_server.py), so no network access is needed.
+
+The report gives throughput, error rate (5xx and exceptions), rejections
+(4xx or success=false, e.g. a book that is out) and latency percentiles per
+endpoint.
+
+Usage:
+    python benchmarks/load_test.py [--duration 10] [--workers 8] [--socket]
+        [--mix catalog=30,search=25,borrow=15,return=15,late_fee=10,pay=5]
+        [--books 500] [--patrons 200] [--gateway-latency-ms 20] [--seed 1]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+DEFAULT_MIX = {'catalog': 30, 'search': 25, 'borrow': 15, 'return': 15, 'late_fee': 10, 'pay': 5}
+
+_WORDS = ['river', 'night', 'garden', 'empire', 'winter', 'shadow', 'glass', 'city', 'ocean', 'silent',
+          'iron', 'summer', 'hidden', 'golden', 'last', 'wild', 'paper', 'stone', 'north', 'storm']
+_NAMES = ['Austen', 'Baldwin', 'Calvino', 'Dickens', 'Eliot', 'Faulkner', 'Gaskell', 'Hardy', 'Ishiguro',
+          'Joyce', 'Kafka', 'Le Guin', 'Morrison', 'Nabokov', 'Orwell', 'Pratchett']
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse 'catalog=30,search=25,...' into operation weights."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown operation '{name}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight)
+    return mix
+
+
+class Population:
+    """Synthetic books, patrons and loans, plus the loans the load test has made since."""
+
+    def __init__(self, books: int = 500, patrons: int = 200, overdue_fraction: float = 0.3, seed: int = 1):
+        self.book_count = books
+        self.patrons = [str(200000 + i) for i in range(patrons)]
+        self.overdue_fraction = overdue_fraction
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.book_ids: List[int] = []
+        self.loans: List[Tuple[str, int]] = []
+        self.overdue: List[Tuple[str, int]] = []
+
+    def seed(self) -> None:
+        """Insert the books and an overdue loan for a share of the patrons into database.DATABASE."""
+        rng = self._rng
+        conn = database.get_db_connection()
+        with conn:
+            conn.executemany('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)
+            ''', [(f'The {rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()} {i}', rng.choice(_NAMES),
+                   f'{9700000000000 + i}', copies, copies)
+                  for i, copies in ((i, rng.randint(1, 4)) for i in range(self.book_count))])
+        self.book_ids = [row['id'] for row in conn.execute('SELECT id FROM books WHERE available_copies > 0')]
+        conn.close()
+
+        now = datetime.now()
+        for patron_id in rng.sample(self.patrons, int(len(self.patrons) * self.overdue_fraction)):
+            book_id = rng.choice(self.book_ids)
+            if database.get_book_by_id(book_id).available_copies <= 0:
+                continue
+            days_late = rng.randint(1, 20)
+            database.insert_borrow_record(patron_id, book_id, now - timedelta(days=14 + days_late),
+                                          now - timedelta(days=days_late))
+            database.update_book_availability(book_id, -1)
+            self.loans.append((patron_id, book_id))
+            self.overdue.append((patron_id, book_id))
+
+    def add_loan(self, loan: Tuple[str, int]) -> None:
+        with self._lock:
+            self.loans.append(loan)
+
+    def take_loan(self, rng: random.Random) -> Optional[Tuple[str, int]]:
+        """Remove and return a random open loan (to be returned), or None."""
+        with self._lock:
+            if not self.loans:
+                return None
+            loan = self.loans.pop(rng.randrange(len(self.loans)))
+            if loan in self.overdue:
+                self.overdue.remove(loan)
+            return loan
+
+    def any_overdue(self, rng: random.Random) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            return rng.choice(self.overdue) if self.overdue else None
+
+    def take_overdue(self, rng: random.Random) -> Optional[Tuple[str, int]]:
+        """Remove and return a random overdue loan (to be paid), or None."""
+        with self._lock:
+            return self.overdue.pop(rng.randrange(len(self.overdue))) if self.overdue else None
+
+
+class InProcessClient:
+    """Sends requests through Flask's test client; one per worker thread."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method: str, path: str, json: Dict = None) -> Tuple[int, Optional[Dict]]:
+        response = self._client.open(path, method=method, json=json)
+        return response.status_code, response.get_json(silent=True)
+
+
+class SocketClient:
+    """Sends requests over a keep-alive HTTP session; one per worker thread."""
+
+    def __init__(self, base_url: str):
+        import requests
+        self._base_url = base_url
+        self._session = requests.Session()
+
+    def request(self, method: str, path: str, json: Dict = None) -> Tuple[int, Optional[Dict]]:
+        response = self._session.request(method, self._base_url + path, json=json, timeout=30)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+
+class LoadStats:
+    """Per-endpoint latencies and outcome counts, shared by the workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+
+    def record(self, operation: str, seconds: float, outcome: str) -> None:
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(seconds)
+            if outcome == 'error':
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+            elif outcome == 'rejected':
+                self.rejected[operation] = self.rejected.get(operation, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        """Throughput, error rate and latency percentiles (ms) per operation, plus a 'total' row."""
+        rows = {}
+        everything = []
+        for operation, latencies in sorted(self.latencies.items()):
+            everything.extend(latencies)
+            rows[operation] = self._row(latencies, self.errors.get(operation, 0),
+                                        self.rejected.get(operation, 0), elapsed)
+        rows['total'] = self._row(everything, sum(self.errors.values()), sum(self.rejected.values()), elapsed)
+        return rows
+
+    @staticmethod
+    def _row(latencies: List[float], errors: int, rejected: int, elapsed: float) -> Dict:
+        ordered = sorted(latencies)
+
+        def percentile(p):
+            # Nearest-rank percentile
+            return round(ordered[max(0, -(-len(ordered) * p // 100) - 1)] * 1000, 2) if ordered else 0.0
+
+        return {
+            'requests': len(ordered),
+            'per_second': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': round(errors / len(ordered), 4) if ordered else 0.0,
+            'rejected': rejected,
+            'p50_ms': percentile(50),
+            'p90_ms': percentile(90),
+            'p99_ms': percentile(99),
+            'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        }
+
+
+def _operations(population: Population) -> Dict[str, Callable]:
+    """Each operation returns (method, path, json body, loan to record on success) or None to skip."""
+
+    def catalog(rng):
+        return 'GET', '/catalog', None, None
+
+    def search(rng):
+        if rng.random() < 0.7:
+            return 'GET', f'/api/search?q={rng.choice(_WORDS)}&type=title', None, None
+        return 'GET', f'/api/search?q={rng.choice(_NAMES).lower()}&type=author', None, None
+
+    def borrow(rng):
+        loan = (rng.choice(population.patrons), rng.choice(population.book_ids))
+        return 'POST', '/api/borrow/batch', {'patron_id': loan[0], 'book_ids': [loan[1]]}, loan
+
+    def return_(rng):
+        loan = population.take_loan(rng)
+        if loan is None:
+            return None
+        return 'POST', '/api/return/batch', {'patron_id': loan[0], 'book_ids': [loan[1]]}, None
+
+    def late_fee(rng):
+        loan = population.any_overdue(rng) or (rng.choice(population.patrons), rng.choice(population.book_ids))
+        return 'GET', f'/api/late_fee/{loan[0]}/{loan[1]}', None, None
+
+    def pay(rng):
+        loan = population.take_overdue(rng)
+        if loan is None:
+            return None
+        return 'POST', f'/api/late_fee/{loan[0]}/{loan[1]}/pay', None, None
+
+    return {'catalog': catalog, 'search': search, 'borrow': borrow, 'return': return_,
+            'late_fee': late_fee, 'pay': pay}
+
+
+def run_load(client_factory: Callable[[], object], population: Population, mix: Dict[str, float] = None,
+             workers: int = 8, duration: float = None, total_requests: int = None, seed: int = 1) -> Dict:
+    """
+    Drive the app with `workers` threads until `duration` seconds pass or
+    `total_requests` have been sent, whichever is set (and comes first).
+
+    Returns:
+        dict: elapsed seconds and the LoadStats.report() rows under 'endpoints'
+    """
+    if duration is None and total_requests is None:
+        raise ValueError('Set a duration or a number of requests')
+    mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+    operations = _operations(population)
+    names, weights = list(mix), list(mix.values())
+    stats = LoadStats()
+    budget = iter(range(total_requests)) if total_requests is not None else None
+    budget_lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        client = client_factory()
+        while deadline is None or time.perf_counter() < deadline:
+            if budget is not None:
+                with budget_lock:
+                    if next(budget, None) is None:
+                        return
+            name = rng.choices(names, weights)[0]
+            planned = operations[name](rng)
+            if planned is None:  # nothing to return or pay yet; browse instead
+                name, planned = 'catalog', operations['catalog'](rng)
+            method, path, body, loan = planned
+            sent = time.perf_counter()
+            try:
+                status, reply = client.request(method, path, body)
+            except Exception:
+                stats.record(name, time.perf_counter() - sent, 'error')
+                continue
+            if status >= 500:
+                outcome = 'error'
+            elif status >= 400 or (isinstance(reply, dict) and reply.get('success') is False):
+                outcome = 'rejected'
+            else:
+                outcome = 'ok'
+                if loan is not None:
+                    population.add_loan(loan)
+            stats.record(name, time.perf_counter() - sent, outcome)
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f'load-{i}') for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {'elapsed': round(elapsed, 3), 'endpoints': stats.report(elapsed)}
+
+
+def print_report(result: Dict) -> None:
+    print(f"{'endpoint':10s} {'requests':>8s} {'req/s':>8s} {'errors':>7s} {'err%':>6s} {'rejected':>8s} "
+          f"{'p50 ms':>8s} {'p90 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+    for name, row in result['endpoints'].items():
+        print(f"{name:10s} {row['requests']:8d} {row['per_second']:8.1f} {row['errors']:7d} "
+              f"{row['error_rate'] * 100:6.2f} {row['rejected']:8d} {row['p50_ms']:8.2f} {row['p90_ms']:8.2f} "
+              f"{row['p99_ms']:8.2f} {row['max_ms']:8.2f}")
+    print(f"elapsed {result['elapsed']}s")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python benchmarks/load_test.py', description=__doc__.split('\n')[1])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=None, help='stop after this many requests instead')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--socket', action='store_true', help='serve over a local socket instead of in-process')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--books', type=int, default=500)
+    parser.add_argument('--patrons', type=int, default=200)
+    parser.add_argument('--gateway-latency-ms', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from benchmarks.payment_stub_server import PaymentStubServer
+    from services import payment_transport
+
+    with tempfile.TemporaryDirectory() as tmp, PaymentStubServer(latency=args.gateway_latency_ms / 1000) as stub:
+        database.DATABASE = os.path.join(tmp, 'load.db')
+        os.environ['PAYMENT_GATEWAY_URL'] = stub.url
+        app = create_app()
+        population = Population(args.books, args.patrons, seed=args.seed)
+        population.seed()
+
+        server = None
+        if args.socket:
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, name='load-server', daemon=True).start()
+            url = f'http://127.0.0.1:{server.server_port}'
+            client_factory = lambda: SocketClient(url)
+        else:
+            client_factory = lambda: InProcessClient(app)
+
+        try:
+            result = run_load(client_factory, population, args.mix, args.workers,
+                              None if args.requests else args.duration, args.requests, args.seed)
+        finally:
+            if server is not None:
+                server.shutdown()
+            payment_transport.close_shared_transports()
+    print_report(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Local stand-in for the payment gateway HTTP API.
+
+Speaks the same JSON protocol PaymentGateway uses over HTTPPaymentTransport
+(POST /charges, POST /refunds, GET /charges/<id>) with HTTP/1.1 keep-alive,
+so the transport can be tested and benchmarked offline. Counts accepted TCP
+connections, which shows whether clients reuse them.
+
+Usage:
+    python benchmarks/payment_stub_server.py [port] [latency_ms]
+"""
+
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, delayed ACKs stall kept-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self._read_json()
+        stub.pause()
+        if self.path == '/charges':
+            self._reply(*stub.charge(body, self.headers.get('Idempotency-Key')))
+        elif self.path == '/refunds':
+            self._reply(*stub.refund(body))
+        else:
+            self._reply(404, {'message': 'Not found'})
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.pause()
+        charge = stub.charges.get(self.path.rsplit('/', 1)[-1]) if self.path.startswith('/charges/') else None
+        if charge is None:
+            self._reply(404, {'status': 'not_found', 'message': 'Transaction not found'})
+        else:
+            self._reply(200, charge)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, stub):
+        self.stub = stub
+        super().__init__(address, _Handler)
+
+    def process_request(self, request, client_address):
+        with self.stub._lock:
+            self.stub.connections += 1
+        super().process_request(request, client_address)
+
+
+class PaymentStubServer:
+    """Threaded stub gateway on 127.0.0.1; use as a context manager."""
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        """
+        Args:
+            port: Port to listen on (0 picks a free one)
+            latency: Seconds each request takes (simulated processing time)
+        """
+        self.latency = latency
+        self.connections = 0
+        self.charges = {}
+        self._idempotent = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', port), self)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def pause(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def charge(self, body: dict, idempotency_key: str = None):
+        with self._lock:
+            if idempotency_key in self._idempotent:
+                return self._idempotent[idempotency_key]
+            amount = body.get('amount', 0)
+            if amount <= 0:
+                reply = 402, {'status': 'declined', 'message': 'Invalid amount: must be greater than 0'}
+            elif amount > 1000:
+                reply = 402, {'status': 'declined', 'message': 'Payment declined: amount exceeds limit'}
+            else:
+                txn = f"txn_{body.get('customer_id')}_{next(self._ids)}"
+                self.charges[txn] = {'transaction_id': txn, 'status': 'completed', 'amount': amount,
+                                     'timestamp': time.time()}
+                reply = 200, {'id': txn, 'status': 'succeeded',
+                              'message': f'Payment of ${amount:.2f} processed successfully'}
+            if idempotency_key:
+                self._idempotent[idempotency_key] = reply
+            return reply
+
+    def refund(self, body: dict):
+        with self._lock:
+            if body.get('charge') not in self.charges:
+                return 404, {'status': 'failed', 'message': 'Invalid transaction ID'}
+            refund_id = f"refund_{body['charge']}_{next(self._ids)}"
+            return 200, {'id': refund_id, 'status': 'succeeded',
+                         'message': f"Refund of ${body.get('amount', 0):.2f} processed successfully. "
+                                    f"Refund ID: {refund_id}"}
+
+    def start(self) -> 'PaymentStubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), name='payment-stub',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    server = PaymentStubServer(port, latency).start()
+    print(f'payment stub listening on {server.url} (Ctrl+C to stop)')
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,156 @@
+"""
+Config Module - Settings for one Library Management System instance
+
+LibraryConfig holds the settings for one instance:
+- the database file
+- SQLite tuning: the PRAGMA profile, page cache size and busy timeout
+- the database thread pool size
+- payment gateway settings
+- the compiled template cache (services/template_cache.py)
+- the response compression threshold (http_encoding.py)
+
+Pass one to create_app(config). Database helpers and the payment gateway
+read the config that is active for the current request, or for a
+use_config() block. Outside those, they use the process default, which is
+built like LibraryConfig.load(): the LIBRARY_CONFIG file, if set, then
+LIBRARY_* environment variables.
+
+Values can come from a TOML file, from the environment, or both:
+    config = LibraryConfig.load('library.toml')  # file values, then LIBRARY_* overrides
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import Dict, List, Mapping, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+ENV_PREFIX = 'LIBRARY_'
+
+# PRAGMAs applied to every new connection, by profile
+PRAGMA_PROFILES: Dict[str, Dict[str, str]] = {
+    'default': {},
+    # Readers keep going while a write commits; fsync only at checkpoints
+    'wal': {'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+    # Throwaway databases (tmpfs, tests, benchmarks): no durability at all
+    'tmpfs': {'journal_mode': 'MEMORY', 'synchronous': 'OFF', 'temp_store': 'MEMORY'},
+}
+
+_INT_FIELDS = {'sqlite_cache_kib', 'db_threads', 'payment_pool_size', 'compression_min_bytes'}
+_FLOAT_FIELDS = {'busy_timeout'}
+_BOOL_FIELDS = {'precompile_templates'}
+
+
+@dataclass
+class LibraryConfig:
+    """Settings for one library instance; see the module docstring."""
+
+    database_path: Optional[str] = None  # None: database.DATABASE
+    pragma_profile: str = 'default'
+    sqlite_cache_kib: Optional[int] = None  # None: SQLite's default (2 MiB)
+    busy_timeout: float = 5.0  # seconds a connection waits for a lock
+    db_threads: int = 16  # database thread pool used by the async serving mode
+    payment_gateway_url: Optional[str] = None  # None: PAYMENT_GATEWAY_URL, else simulated payments
+    payment_api_key: str = 'test_key_12345'
+    payment_pool_size: int = 10  # kept-alive connections to the gateway
+    template_cache_dir: Optional[str] = None  # None: build/jinja in the project; '' turns the cache off
+    precompile_templates: bool = True  # compile every template in create_app, not on first render
+    compression_min_bytes: int = 1024  # smaller responses are sent uncompressed (http_encoding.py)
+
+    def __post_init__(self):
+        if self.pragma_profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown PRAGMA profile '{self.pragma_profile}' "
+                             f"(choose from {', '.join(PRAGMA_PROFILES)})")
+        for name in ('db_threads', 'payment_pool_size'):
+            if getattr(self, name) < 1:
+                raise ValueError(f'{name} must be at least 1')
+        for name in ('sqlite_cache_kib', 'compression_min_bytes'):
+            if getattr(self, name) is not None and getattr(self, name) < 0:
+                raise ValueError(f'{name} must not be negative')
+
+    def pragmas(self) -> List[Tuple[str, str]]:
+        """PRAGMA (name, value) pairs to run on each new connection."""
+        pragmas = list(PRAGMA_PROFILES[self.pragma_profile].items())
+        if self.sqlite_cache_kib is not None:
+            pragmas.append(('cache_size', str(-self.sqlite_cache_kib)))  # negative means KiB
+        return pragmas
+
+    @classmethod
+    def from_mapping(cls, values: Mapping, base: 'LibraryConfig' = None) -> 'LibraryConfig':
+        """Build a config from field names to values (strings are converted), on top of `base`."""
+        settings = {f.name: getattr(base, f.name) for f in fields(cls)} if base else {}
+        names = {f.name for f in fields(cls)}
+        for name, value in values.items():
+            if name not in names:
+                raise ValueError(f"Unknown setting '{name}'")
+            if isinstance(value, str):
+                if name in _INT_FIELDS:
+                    value = int(value)
+                elif name in _FLOAT_FIELDS:
+                    value = float(value)
+                elif name in _BOOL_FIELDS:
+                    value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+            settings[name] = value
+        return cls(**settings)
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = None, base: 'LibraryConfig' = None) -> 'LibraryConfig':
+        """Read LIBRARY_<SETTING> variables, e.g. LIBRARY_DATABASE_PATH or LIBRARY_DB_THREADS."""
+        environ = os.environ if environ is None else environ
+        values = {f.name: environ[ENV_PREFIX + f.name.upper()]
+                  for f in fields(cls) if ENV_PREFIX + f.name.upper() in environ}
+        return cls.from_mapping(values, base)
+
+    @classmethod
+    def from_toml(cls, path: str, base: 'LibraryConfig' = None) -> 'LibraryConfig':
+        """Read settings from a TOML file: top-level keys or a [library] table."""
+        if tomllib is None:
+            raise RuntimeError("Reading TOML needs Python 3.11+ or the 'tomli' package")
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+        return cls.from_mapping(data.get('library', data), base)
+
+    @classmethod
+    def load(cls, path: str = None, environ: Mapping[str, str] = None) -> 'LibraryConfig':
+        """Defaults, then the TOML file (`path` or LIBRARY_CONFIG), then LIBRARY_* variables."""
+        environ = os.environ if environ is None else environ
+        path = path or environ.get(ENV_PREFIX + 'CONFIG')
+        base = cls.from_toml(path) if path else None
+        return cls.from_env(environ, base)
+
+
+_default_config = LibraryConfig.load()
+_active_config = contextvars.ContextVar('library_config', default=None)
+
+
+def active_config() -> LibraryConfig:
+    """The config set by the innermost use_config() or request, else the process default."""
+    return _active_config.get() or _default_config
+
+
+def enter_config(config: Optional[LibraryConfig]) -> contextvars.Token:
+    """Make `config` active (None: the default) until leave_config() is called with the returned token."""
+    return _active_config.set(config)
+
+
+def leave_config(token: contextvars.Token) -> None:
+    """Restore the config that was active before enter_config()."""
+    _active_config.reset(token)
+
+
+@contextmanager
+def use_config(config: Optional[LibraryConfig]):
+    """Make `config` the active config for the duration of the block."""
+    token = enter_config(config)
+    try:
+        yield config
+    finally:
+        leave_config(token)
@@ -1,9 +1,46 @@
+import os
+import shutil
+
 import pytest
+
+import database
 from services import library_service as svc
 
+# Set by pytest-xdist in each worker process (`pytest -n auto`); "main" when running serially
+WORKER = os.environ.get("PYTEST_XDIST_WORKER", "main")
+
 @pytest.fixture(autouse=True)
 def _isolate_sample_test(monkeypatch, request):
     path = str(getattr(request.node, "fspath", ""))
     if path.endswith("sample_test.py"):
         monkeypatch.setattr(svc, "get_book_by_isbn", lambda _: None, raising=False)
         monkeypatch.setattr(svc, "insert_book", lambda *a, **k: True, raising=False)
+
+@pytest.fixture(autouse=True)
+def _private_database(monkeypatch, tmp_path):
+    # Never share ./library.db between tests or workers; fixtures below may swap in a populated copy
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+
+@pytest.fixture(scope="session")
+def template_database(tmp_path_factory):
+    """Schema plus sample data, built once per worker; copying it beats rerunning init_database()."""
+    path = str(tmp_path_factory.mktemp(f"template-{WORKER}") / "template.db")
+    with database.use_database(path):
+        database.init_database()
+        database.add_sample_data()
+    return path
+
+@pytest.fixture
+def library_db(template_database, tmp_path, monkeypatch):
+    """A test-private copy of the template database, made the default database."""
+    path = str(tmp_path / "library.db")
+    shutil.copyfile(template_database, path)
+    monkeypatch.setattr(database, "DATABASE", path)
+    return path
+
+@pytest.fixture
+def library_app(library_db):
+    """A Flask app bound to the test's private database."""
+    from app import create_app
+    from config import LibraryConfig
+    return create_app(LibraryConfig(database_path=library_db))
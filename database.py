@@ -3,19 +3,145 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import contextvars
+import dataclasses
+import json
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
-# Database configuration
+from config import LibraryConfig, active_config, use_config
+from models import BOOK_COLUMNS, LOAN_COLUMNS, Book, Loan, book_row_factory, loan_row_factory
+
+# Database configuration: the file used when the active config (config.py) names none
 DATABASE = 'library.db'
 
+# Branch shards: branch id -> database file (see configure_branches). Each
+# branch's catalog and loans live in their own file, so branches never wait
+# on each other's write lock. With no branches configured, everything uses DATABASE.
+BRANCH_DATABASES: Dict[str, str] = {}
+_active_branch = contextvars.ContextVar('active_branch', default=None)
+
+# Late fee schedule (R5): $0.50/day for the first 7 days overdue, $1.00/day after that, capped per book
+LATE_FEE_DAILY_RATE = 0.50
+LATE_FEE_EXTENDED_RATE = 1.00
+LATE_FEE_TIER_DAYS = 7
+MAX_LATE_FEE = 15.00
+
+# Retention for the change logs: each keeps its newest rows and, every
+# CHANGE_LOG_PRUNE_INTERVAL inserts, deletes the older ones and records the
+# last deleted seq in change_log_pruned, so readers that fell further behind
+# know to reload instead of applying an incomplete list of changes
+CATALOG_CHANGES_KEPT = 10000
+CHANGE_FEED_KEPT = 100000
+CHANGE_LOG_PRUNE_INTERVAL = 1000
+
+# An event for the events table: (type, patron_id, book_id, payload data). The
+# mutation helpers below take a list of them and insert them in their own
+# transaction, so the log never misses or invents a change (services/event_log.py).
+Event = Tuple[str, Optional[str], Optional[int], Dict]
+
+def _late_fee_sql(days: str) -> str:
+    """SQL expression for the late fee owed after `days` days overdue."""
+    return f'''MIN({MAX_LATE_FEE}, CASE
+        WHEN {days} <= 0 THEN 0
+        WHEN {days} <= {LATE_FEE_TIER_DAYS} THEN {days} * {LATE_FEE_DAILY_RATE}
+        ELSE {LATE_FEE_TIER_DAYS * LATE_FEE_DAILY_RATE} + ({days} - {LATE_FEE_TIER_DAYS}) * {LATE_FEE_EXTENDED_RATE}
+    END)'''
+
+_RETURN_DAYS_SQL = "CAST(julianday(date(NEW.return_date)) - julianday(date(NEW.due_date)) AS INTEGER)"
+_ACCRUAL_DAYS_SQL = "CAST(julianday(:today) - julianday(date(br.due_date)) AS INTEGER)"
+
+def database_path(branch_id: Optional[str] = None) -> str:
+    """
+    Database file for a branch, defaulting to the branch made active by use_branch().
+
+    Raises:
+        KeyError: Branches are configured and `branch_id` is not one of them
+    """
+    if branch_id is None:
+        branch_id = _active_branch.get()
+    if branch_id is None or not BRANCH_DATABASES:
+        return active_config().database_path or DATABASE
+    if branch_id not in BRANCH_DATABASES:
+        raise KeyError(f"Unknown branch: {branch_id}")
+    return BRANCH_DATABASES[branch_id]
+
+def enter_branch(branch_id: Optional[str]) -> contextvars.Token:
+    """Make `branch_id` the active branch until leave_branch() is called with the returned token."""
+    database_path(branch_id)  # fail fast on unknown branches
+    return _active_branch.set(branch_id)
+
+def leave_branch(token: contextvars.Token) -> None:
+    """Restore the branch that was active before enter_branch()."""
+    _active_branch.reset(token)
+
+@contextmanager
+def use_branch(branch_id: Optional[str]):
+    """Route every helper in this module to a branch's shard for the duration of the block."""
+    token = enter_branch(branch_id)
+    try:
+        yield
+    finally:
+        leave_branch(token)
+
+@contextmanager
+def use_database(path: Optional[str]):
+    """Route every helper in this module to the database file at `path` (None: DATABASE) for the block."""
+    with use_config(dataclasses.replace(active_config(), database_path=path)):
+        yield
+
+def active_branch() -> Optional[str]:
+    """The branch id set by the innermost use_branch(), or None."""
+    return _active_branch.get()
+
+def branch_ids() -> List[Optional[str]]:
+    """Configured branch ids, or [None] when the library is not sharded."""
+    return list(BRANCH_DATABASES) or [None]
+
+def configure_branches(branches: Dict[str, str]) -> None:
+    """
+    Shard the library by branch and create any missing tables in each shard.
+
+    Args:
+        branches: Branch id -> database file
+    """
+    BRANCH_DATABASES.clear()
+    BRANCH_DATABASES.update(branches)
+    for branch_id in branches:
+        with use_branch(branch_id):
+            init_database()
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+    """Get a database connection to the active branch's shard, tuned by the active config."""
+    return connect(database_path())
+
+def connect(path: str, config: Optional[LibraryConfig] = None) -> sqlite3.Connection:
+    """Open a database file with the busy timeout and PRAGMAs of `config` (default: the active config)."""
+    config = config or active_config()
+    conn = sqlite3.connect(path, timeout=config.busy_timeout)
+    for name, value in config.pragmas():
+        conn.execute(f'PRAGMA {name} = {value}')
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
+# A copy coming back goes to the oldest waiting holds before the shelf
+_ALLOCATE_HOLDS_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS books_allocate_holds
+    AFTER UPDATE OF available_copies ON books
+    WHEN NEW.available_copies > OLD.available_copies AND NEW.available_copies > 0
+        AND EXISTS (SELECT 1 FROM holds WHERE book_id = NEW.id AND status = 'waiting')
+    BEGIN
+        UPDATE holds SET status = 'ready', ready_at = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')
+        WHERE id IN (
+            SELECT id FROM holds WHERE book_id = NEW.id AND status = 'waiting' ORDER BY id
+            LIMIT MIN(NEW.available_copies, NEW.available_copies - OLD.available_copies)
+        );
+        UPDATE books SET available_copies = available_copies - changes() WHERE id = NEW.id;
+    END
+'''
+
 def init_database():
     """Initialize the database with required tables."""
     conn = get_db_connection()
@@ -45,9 +171,192 @@ def init_database():
         )
     ''')
     
+    # Change counter for books: every insert/update/delete logs the book id,
+    # so in-memory catalog snapshots can refresh only the rows that changed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL
+        )
+    ''')
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS books_after_insert AFTER INSERT ON books
+        BEGIN INSERT INTO catalog_changes (book_id) VALUES (NEW.id); END;
+        CREATE TRIGGER IF NOT EXISTS books_after_update AFTER UPDATE ON books
+        BEGIN INSERT INTO catalog_changes (book_id) VALUES (NEW.id); END;
+        CREATE TRIGGER IF NOT EXISTS books_after_delete AFTER DELETE ON books
+        BEGIN INSERT INTO catalog_changes (book_id) VALUES (OLD.id); END;
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_pruned (
+            log TEXT PRIMARY KEY,
+            through INTEGER NOT NULL
+        )
+    ''')
+    _create_prune_trigger(conn, 'catalog_changes', CATALOG_CHANGES_KEPT)
+    
+    # Full-text index over titles and authors, used for BM25 relevance ranking
+    _create_books_fts(conn)
+    
+    # Change feed for downstream consumers (/api/changes): one row per
+    # insert/update/delete on books and borrow_records, in commit order
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_feed (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+        )
+    ''')
+    for table, entity in (('books', 'book'), ('borrow_records', 'loan')):
+        for op, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_feed_{op.lower()} AFTER {op} ON {table}
+                BEGIN INSERT INTO change_feed (entity, entity_id, op) VALUES ('{entity}', {row}.id, '{op.lower()}'); END
+            ''')
+    _create_prune_trigger(conn, 'change_feed', CHANGE_FEED_KEPT)
+    
+    # Late fee ledger: one row per overdue loan, advanced once a day by
+    # accrue_fees() and settled by the trigger below when the book comes back
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fees (
+            borrow_record_id INTEGER PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            days_overdue INTEGER NOT NULL,
+            accrued REAL NOT NULL,
+            paid REAL NOT NULL DEFAULT 0,
+            accrued_through TEXT NOT NULL,
+            FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fee_payments (
+            transaction_id TEXT PRIMARY KEY,
+            borrow_record_id INTEGER NOT NULL,
+            patron_id TEXT NOT NULL,
+            amount REAL NOT NULL,
+            refunded REAL NOT NULL DEFAULT 0,
+            paid_at TEXT NOT NULL,
+            gateway_status TEXT,
+            gateway_amount REAL,
+            mismatch TEXT,
+            verified_at TEXT,
+            FOREIGN KEY (borrow_record_id) REFERENCES fees (borrow_record_id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_fee_payments_unverified ON fee_payments (verified_at, paid_at)')
+    # Append-only log of library operations (see services/event_log.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts TEXT NOT NULL,
+            type TEXT NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            payload TEXT NOT NULL
+        )
+    ''')
+    
+    # Idempotency keys for payment submissions (see services/payment_orchestrator.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payment_requests (
+            idempotency_key TEXT PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER,
+            amount REAL NOT NULL,
+            description TEXT,
+            status TEXT NOT NULL,
+            transaction_id TEXT,
+            message TEXT,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    # Tables created before the book and description were recorded with each key
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(payment_requests)')}
+    if 'description' not in columns:
+        conn.execute('ALTER TABLE payment_requests ADD COLUMN description TEXT')
+    if 'book_id' not in columns:
+        conn.execute('ALTER TABLE payment_requests ADD COLUMN book_id INTEGER')
+    
+    # Holds: a FIFO queue per book. A copy coming back (available_copies going
+    # up) is set aside for the oldest waiting hold in the same transaction
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'waiting',
+            placed_at TEXT NOT NULL,
+            ready_at TEXT,
+            closed_at TEXT,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_holds_queue ON holds (book_id, status, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_holds_patron ON holds (patron_id, book_id, status)')
+    conn.execute(_ALLOCATE_HOLDS_TRIGGER)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due ON borrow_records (return_date, due_date)')
+
+    # Per-patron change counter: bumped by every change to a patron's loans or
+    # fees, so caches in any process can tell when a patron's report went stale
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patron_versions (
+            patron_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''')
+    for table in ('borrow_records', 'fees'):
+        for op in ('INSERT', 'UPDATE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_patron_version_{op.lower()} AFTER {op} ON {table}
+                BEGIN
+                    INSERT INTO patron_versions (patron_id, version) VALUES (NEW.patron_id, 1)
+                    ON CONFLICT (patron_id) DO UPDATE SET version = version + 1;
+                END
+            ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_after_return
+        AFTER UPDATE OF return_date ON borrow_records
+        WHEN OLD.return_date IS NULL AND NEW.return_date IS NOT NULL AND {_RETURN_DAYS_SQL} > 0
+        BEGIN
+            INSERT INTO fees (borrow_record_id, patron_id, book_id, days_overdue, accrued, accrued_through)
+            VALUES (NEW.id, NEW.patron_id, NEW.book_id, {_RETURN_DAYS_SQL},
+                    {_late_fee_sql(_RETURN_DAYS_SQL)}, date(NEW.return_date))
+            ON CONFLICT (borrow_record_id) DO UPDATE SET
+                days_overdue = excluded.days_overdue,
+                accrued = excluded.accrued,
+                accrued_through = excluded.accrued_through;
+        END
+    ''')
+    
     conn.commit()
     conn.close()
 
+def _create_books_fts(conn) -> None:
+    """Create the books_fts index, its word list and the triggers that keep it in sync (skipped without FTS5)."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone():
+        try:
+            conn.execute("CREATE VIRTUAL TABLE books_fts USING fts5(title, author, content='books', content_rowid='id')")
+        except sqlite3.OperationalError:
+            return  # this SQLite build has no FTS5; searches rank without BM25
+        # Only title/author changes touch the index, not the availability updates of every loan
+        conn.executescript('''
+            CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books
+            BEGIN INSERT INTO books_fts (rowid, title, author) VALUES (NEW.id, NEW.title, NEW.author); END;
+            CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books
+            BEGIN INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', OLD.id, OLD.title, OLD.author); END;
+            CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books
+            BEGIN
+                INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', OLD.id, OLD.title, OLD.author);
+                INSERT INTO books_fts (rowid, title, author) VALUES (NEW.id, NEW.title, NEW.author);
+            END;
+        ''')
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")  # index books that predate it
+    # Distinct indexed words per column, read by the fuzzy search (services/fuzzy_search.py)
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS books_fts_terms USING fts5vocab(books_fts, 'col')")
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
@@ -84,32 +393,111 @@ def add_sample_data():
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
+def get_all_books() -> List[Book]:
     """Get all books from the database."""
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    conn.row_factory = book_row_factory
+    books = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title').fetchall()
     conn.close()
-    return [dict(book) for book in books]
+    return books
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
+def get_fts_scores(terms: List[str], column: str) -> Optional[Dict[int, float]]:
+    """
+    BM25 relevance (higher is better) of the books whose `column` ('title' or
+    'author') has a word starting with each of `terms`, keyed by book ID.
+    Returns None when the database has no full-text index.
+    """
+    if column not in ('title', 'author') or not terms:
+        return None
+    expression = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+    return get_fts_matches(f'{column} : ({expression})')
+
+def get_fts_matches(expression: str) -> Optional[Dict[int, float]]:
+    """Books matching an FTS5 query expression, with their BM25 relevance; None without a full-text index."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('SELECT rowid, -bm25(books_fts) FROM books_fts WHERE books_fts MATCH ?',
+                            (expression,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return {book_id: score for book_id, score in rows}
+
+def get_fts_rows(expression: str, column: str) -> Optional[List[Tuple[int, str, float]]]:
+    """(book ID, `column` value, BM25 relevance) of the books matching an FTS5 expression; None without an index."""
+    if column not in ('title', 'author'):
+        return None
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(f'SELECT rowid, {column}, -bm25(books_fts) FROM books_fts WHERE books_fts MATCH ?',
+                            (expression,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return [tuple(row) for row in rows]
+
+def get_fts_vocabulary(column: str) -> Optional[List[str]]:
+    """Every distinct word the full-text index holds for `column`; None without an index."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('SELECT term FROM books_fts_terms WHERE col = ?', (column,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return [row['term'] for row in rows]
+
+def get_book_ids_by_isbn_prefix(prefix: str) -> List[int]:
+    """IDs of the books whose ISBN starts with `prefix`, found with a range scan of the ISBN index."""
+    if not prefix:
+        return []
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    conn = get_db_connection()
+    rows = conn.execute('SELECT id FROM books WHERE isbn >= ? AND isbn < ?', (prefix, upper)).fetchall()
+    conn.close()
+    return [row['id'] for row in rows]
+
+def get_book_by_id(book_id: int) -> Optional[Book]:
     """Get a specific book by ID."""
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn.row_factory = book_row_factory
+    book = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn.close()
+    return book
+
+def get_books_by_ids(book_ids: List[int]) -> Dict[int, Book]:
+    """Get several books by ID over one connection, keyed by ID (missing IDs are omitted)."""
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        return {}
+    conn = get_db_connection()
+    conn.row_factory = book_row_factory
+    books = {}
+    # Stay under SQLite's default limit of 999 bound parameters per statement
+    for start in range(0, len(book_ids), 900):
+        chunk = book_ids[start:start + 900]
+        placeholders = ', '.join('?' * len(chunk))
+        for book in conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE id IN ({placeholders})', chunk):
+            books[book.id] = book
     conn.close()
-    return dict(book) if book else None
+    return books
 
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
     """Get a specific book by ISBN."""
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    conn.row_factory = book_row_factory
+    book = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE isbn = ?', (isbn,)).fetchone()
     conn.close()
-    return dict(book) if book else None
+    return book
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+    conn.row_factory = loan_row_factory
+    borrowed_books = conn.execute(f'''
+        SELECT {LOAN_COLUMNS}
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ? AND br.return_date IS NULL
@@ -117,19 +505,152 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     ''', (patron_id,)).fetchall()
     conn.close()
     
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
-    
     return borrowed_books
 
+def get_patron_version(patron_id: str) -> int:
+    """Get the patron's change counter (0 if none), bumped by every change to their loans or fees."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT version FROM patron_versions WHERE patron_id = ?', (patron_id,)).fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+def get_catalog_change_seq() -> int:
+    """Get the number of the most recent catalog change (0 if none)."""
+    conn = get_db_connection()
+    seq = conn.execute('SELECT COALESCE(MAX(seq), 0) as seq FROM catalog_changes').fetchone()['seq']
+    conn.close()
+    return seq
+
+def _create_prune_trigger(conn: sqlite3.Connection, log: str, kept: int) -> None:
+    """Keep the newest `kept` rows of a change log, pruning every CHANGE_LOG_PRUNE_INTERVAL inserts."""
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {log}_prune AFTER INSERT ON {log}
+        WHEN NEW.seq % {CHANGE_LOG_PRUNE_INTERVAL} = 0 AND NEW.seq > {kept}
+        BEGIN
+            DELETE FROM {log} WHERE seq <= NEW.seq - {kept};
+            INSERT OR REPLACE INTO change_log_pruned (log, through) VALUES ('{log}', NEW.seq - {kept});
+        END
+    ''')
+
+def _pruned_through(conn: sqlite3.Connection, log: str) -> int:
+    row = conn.execute('SELECT through FROM change_log_pruned WHERE log = ?', (log,)).fetchone()
+    return row[0] if row else 0
+
+def catalog_changes_cover(seq: int) -> bool:
+    """Whether catalog_changes still holds every change after `seq`: False when the counter is
+    behind it (the file was restored from a backup) or the changes after it were pruned."""
+    conn = get_db_connection()
+    latest = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM catalog_changes').fetchone()[0]
+    pruned = _pruned_through(conn, 'catalog_changes')
+    conn.close()
+    return pruned <= seq <= latest
+
+def get_catalog_changes_since(seq: int) -> Tuple[int, List[int]]:
+    """Get the latest catalog change number and the IDs of books changed after `seq`."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT seq, book_id FROM catalog_changes WHERE seq > ? ORDER BY seq
+    ''', (seq,)).fetchall()
+    conn.close()
+    if not rows:
+        return seq, []
+    return rows[-1]['seq'], list(dict.fromkeys(row['book_id'] for row in rows))
+
+def get_change_feed_seq() -> int:
+    """Get the sequence number of the latest change feed entry (0 if none)."""
+    conn = get_db_connection()
+    seq = conn.execute('SELECT MAX(seq) FROM change_feed').fetchone()[0]
+    conn.close()
+    return seq or 0
+
+def get_change_feed_pruned_seq() -> int:
+    """Get the last change feed seq that has been pruned (0 if none); older cursors have missed changes."""
+    conn = get_db_connection()
+    seq = _pruned_through(conn, 'change_feed')
+    conn.close()
+    return seq
+
+def get_change_feed(since: int, limit: int) -> List[Dict]:
+    """Get up to `limit` change feed entries after `since`, with the current state of each changed row
+    (None once the row has been deleted)."""
+    conn = get_db_connection()
+    changes = [dict(row) for row in conn.execute('''
+        SELECT seq, entity, entity_id, op, changed_at FROM change_feed
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (since, limit))]
+
+    rows = {}
+    for entity, table in (('book', 'books'), ('loan', 'borrow_records')):
+        ids = list({c['entity_id'] for c in changes if c['entity'] == entity})
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', chunk):
+                rows[(entity, row['id'])] = dict(row)
+    conn.close()
+
+    for change in changes:
+        change['data'] = rows.get((change['entity'], change['entity_id']))
+    return changes
+
+def get_open_borrow_record(patron_id: str, book_id: int) -> Optional[Dict]:
+    """Get the patron's oldest open borrow record for a book, with its fee ledger entry (if any)."""
+    conn = get_db_connection()
+    record = conn.execute('''
+        SELECT br.*, f.days_overdue AS fee_days_overdue, f.accrued AS fee_accrued,
+               f.paid AS fee_paid, f.accrued_through AS fee_accrued_through
+        FROM borrow_records br
+        LEFT JOIN fees f ON f.borrow_record_id = br.id
+        WHERE br.patron_id = ? AND br.book_id = ? AND br.return_date IS NULL
+        ORDER BY br.borrow_date LIMIT 1
+    ''', (patron_id, book_id)).fetchone()
+    conn.close()
+    if not record:
+        return None
+
+    record = dict(record)
+    for key in ('borrow_date', 'due_date'):
+        record[key] = datetime.fromisoformat(record[key])
+    return record
+
+def get_open_borrow_records() -> List[Dict]:
+    """Get every open borrow record (patron_id, book_id, due_date), earliest due first."""
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT patron_id, book_id, due_date FROM borrow_records
+        WHERE return_date IS NULL
+        ORDER BY due_date
+    ''').fetchall()
+    conn.close()
+    return [
+        {'patron_id': r['patron_id'], 'book_id': r['book_id'], 'due_date': datetime.fromisoformat(r['due_date'])}
+        for r in records
+    ]
+
+def get_patron_borrow_history(patron_id: str) -> List[Dict]:
+    """Get every borrow record (open and returned) for a patron, with book details."""
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT br.*, b.title, b.author, b.isbn,
+               f.days_overdue AS fee_days_overdue, f.accrued AS fee_accrued,
+               f.paid AS fee_paid, f.accrued_through AS fee_accrued_through
+        FROM borrow_records br
+        JOIN books b ON br.book_id = b.id
+        LEFT JOIN fees f ON f.borrow_record_id = br.id
+        WHERE br.patron_id = ?
+        ORDER BY br.borrow_date
+    ''', (patron_id,)).fetchall()
+    conn.close()
+
+    history = []
+    for record in records:
+        record = dict(record)
+        for key in ('borrow_date', 'due_date', 'return_date'):
+            if record[key]:
+                record[key] = datetime.fromisoformat(record[key])
+        history.append(record)
+    return history
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
     conn = get_db_connection()
@@ -140,7 +661,16 @@ def get_patron_borrow_count(patron_id: str) -> int:
     conn.close()
     return count
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
+def insert_events(conn: sqlite3.Connection, events: List[Event]) -> None:
+    """Insert events in the connection's current transaction; they commit (or roll back) with it."""
+    ts = datetime.now().isoformat()
+    conn.executemany('''
+        INSERT INTO events (ts, type, patron_id, book_id, payload) VALUES (?, ?, ?, ?, ?)
+    ''', [(ts, event_type, patron_id, book_id, json.dumps(data, default=str))
+          for event_type, patron_id, book_id, data in events])
+
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int,
+                events: List[Event] = ()) -> bool:
     """Insert a new book into the database."""
     conn = get_db_connection()
     try:
@@ -148,6 +678,7 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
         ''', (title, author, isbn, total_copies, available_copies))
+        insert_events(conn, events)
         conn.commit()
         conn.close()
         return True
@@ -170,13 +701,14 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
         conn.close()
         return False
 
-def update_book_availability(book_id: int, change: int) -> bool:
+def update_book_availability(book_id: int, change: int, events: List[Event] = ()) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
     conn = get_db_connection()
     try:
         conn.execute('''
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
         ''', (change, book_id))
+        insert_events(conn, events)
         conn.commit()
         conn.close()
         return True
@@ -184,6 +716,23 @@ def update_book_availability(book_id: int, change: int) -> bool:
         conn.close()
         return False
 
+def set_available_copies(available: Dict[int, int]) -> None:
+    """Overwrite books.available_copies ({book_id: copies}) without allocating copies to waiting holds:
+    books_allocate_holds is dropped for the transaction, so the values written are the values kept."""
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DROP TRIGGER IF EXISTS books_allocate_holds')
+        conn.executemany('UPDATE books SET available_copies = ? WHERE id = ?',
+                         [(copies, book_id) for book_id, copies in available.items()])
+        conn.execute(_ALLOCATE_HOLDS_TRIGGER)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
     conn = get_db_connection()
@@ -199,3 +748,369 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
     except Exception as e:
         conn.close()
         return False
+
+def borrow_books_batch(patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime,
+                       events: List[Event] = ()) -> bool:
+    """Create borrow records and take one copy of each book in a single transaction.
+    A book the patron has a ready hold on takes the copy set aside for it (fulfilling
+    the hold) before a shelf copy. Nothing is applied if any book has no copy left.
+    events[i], if given, is logged for book_ids[i] with the hold_id it fulfilled (or None)."""
+    conn = get_db_connection()
+    try:
+        for i, book_id in enumerate(book_ids):
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            hold = conn.execute('''
+                SELECT id FROM holds WHERE patron_id = ? AND book_id = ? AND status = 'ready' ORDER BY id LIMIT 1
+            ''', (patron_id, book_id)).fetchone()
+            if hold:
+                conn.execute('''
+                    UPDATE holds SET status = 'fulfilled', closed_at = ? WHERE id = ?
+                ''', (borrow_date.isoformat(), hold['id']))
+            else:
+                taken = conn.execute('''
+                    UPDATE books SET available_copies = available_copies - 1
+                    WHERE id = ? AND available_copies > 0
+                ''', (book_id,)).rowcount
+                if not taken:
+                    conn.rollback()
+                    conn.close()
+                    return False
+            insert_events(conn, [(event_type, event_patron, event_book, dict(data, hold_id=hold and hold['id']))
+                                 for event_type, event_patron, event_book, data in events[i:i + 1]])
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False
+
+def return_books_batch(patron_id: str, book_ids: List[int], return_date: datetime,
+                       events: List[Event] = ()) -> Optional[List[int]]:
+    """Close one open borrow record per book and put the copy back, in a single transaction.
+    events[i], if given, is logged only when book_ids[i] had an open record.
+    Returns the IDs that had an open record, or None on a database error."""
+    conn = get_db_connection()
+    try:
+        returned = []
+        for i, book_id in enumerate(book_ids):
+            closed = conn.execute('''
+                UPDATE borrow_records SET return_date = ?
+                WHERE id = (
+                    SELECT id FROM borrow_records
+                    WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                    ORDER BY borrow_date LIMIT 1
+                )
+            ''', (return_date.isoformat(), patron_id, book_id)).rowcount
+            if closed:
+                conn.execute('''
+                    UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+                ''', (book_id,))
+                returned.append(book_id)
+                insert_events(conn, events[i:i + 1])
+        conn.commit()
+        conn.close()
+        return returned
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return None
+
+def accrue_fees(today: str) -> int:
+    """Bring the fee ledger up to `today` (YYYY-MM-DD) for open, overdue loans.
+    Loans already accrued through today or already at the cap are skipped.
+    Returns the number of ledger rows written."""
+    conn = get_db_connection()
+    try:
+        written = conn.execute(f'''
+            INSERT INTO fees (borrow_record_id, patron_id, book_id, days_overdue, accrued, accrued_through)
+            SELECT br.id, br.patron_id, br.book_id, {_ACCRUAL_DAYS_SQL},
+                   {_late_fee_sql(_ACCRUAL_DAYS_SQL)}, :today
+            FROM borrow_records br
+            LEFT JOIN fees f ON f.borrow_record_id = br.id
+            WHERE br.return_date IS NULL AND br.due_date < :today
+              AND (f.accrued_through IS NULL OR f.accrued_through < :today)
+              AND (f.accrued IS NULL OR f.accrued < :cap)
+            ON CONFLICT (borrow_record_id) DO UPDATE SET
+                days_overdue = excluded.days_overdue,
+                accrued = excluded.accrued,
+                accrued_through = excluded.accrued_through
+        ''', {'today': today, 'cap': MAX_LATE_FEE}).rowcount
+        conn.commit()
+        conn.close()
+        return written
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        raise
+
+def record_fee_payment(transaction_id: str, borrow_record_id: int, patron_id: str, book_id: int,
+                       amount: float, days_overdue: int, accrued: float, today: str,
+                       events: List[Event] = ()) -> bool:
+    """Record a late fee payment against a loan's ledger entry.
+    The entry is created (or brought up to `today`) first if the daily accrual has not reached it yet."""
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            INSERT INTO fees (borrow_record_id, patron_id, book_id, days_overdue, accrued, accrued_through)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (borrow_record_id) DO UPDATE SET
+                days_overdue = excluded.days_overdue,
+                accrued = excluded.accrued,
+                accrued_through = excluded.accrued_through
+            WHERE fees.accrued_through < excluded.accrued_through
+        ''', (borrow_record_id, patron_id, book_id, days_overdue, accrued, today))
+        conn.execute('UPDATE fees SET paid = paid + ? WHERE borrow_record_id = ?', (amount, borrow_record_id))
+        conn.execute('''
+            INSERT INTO fee_payments (transaction_id, borrow_record_id, patron_id, amount, paid_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (transaction_id, borrow_record_id, patron_id, amount, datetime.now().isoformat()))
+        insert_events(conn, events)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False
+
+def get_fee_payment(transaction_id: str) -> Optional[Dict]:
+    """Get a recorded late fee payment by gateway transaction ID."""
+    conn = get_db_connection()
+    try:
+        payment = conn.execute('''
+            SELECT * FROM fee_payments WHERE transaction_id = ?
+        ''', (transaction_id,)).fetchone()
+        conn.close()
+        return dict(payment) if payment else None
+    except Exception as e:
+        conn.close()
+        return None
+
+def get_unverified_fee_payments(day: str = None) -> List[Dict]:
+    """Get payments not yet confirmed against the gateway, optionally only those made on `day` (YYYY-MM-DD)."""
+    conn = get_db_connection()
+    if day:
+        payments = conn.execute('''
+            SELECT * FROM fee_payments
+            WHERE verified_at IS NULL AND paid_at >= ? AND paid_at < date(?, '+1 day')
+            ORDER BY paid_at
+        ''', (day, day)).fetchall()
+    else:
+        payments = conn.execute('''
+            SELECT * FROM fee_payments WHERE verified_at IS NULL ORDER BY paid_at
+        ''').fetchall()
+    conn.close()
+    return [dict(payment) for payment in payments]
+
+def record_payment_verifications(results: List[Tuple[str, float, Optional[str], str, str]]) -> bool:
+    """Store gateway verification results in one transaction.
+    Each result is (gateway_status, gateway_amount, mismatch or None, verified_at, transaction_id)."""
+    conn = get_db_connection()
+    try:
+        conn.executemany('''
+            UPDATE fee_payments
+            SET gateway_status = ?, gateway_amount = ?, mismatch = ?, verified_at = ?
+            WHERE transaction_id = ?
+        ''', results)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False
+
+def record_fee_refund(transaction_id: str, amount: float, events: List[Event] = ()) -> bool:
+    """Record a refund against a payment and take it back off the loan's paid total."""
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            UPDATE fee_payments SET refunded = refunded + ? WHERE transaction_id = ?
+        ''', (amount, transaction_id))
+        conn.execute('''
+            UPDATE fees SET paid = MAX(paid - ?, 0)
+            WHERE borrow_record_id = (SELECT borrow_record_id FROM fee_payments WHERE transaction_id = ?)
+        ''', (amount, transaction_id))
+        insert_events(conn, events)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False
+
+def get_payment_request(idempotency_key: str) -> Optional[Dict]:
+    """Get the payment submission recorded under an idempotency key."""
+    conn = get_db_connection()
+    request = conn.execute('''
+        SELECT * FROM payment_requests WHERE idempotency_key = ?
+    ''', (idempotency_key,)).fetchone()
+    conn.close()
+    return dict(request) if request else None
+
+def claim_payment_request(idempotency_key: str, patron_id: str, book_id: Optional[int], amount: float,
+                          description: str, pending_timeout: float) -> Optional[Dict]:
+    """Mark an idempotency key as pending for this submission (patron, book, amount and description).
+    Returns None if the caller now owns the key, otherwise the existing record.
+    A pending record older than `pending_timeout` seconds is taken over."""
+    now = datetime.now()
+    conn = get_db_connection()
+    try:
+        claimed = conn.execute('''
+            INSERT INTO payment_requests (idempotency_key, patron_id, book_id, amount, description, status, updated_at)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+            ON CONFLICT (idempotency_key) DO UPDATE SET
+                patron_id = excluded.patron_id,
+                book_id = excluded.book_id,
+                amount = excluded.amount,
+                description = excluded.description,
+                updated_at = excluded.updated_at
+            WHERE payment_requests.status = 'pending' AND payment_requests.updated_at < ?
+        ''', (idempotency_key, patron_id, book_id, amount, description, now.isoformat(),
+              (now - timedelta(seconds=pending_timeout)).isoformat())).rowcount
+        conn.commit()
+        existing = None if claimed else conn.execute('''
+            SELECT * FROM payment_requests WHERE idempotency_key = ?
+        ''', (idempotency_key,)).fetchone()
+        conn.close()
+        return dict(existing) if existing else None
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        raise
+
+def complete_payment_request(idempotency_key: str, transaction_id: str, message: str) -> bool:
+    """Store the successful result for an idempotency key so retries replay it."""
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            UPDATE payment_requests
+            SET status = 'succeeded', transaction_id = ?, message = ?, updated_at = ?
+            WHERE idempotency_key = ?
+        ''', (transaction_id, message, datetime.now().isoformat(), idempotency_key))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def release_payment_request(idempotency_key: str) -> bool:
+    """Forget a pending idempotency key whose submission failed, so it can be retried."""
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            DELETE FROM payment_requests WHERE idempotency_key = ? AND status = 'pending'
+        ''', (idempotency_key,))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+_HOLD_QUERY = '''
+    SELECT h.*, CASE WHEN h.status = 'waiting' THEN (
+        SELECT COUNT(*) FROM holds q WHERE q.book_id = h.book_id AND q.status = 'waiting' AND q.id <= h.id
+    ) END AS position
+    FROM holds h
+'''
+
+def insert_hold(patron_id: str, book_id: int, placed_at: datetime, events: List[Event] = ()) -> Optional[int]:
+    """Join the hold queue for a book that has no copy available; `events` are logged with the new hold ID.
+    Returns the hold ID, or None if a copy is available (or on a database error)."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO holds (patron_id, book_id, placed_at)
+            SELECT ?, id, ? FROM books WHERE id = ? AND available_copies <= 0
+        ''', (patron_id, placed_at.isoformat(), book_id))
+        if cursor.rowcount:
+            insert_events(conn, [(event_type, event_patron, event_book, dict(data, hold_id=cursor.lastrowid))
+                                 for event_type, event_patron, event_book, data in events])
+        conn.commit()
+        conn.close()
+        return cursor.lastrowid if cursor.rowcount else None
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return None
+
+def get_hold(hold_id: int) -> Optional[Dict]:
+    """Get a hold with its queue position (1 = next in line; None unless waiting)."""
+    conn = get_db_connection()
+    try:
+        hold = conn.execute(_HOLD_QUERY + 'WHERE h.id = ?', (hold_id,)).fetchone()
+        conn.close()
+        return dict(hold) if hold else None
+    except Exception as e:
+        conn.close()
+        return None
+
+def get_patron_hold(patron_id: str, book_id: int) -> Optional[Dict]:
+    """Get the patron's waiting or ready hold on a book, if any."""
+    conn = get_db_connection()
+    try:
+        hold = conn.execute(_HOLD_QUERY + '''
+            WHERE h.patron_id = ? AND h.book_id = ? AND h.status IN ('waiting', 'ready')
+            ORDER BY h.id LIMIT 1
+        ''', (patron_id, book_id)).fetchone()
+        conn.close()
+        return dict(hold) if hold else None
+    except Exception as e:
+        conn.close()
+        return None
+
+def fulfill_hold(hold_id: int, events: List[Event] = ()) -> bool:
+    """Close a ready hold once its patron has borrowed the copy set aside for it."""
+    conn = get_db_connection()
+    try:
+        fulfilled = conn.execute('''
+            UPDATE holds SET status = 'fulfilled', closed_at = ? WHERE id = ? AND status = 'ready'
+        ''', (datetime.now().isoformat(), hold_id)).rowcount
+        if fulfilled:
+            insert_events(conn, events)
+        conn.commit()
+        conn.close()
+        return bool(fulfilled)
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False
+
+def cancel_hold(hold_id: int, events: List[Event] = ()) -> Optional[str]:
+    """Cancel a waiting or ready hold; a copy set aside for it goes to the next hold
+    (or back on the shelf) in the same transaction. Returns the status it had, or None."""
+    conn = get_db_connection()
+    try:
+        hold = conn.execute('''
+            SELECT book_id, status FROM holds WHERE id = ? AND status IN ('waiting', 'ready')
+        ''', (hold_id,)).fetchone()
+        if hold is None:
+            conn.close()
+            return None
+        cancelled = conn.execute('''
+            UPDATE holds SET status = 'cancelled', closed_at = ? WHERE id = ? AND status = ?
+        ''', (datetime.now().isoformat(), hold_id, hold['status'])).rowcount
+        if not cancelled:  # changed since we looked
+            conn.rollback()
+            conn.close()
+            return None
+        if hold['status'] == 'ready':
+            conn.execute('''
+                UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+            ''', (hold['book_id'],))
+        insert_events(conn, [(event_type, patron_id, book_id, dict(data, status=hold['status']))
+                             for event_type, patron_id, book_id, data in events])
+        conn.commit()
+        conn.close()
+        return hold['status']
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return None
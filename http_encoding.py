@@ -0,0 +1,115 @@
+"""
+HTTP Encoding Module - Fast JSON encoding and negotiated response compression
+
+FastJSONProvider encodes responses with orjson when it is installed and
+falls back to Flask's encoder otherwise, or for values orjson rejects.
+Output is the same JSON apart from whitespace and non-ASCII characters,
+which orjson writes as UTF-8 instead of escaping them. Dates keep Flask's
+HTTP-date format.
+
+compress_response() is an after_request hook. It compresses JSON, HTML and
+text bodies of at least LibraryConfig.compression_min_bytes with the best
+encoding the client accepts: brotli when the optional `brotli` package is
+installed, otherwise gzip.
+"""
+
+import gzip
+from typing import Optional
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider, _default
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+from config import active_config
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # of 11; higher levels cost far more CPU for a few percent
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when available."""
+
+    def _orjson_dumps(self, obj) -> Optional[bytes]:
+        """Encode with orjson, or return None to use the standard encoder."""
+        if orjson is None:
+            return None
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=_default, option=option)
+        except TypeError:  # e.g. integers wider than 64 bits
+            return None
+
+    def dumps(self, obj, **kwargs) -> str:
+        if set(kwargs) <= {'separators'}:  # compact output requested
+            data = self._orjson_dumps(obj)
+            if data is not None:
+                return data.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        data = self._orjson_dumps(self._prepare_response_obj(args, kwargs))
+        if data is None:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The content coding to use for an Accept-Encoding header value: 'br', 'gzip' or None."""
+    if not accept_encoding:
+        return None
+    # An explicit entry wins over "*", so "*, gzip;q=0" rules gzip out
+    qualities = {coding.lower(): q for coding, q in parse_accept_header(accept_encoding)}
+
+    def quality(coding):
+        return qualities.get(coding, qualities.get('*', 0))
+
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = max(candidates, key=quality)  # ties go to the earlier (smaller) coding
+    return best if quality(best) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress `body` with a coding returned by choose_encoding()."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_body(body: bytes, mimetype: Optional[str], accept_encoding: Optional[str]):
+    """Return (body, encoding): compressed when the type and size qualify and the client accepts it."""
+    if mimetype not in COMPRESSIBLE_TYPES or len(body) < active_config().compression_min_bytes:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress(body, encoding), encoding
+
+
+def compress_response(response):
+    """after_request hook: compress the response body when the client accepts it."""
+    if response.mimetype in COMPRESSIBLE_TYPES:
+        response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)):
+        return response
+
+    body, encoding = compress_body(response.get_data(), response.mimetype, request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
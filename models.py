@@ -0,0 +1,73 @@
+"""
+Record types for the Library Management System.
+
+Book and Loan are slotted dataclasses built straight from query rows by
+the row factories below, so catalog listings do not pay for a dict per row.
+They also support read-only mapping access (record['title'], record.get())
+so code written against the old dict rows keeps working.
+"""
+
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from typing import Any, Dict
+
+# Column order the row factories expect; queries select these explicitly.
+BOOK_COLUMNS = 'id, title, author, isbn, total_copies, available_copies'
+LOAN_COLUMNS = 'br.book_id, b.title, b.author, br.borrow_date, br.due_date'
+
+
+class _RecordMixin:
+    """Read-only dict-style access for slotted record types."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [f.name for f in fields(self)]
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class Book(_RecordMixin):
+    id: int
+    title: str
+    author: str
+    isbn: str
+    total_copies: int
+    available_copies: int
+
+
+@dataclass(slots=True)
+class Loan(_RecordMixin):
+    book_id: int
+    title: str
+    author: str
+    borrow_date: datetime
+    due_date: datetime
+    is_overdue: bool
+
+
+def book_row_factory(cursor, row) -> Book:
+    """sqlite3 row factory for queries selecting BOOK_COLUMNS."""
+    return Book(*row)
+
+
+def loan_row_factory(cursor, row) -> Loan:
+    """sqlite3 row factory for queries selecting LOAN_COLUMNS."""
+    book_id, title, author, borrow_date, due_date = row
+    due_date = datetime.fromisoformat(due_date)
+    return Loan(book_id, title, author, datetime.fromisoformat(borrow_date),
+                due_date, datetime.now() > due_date)
@@ -2,8 +2,25 @@
 API Routes - JSON API endpoints
 """
 
+import math
+
 from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+from library_service import (
+    calculate_late_fee_for_book, get_cached_patron_status_report,
+    get_book_availability, borrow_books_by_patron, return_books_by_patron, pay_late_fees,
+    get_changes_since, search_books_across_branches, place_hold, cancel_hold_for_patron, get_hold_status,
+    search_books_ranked, SEARCH_PAGE_SIZE, QueryError, search_books_fuzzy, FUZZY_SEARCH_TYPES,
+    IdempotencyKeyReusedError
+)
+from models import BOOK_COLUMNS
+
+MAX_AVAILABILITY_IDS = 200
+MAX_BATCH_SIZE = 50
+MAX_CHANGES_PAGE = 1000
+MAX_CHANGES_WAIT = 30
+MAX_HOLD_WAIT = 30
+MAX_SEARCH_LIMIT = 100
+BOOK_FIELDS = BOOK_COLUMNS.split(', ')
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -16,11 +33,62 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/late_fee/<patron_id>/<int:book_id>/pay', methods=['POST'])
+def pay_late_fee(patron_id, book_id):
+    """
+    Pay the late fee for a book through the payment gateway.
+    API endpoint for late fee payments
+
+    Clients retrying after a timeout should resend the same Idempotency-Key header;
+    a key already used for another patron or book is rejected with 409.
+    """
+    try:
+        success, message, transaction_id = pay_late_fees(patron_id, book_id,
+                                                         idempotency_key=request.headers.get('Idempotency-Key'))
+    except IdempotencyKeyReusedError as e:
+        return jsonify({'success': False, 'message': str(e), 'transaction_id': None}), 409
+    
+    return jsonify({'success': success, 'message': message, 'transaction_id': transaction_id}), 200 if success else 400
+
+def parse_fields_arg(args, allowed):
+    """Read ?fields=id,title. Returns (field names or None for all, None) or (None, error)."""
+    raw = args.get('fields', '').strip()
+    if not raw:
+        return None, None
+    
+    names = list(dict.fromkeys(part.strip() for part in raw.split(',') if part.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if not names or unknown:
+        return None, f"Unknown field(s): {', '.join(unknown) or raw}. Choose from {', '.join(allowed)}"
+    
+    return names, None
+
+def parse_page_args(args):
+    """Read ?limit=&offset= for a search page. Returns ((limit, offset), None) or (None, error)."""
+    try:
+        limit = int(args.get('limit', SEARCH_PAGE_SIZE))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        return None, 'limit and offset must be integers'
+    
+    if offset < 0 or not 0 < limit <= MAX_SEARCH_LIMIT:
+        return None, f'offset must be >= 0 and limit between 1 and {MAX_SEARCH_LIMIT}'
+    
+    return (limit, offset), None
+
+def project_fields(records, names):
+    """Keep only `names` of each book record (all of them when names is None)."""
+    if names is None:
+        return records
+    return [{name: record[name] for name in names} for record in records]
+
 @api_bp.route('/search')
 def search_books_api():
     """
-    Search for books via API endpoint.
-    Alternative API interface for R5: Book Search Functionality
+    Ranked search for books via API endpoint (e.g. ?q=gatsby&limit=20&offset=40&fields=id,title,
+    or ?type=query&q=author:orwell title:1984 for a multi-field query).
+    Title and author searches with no match retry typo-tolerant ("fuzzy": true).
+    Alternative API interface for R5: Book Search Functionality; count is the total number of matches
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
@@ -28,12 +96,205 @@ def search_books_api():
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
+    fields, error = parse_fields_arg(request.args, BOOK_FIELDS)
+    if not error:
+        page, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    try:
+        books, total = search_books_ranked(search_term, search_type, *page)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    fuzzy = total == 0 and search_type in FUZZY_SEARCH_TYPES
+    if fuzzy:
+        books, total = search_books_fuzzy(search_term, search_type, *page)
+    
+    return jsonify({
+        'search_term': search_term,
+        'search_type': search_type,
+        'results': project_fields(books, fields),
+        'count': total,
+        'limit': page[0],
+        'offset': page[1],
+        'fuzzy': fuzzy
+    })
+
+@api_bp.route('/branches/search')
+def search_branches_api():
+    """
+    Search the catalogs of all branches at once.
+    API endpoint for cross-branch search; each result names its branch
+    """
+    search_term = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'title')
+    
+    if not search_term:
+        return jsonify({'error': 'Search term is required'}), 400
+    
+    fields, error = parse_fields_arg(request.args, BOOK_FIELDS + ['branch'])
+    if error:
+        return jsonify({'error': error}), 400
+    
+    books = search_books_across_branches(search_term, search_type)
     
     return jsonify({
         'search_term': search_term,
         'search_type': search_type,
-        'results': books,
+        'results': project_fields(books, fields),
         'count': len(books)
     })
+
+@api_bp.route('/patron/<patron_id>/status')
+def get_patron_status(patron_id):
+    """
+    Get the status report for a patron.
+    API endpoint for R7: Patron Status Report
+    """
+    if not patron_id.isdigit() or len(patron_id) != 6:
+        return jsonify({'error': 'Invalid patron ID. Must be exactly 6 digits.'}), 400
+    
+    return jsonify(get_cached_patron_status_report(patron_id))
+
+@api_bp.route('/availability')
+def get_availability():
+    """
+    Get availability for many books in one request.
+    API endpoint for catalog integrations (e.g. ?ids=1,2,3)
+    """
+    raw_ids = [part.strip() for part in request.args.get('ids', '').split(',') if part.strip()]
+    
+    if not raw_ids:
+        return jsonify({'error': 'At least one book ID is required'}), 400
+    if len(raw_ids) > MAX_AVAILABILITY_IDS:
+        return jsonify({'error': f'At most {MAX_AVAILABILITY_IDS} book IDs per request'}), 400
+    
+    try:
+        book_ids = [int(part) for part in raw_ids]
+    except ValueError:
+        return jsonify({'error': 'Book IDs must be integers'}), 400
+    
+    # Use business logic function
+    availability = get_book_availability(book_ids)
+    
+    return jsonify({str(book_id): info for book_id, info in availability.items()})
+
+def parse_changes_args(args):
+    """Read since/limit/wait from query arguments. Returns ((since, limit, wait), None) or (None, error)."""
+    try:
+        since = int(args.get('since', 0))
+        limit = int(args.get('limit', 500))
+        wait = float(args.get('wait', 0))
+    except ValueError:
+        return None, 'since and limit must be integers, wait a number of seconds'
+    
+    if since < 0 or not 0 < limit <= MAX_CHANGES_PAGE:
+        return None, f'since must be >= 0 and limit between 1 and {MAX_CHANGES_PAGE}'
+    
+    return (since, limit, min(max(wait, 0), MAX_CHANGES_WAIT)), None
+
+@api_bp.route('/changes')
+def get_changes():
+    """
+    Incremental change feed for books and loans (e.g. ?since=120&wait=25).
+    API endpoint for downstream consumers such as search indexes and analytics
+    """
+    params, error = parse_changes_args(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Use business logic function
+    return jsonify(get_changes_since(*params))
+
+def _parse_batch_request():
+    """Read {"patron_id": ..., "book_ids": [...]} from a JSON body, or return an error response."""
+    data = request.get_json(silent=True) or {}
+    patron_id = str(data.get('patron_id', '')).strip()
+    book_ids = data.get('book_ids')
+    
+    if not isinstance(book_ids, list) or not book_ids:
+        return None, None, (jsonify({'error': 'book_ids must be a non-empty list'}), 400)
+    if len(book_ids) > MAX_BATCH_SIZE:
+        return None, None, (jsonify({'error': f'At most {MAX_BATCH_SIZE} books per batch'}), 400)
+    if not all(isinstance(book_id, int) and not isinstance(book_id, bool) for book_id in book_ids):
+        return None, None, (jsonify({'error': 'Book IDs must be integers'}), 400)
+    
+    return patron_id, book_ids, None
+
+@api_bp.route('/borrow/batch', methods=['POST'])
+def borrow_batch():
+    """
+    Borrow several books for one patron in one transaction.
+    Checkout desk API for R3: Book Borrowing
+    """
+    patron_id, book_ids, error = _parse_batch_request()
+    if error:
+        return error
+    
+    # Use business logic function
+    success, message, results = borrow_books_by_patron(patron_id, book_ids)
+    
+    return jsonify({'patron_id': patron_id, 'success': success, 'message': message, 'results': results})
+
+@api_bp.route('/return/batch', methods=['POST'])
+def return_batch():
+    """
+    Return several books for one patron in one transaction.
+    Checkout desk API for R4: Book Return Processing
+    """
+    patron_id, book_ids, error = _parse_batch_request()
+    if error:
+        return error
+    
+    # Use business logic function
+    success, message, results = return_books_by_patron(patron_id, book_ids)
+    
+    return jsonify({'patron_id': patron_id, 'success': success, 'message': message, 'results': results})
+
+@api_bp.route('/holds', methods=['POST'])
+def create_hold():
+    """
+    Place a hold on a book with no copies available.
+    API endpoint for the holds queue; body {"patron_id": ..., "book_id": ...}
+    """
+    data = request.get_json(silent=True) or {}
+    book_id = data.get('book_id')
+    if not isinstance(book_id, int) or isinstance(book_id, bool):
+        return jsonify({'error': 'book_id must be an integer'}), 400
+    
+    success, message, hold = place_hold(str(data.get('patron_id', '')).strip(), book_id)
+    
+    return jsonify({'success': success, 'message': message, 'hold': hold}), 201 if success else 400
+
+@api_bp.route('/holds/<int:hold_id>')
+def get_hold(hold_id):
+    """
+    Get a hold's status and queue position (e.g. ?wait=25&status=waiting).
+    API endpoint for long-polling a hold until its status changes
+    """
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = None
+    if wait is None or not math.isfinite(wait):
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    wait = min(max(wait, 0), MAX_HOLD_WAIT)
+    
+    hold = get_hold_status(hold_id, wait, request.args.get('status') or None)
+    if hold is None:
+        return jsonify({'error': 'Hold not found'}), 404
+    
+    return jsonify(hold)
+
+@api_bp.route('/holds/<int:hold_id>/cancel', methods=['POST'])
+def cancel_hold(hold_id):
+    """
+    Cancel a waiting or ready hold.
+    API endpoint for the holds queue; body {"patron_id": ...}
+    """
+    data = request.get_json(silent=True) or {}
+    success, message = cancel_hold_for_patron(str(data.get('patron_id', '')).strip(), hold_id)
+    
+    return jsonify({'success': success, 'message': message}), 200 if success else 400
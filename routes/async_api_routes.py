@@ -0,0 +1,118 @@
+"""
+Async API Routes - Async variants of the JSON API endpoints for the ASGI serving mode
+
+Rules use the same URLs and converters as routes/api_routes.py; asgi.py
+serves a request here when it matches and hands everything else to Flask.
+Handlers take an AsyncRequest plus URL arguments and return (payload, status).
+"""
+
+from werkzeug.routing import Map, Rule
+
+from services.async_service import (
+    calculate_late_fee_for_book_async, search_books_ranked_async, search_books_fuzzy_async,
+    get_book_availability_async, get_cached_patron_status_report_async, pay_late_fees_async,
+    get_changes_since_async
+)
+from services.fuzzy_search import FUZZY_SEARCH_TYPES
+from services.payment_orchestrator import IdempotencyKeyReusedError
+from services.search_query import QueryError
+from routes.api_routes import (
+    BOOK_FIELDS, MAX_AVAILABILITY_IDS, parse_changes_args, parse_fields_arg, parse_page_args, project_fields
+)
+
+async_api_map = Map()
+async_api_handlers = {}
+
+def async_api_route(rule, methods=('GET',)):
+    """Register an async handler under /api<rule>."""
+    def decorator(handler):
+        async_api_map.add(Rule('/api' + rule, endpoint=handler.__name__, methods=list(methods)))
+        async_api_handlers[handler.__name__] = handler
+        return handler
+    return decorator
+
+@async_api_route('/late_fee/<patron_id>/<int:book_id>')
+async def get_late_fee(request, patron_id, book_id):
+    """Async variant of api.get_late_fee."""
+    result = await calculate_late_fee_for_book_async(patron_id, book_id)
+    return result, 501 if 'not implemented' in result.get('status', '') else 200
+
+@async_api_route('/late_fee/<patron_id>/<int:book_id>/pay', methods=('POST',))
+async def pay_late_fee(request, patron_id, book_id):
+    """Async variant of api.pay_late_fee; the gateway call is awaited."""
+    try:
+        success, message, transaction_id = await pay_late_fees_async(
+            patron_id, book_id, idempotency_key=request.headers.get('Idempotency-Key'))
+    except IdempotencyKeyReusedError as e:
+        return {'success': False, 'message': str(e), 'transaction_id': None}, 409
+    return {'success': success, 'message': message, 'transaction_id': transaction_id}, 200 if success else 400
+
+@async_api_route('/search')
+async def search_books_api(request):
+    """Async variant of api.search_books_api."""
+    search_term = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'title')
+    
+    if not search_term:
+        return {'error': 'Search term is required'}, 400
+    
+    fields, error = parse_fields_arg(request.args, BOOK_FIELDS)
+    if not error:
+        page, error = parse_page_args(request.args)
+    if error:
+        return {'error': error}, 400
+    
+    try:
+        books, total = await search_books_ranked_async(search_term, search_type, *page)
+    except QueryError as e:
+        return {'error': str(e)}, 400
+    
+    fuzzy = total == 0 and search_type in FUZZY_SEARCH_TYPES
+    if fuzzy:
+        books, total = await search_books_fuzzy_async(search_term, search_type, *page)
+    
+    return {
+        'search_term': search_term,
+        'search_type': search_type,
+        'results': project_fields(books, fields),
+        'count': total,
+        'limit': page[0],
+        'offset': page[1],
+        'fuzzy': fuzzy
+    }, 200
+
+@async_api_route('/patron/<patron_id>/status')
+async def get_patron_status(request, patron_id):
+    """Async variant of api.get_patron_status."""
+    if not patron_id.isdigit() or len(patron_id) != 6:
+        return {'error': 'Invalid patron ID. Must be exactly 6 digits.'}, 400
+    
+    return await get_cached_patron_status_report_async(patron_id), 200
+
+@async_api_route('/availability')
+async def get_availability(request):
+    """Async variant of api.get_availability."""
+    raw_ids = [part.strip() for part in request.args.get('ids', '').split(',') if part.strip()]
+    
+    if not raw_ids:
+        return {'error': 'At least one book ID is required'}, 400
+    if len(raw_ids) > MAX_AVAILABILITY_IDS:
+        return {'error': f'At most {MAX_AVAILABILITY_IDS} book IDs per request'}, 400
+    
+    try:
+        book_ids = [int(part) for part in raw_ids]
+    except ValueError:
+        return {'error': 'Book IDs must be integers'}, 400
+    
+    availability = await get_book_availability_async(book_ids)
+    
+    return {str(book_id): info for book_id, info in availability.items()}, 200
+
+@async_api_route('/changes')
+async def get_changes(request):
+    """Async variant of api.get_changes; long-polls wait on the event loop."""
+    params, error = parse_changes_args(request.args)
+    if error:
+        return {'error': error}, 400
+    
+    return await get_changes_since_async(*params), 200
@@ -0,0 +1,40 @@
+"""
+Patron Routes - Patron status report endpoints
+"""
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from library_service import get_cached_patron_status_report
+
+patron_bp = Blueprint('patron', __name__)
+
+def _valid_patron_id(patron_id: str) -> bool:
+    return bool(patron_id) and patron_id.isdigit() and len(patron_id) == 6
+
+@patron_bp.route('/patron')
+def patron_lookup():
+    """
+    Patron status lookup form.
+    Menu entry for R7: Patron Status Report
+    """
+    patron_id = request.args.get('patron_id', '').strip()
+    
+    if not patron_id:
+        return render_template('patron_status.html', report=None, patron_id='')
+    
+    return redirect(url_for('patron.patron_status', patron_id=patron_id))
+
+@patron_bp.route('/patron/<patron_id>')
+def patron_status(patron_id):
+    """
+    Display the status report for a patron.
+    Web interface for R7: Patron Status Report
+    """
+    if not _valid_patron_id(patron_id):
+        flash('Invalid patron ID. Must be exactly 6 digits.', 'error')
+        return render_template('patron_status.html', report=None, patron_id=patron_id)
+    
+    # Use business logic function (cached per patron)
+    report = get_cached_patron_status_report(patron_id)
+    
+    current = [item for item in report['borrowed_books'] if not item['returned']]
+    return render_template('patron_status.html', report=report, patron_id=patron_id, current=current)
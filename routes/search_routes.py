@@ -3,14 +3,15 @@ Search Routes - Book search functionality
 """
 
 from flask import Blueprint, render_template, request, flash
-from library_service import search_books_in_catalog
+from library_service import search_books_ranked, search_books_fuzzy, QueryError, FUZZY_SEARCH_TYPES
+from routes.api_routes import parse_page_args
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
 def search_books():
     """
-    Search for books in the catalog.
+    Search for books in the catalog, best matches first (?limit=&offset= page through them).
     Web interface for R5: Book Search Functionality
     """
     search_term = request.args.get('q', '').strip()
@@ -19,10 +20,26 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
+    page, error = parse_page_args(request.args)
+    if error:
+        flash(error, 'error')
+        page, _ = parse_page_args({})
+    limit, offset = page
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    try:
+        books, total = search_books_ranked(search_term, search_type, limit, offset)
+    except QueryError as e:
+        flash(str(e), 'error')
+        return render_template('search.html', books=[], search_term=search_term, search_type=search_type)
+    
+    # Nothing matched as typed: retry allowing for typos
+    fuzzy = total == 0 and search_type in FUZZY_SEARCH_TYPES
+    if fuzzy:
+        books, total = search_books_fuzzy(search_term, search_type, limit, offset)
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_template('search.html', books=books, search_term=search_term, search_type=search_type,
+                           total=total, limit=limit, offset=offset, fuzzy=fuzzy)
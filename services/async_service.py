@@ -0,0 +1,115 @@
+"""
+Async Service Module - Awaitable variants of the business logic functions
+
+Used by the ASGI serving mode. SQLite work runs on a bounded thread pool
+so the event loop never blocks on the database, and late fee payments
+await the gateway instead of holding a worker for the whole charge.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import database
+import library_service
+from config import active_config
+from services.payment_orchestrator import IdempotencyKeyReusedError
+from services.payment_service import AsyncPaymentGateway
+
+# Thread pool for blocking database and gateway calls made from the event loop
+DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=active_config().db_threads,
+    thread_name_prefix='library-db'
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function on the database thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context over, so the call uses the same database as the request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def search_books_in_catalog_async(query: str, search_type: str) -> List[Dict]:
+    return await run_blocking(library_service.search_books_in_catalog, query, search_type)
+
+
+async def search_books_ranked_async(query: str, search_type: str, limit: int, offset: int) -> Tuple[List[Dict], int]:
+    return await run_blocking(library_service.search_books_ranked, query, search_type, limit, offset)
+
+
+async def search_books_fuzzy_async(query: str, search_type: str, limit: int, offset: int) -> Tuple[List[Dict], int]:
+    return await run_blocking(library_service.search_books_fuzzy, query, search_type, limit, offset)
+
+
+async def calculate_late_fee_for_book_async(patron_id: str, book_id: int) -> Dict:
+    return await run_blocking(library_service.calculate_late_fee_for_book, patron_id, book_id)
+
+
+async def get_book_availability_async(book_ids: List[int]) -> Dict[int, Optional[Dict]]:
+    return await run_blocking(library_service.get_book_availability, book_ids)
+
+
+async def get_cached_patron_status_report_async(patron_id: str) -> Dict:
+    return await run_blocking(library_service.get_cached_patron_status_report, patron_id)
+
+
+async def get_changes_since_async(since: int, limit: int = 500, wait: float = 0.0) -> Dict:
+    """Awaitable get_changes_since; a long-poll waits on the event loop, not on a pool thread."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    latest = await run_blocking(database.get_change_feed_seq)
+    while latest <= since and loop.time() < deadline:
+        await asyncio.sleep(library_service.CHANGE_FEED_POLL_INTERVAL)
+        latest = await run_blocking(database.get_change_feed_seq)
+    return await run_blocking(library_service.change_feed_page, since, limit, latest)
+
+
+async def pay_late_fees_async(patron_id: str, book_id: int, payment_gateway: AsyncPaymentGateway = None,
+                              idempotency_key: str = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Awaitable pay_late_fees: same validation and messages, but the gateway call is awaited.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book with late fees
+        payment_gateway: AsyncPaymentGateway instance (injectable for testing);
+                         defaults to the shared PaymentOrchestrator run on the pool
+        idempotency_key: Client-chosen key, as for pay_late_fees
+
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+
+    Raises:
+        IdempotencyKeyReusedError: idempotency_key was already used for another patron or book
+    """
+    options = {}
+    if payment_gateway is None:
+        orchestrator = library_service.payment_orchestrator
+        if idempotency_key:
+            error, book = await run_blocking(library_service.check_late_fee_request, patron_id, book_id)
+            if error:
+                return False, error, None
+            replay = await run_blocking(orchestrator.completed_result, idempotency_key, patron_id, book_id,
+                                        library_service.late_fee_description(book))
+            if replay:
+                return True, f"Payment successful! {replay[2]}", replay[1]
+        payment_gateway = AsyncPaymentGateway(orchestrator, executor=DB_EXECUTOR)
+        options.update(idempotency_key=idempotency_key, book_id=book_id)
+
+    error, payment = await run_blocking(library_service.prepare_late_fee_payment, patron_id, book_id)
+    if error:
+        return False, error, None
+
+    try:
+        result = await payment_gateway.process_payment(patron_id=patron_id, amount=payment['amount'],
+                                                       description=payment['description'], **options)
+    except IdempotencyKeyReusedError:
+        raise
+    except Exception as e:
+        return False, f"Payment processing error: {str(e)}", None
+
+    return await run_blocking(library_service.finish_late_fee_payment, patron_id, payment, result)
@@ -0,0 +1,274 @@
+"""
+Backup Module - Online, compressed backups of the library database
+
+Backups use the SQLite online backup API, copying a few pages per step and
+pausing between steps so writers are never blocked for long. SQLite restarts
+a stepped copy whenever another connection writes to the source, so under a
+steady stream of writes the copy falls back to a single pass after a few
+restarts rather than chasing the writers forever. Each copy is
+integrity-checked before it is compressed (gzip, or zstd when the optional
+`zstandard` package is installed) and older snapshots are rotated out.
+
+Usage:
+    python -m services.backup create [backup_dir] [--keep N]
+    python -m services.backup list [backup_dir]
+    python -m services.backup verify <backup_file>
+    python -m services.backup restore <backup_file> [database]
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+import database
+from services.catalog_snapshot import reset_catalog_snapshot
+from services.fuzzy_search import reset_catalog_words
+from services.report_cache import patron_report_cache
+
+DEFAULT_BACKUP_DIR = 'backups'
+BACKUP_PREFIX = 'library-'
+EXTENSIONS = {'gzip': '.db.gz', 'zstd': '.db.zst'}
+
+
+class BackupError(Exception):
+    """A backup could not be created, verified or restored."""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _open_compressed(path: str, mode: str):
+    if path.endswith(EXTENSIONS['zstd']):
+        if zstandard is None:
+            raise BackupError("zstd backups need the 'zstandard' package")
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, mode, compresslevel=6) if 'w' in mode else gzip.open(path, mode)
+
+
+def integrity_check(db_path: str) -> Tuple[bool, str]:
+    """Run PRAGMA integrity_check on an uncompressed database file."""
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+            tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return False, f"Not a valid database: {e}"
+    if result != 'ok':
+        return False, f"Integrity check failed: {result}"
+    return True, f"Integrity check passed ({tables} tables)."
+
+
+def backup_database(backup_dir: str = DEFAULT_BACKUP_DIR, keep: int = 7, compression: str = 'gzip',
+                    pages_per_step: int = 256, step_pause: float = 0.005, max_restarts: int = 3) -> Dict:
+    """
+    Take an online backup of the active branch's database (database.database_path()).
+
+    Args:
+        backup_dir: Where snapshots are written (created if needed)
+        keep: Snapshots to keep; older ones are deleted
+        compression: 'gzip' or 'zstd'
+        pages_per_step: Pages copied while holding the read lock
+        step_pause: Seconds to pause between steps so writers can get in
+        max_restarts: Restarts caused by concurrent writes before copying in one pass
+
+    Returns:
+        dict: path, size in bytes, steps, restarts, seconds and the rotated-out paths
+
+    Raises:
+        BackupError: The copy failed its integrity check
+    """
+    if compression not in EXTENSIONS:
+        raise BackupError(f"Unknown compression '{compression}'")
+    if compression == 'zstd' and zstandard is None:
+        raise BackupError("zstd backups need the 'zstandard' package")
+
+    start = time.perf_counter()
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{stamp}{EXTENSIONS[compression]}')
+
+    steps = restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal steps, restarts, last_remaining
+        steps += 1
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(step_pause)
+
+    fd, copy_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+    os.close(fd)
+    try:
+        source = database.get_db_connection()
+        target = database.connect(copy_path)
+        try:
+            try:
+                source.backup(target, pages=pages_per_step, progress=progress)
+            except _TooManyRestarts:
+                # One pass holds the read lock until done, but can't be restarted
+                source.backup(target)
+                steps += 1
+        finally:
+            target.close()
+            source.close()
+
+        ok, message = integrity_check(copy_path)
+        if not ok:
+            raise BackupError(message)
+
+        with open(copy_path, 'rb') as raw, _open_compressed(path + '.part', 'wb') as out:
+            shutil.copyfileobj(raw, out, 1024 * 1024)
+        os.replace(path + '.part', path)
+    finally:
+        for leftover in (copy_path, path + '.part'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    return {
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'steps': steps,
+        'restarts': restarts,
+        'seconds': round(time.perf_counter() - start, 3),
+        'removed': rotate_backups(backup_dir, keep),
+    }
+
+
+def list_backups(backup_dir: str = DEFAULT_BACKUP_DIR) -> List[str]:
+    """Backup files in `backup_dir`, newest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir)
+             if name.startswith(BACKUP_PREFIX) and name.endswith(tuple(EXTENSIONS.values()))]
+    # Timestamps in the names sort chronologically
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+
+def rotate_backups(backup_dir: str = DEFAULT_BACKUP_DIR, keep: int = 7) -> List[str]:
+    """Delete all but the newest `keep` backups. Returns the deleted paths."""
+    removed = list_backups(backup_dir)[max(keep, 1):]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def _decompress_to_temp(backup_path: str) -> str:
+    if not os.path.exists(backup_path):
+        raise BackupError(f"Backup not found: {backup_path}")
+    fd, copy_path = tempfile.mkstemp(suffix='.db')
+    try:
+        with _open_compressed(backup_path, 'rb') as src, os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+    except (OSError, EOFError) as e:
+        os.remove(copy_path)
+        raise BackupError(f"Could not decompress {backup_path}: {e}")
+    return copy_path
+
+
+def verify_backup(backup_path: str) -> Tuple[bool, str]:
+    """Decompress a backup and run an integrity check on it."""
+    try:
+        copy_path = _decompress_to_temp(backup_path)
+    except BackupError as e:
+        return False, str(e)
+    try:
+        return integrity_check(copy_path)
+    finally:
+        os.remove(copy_path)
+
+
+def restore_database(backup_path: str, target_path: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Replace a database's contents with a verified backup.
+
+    The copy goes through the backup API into the live file, so open
+    connections see either the old or the restored database, never a mix.
+    The catalog snapshot, fuzzy search words and cached patron reports are
+    dropped afterwards.
+    """
+    target_path = target_path or database.database_path()
+    try:
+        copy_path = _decompress_to_temp(backup_path)
+    except BackupError as e:
+        return False, str(e)
+    try:
+        ok, message = integrity_check(copy_path)
+        if not ok:
+            return False, f"Refusing to restore: {message}"
+        source = database.connect(copy_path)
+        target = database.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(copy_path)
+    reset_catalog_snapshot()
+    reset_catalog_words()
+    patron_report_cache.clear()
+    return True, f"Restored {target_path} from {backup_path}."
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m services.backup', description='Library database backups')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help='take a backup')
+    create.add_argument('backup_dir', nargs='?', default=DEFAULT_BACKUP_DIR)
+    create.add_argument('--keep', type=int, default=7)
+    create.add_argument('--zstd', action='store_true', help='compress with zstd instead of gzip')
+    listing = commands.add_parser('list', help='list backups, newest first')
+    listing.add_argument('backup_dir', nargs='?', default=DEFAULT_BACKUP_DIR)
+    verify = commands.add_parser('verify', help='integrity-check a backup')
+    verify.add_argument('backup_file')
+    restore = commands.add_parser('restore', help='restore a backup into the database')
+    restore.add_argument('backup_file')
+    restore.add_argument('database', nargs='?', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'create':
+        try:
+            result = backup_database(args.backup_dir, args.keep, 'zstd' if args.zstd else 'gzip')
+        except BackupError as e:
+            print(e)
+            return 1
+        print(f"{result['path']} ({result['bytes']} bytes, {result['steps']} steps, {result['seconds']}s)")
+        for path in result['removed']:
+            print(f"rotated out {path}")
+        return 0
+    if args.command == 'list':
+        for path in list_backups(args.backup_dir):
+            print(path)
+        return 0
+    if args.command == 'verify':
+        ok, message = verify_backup(args.backup_file)
+    else:
+        ok, message = restore_database(args.backup_file, args.database)
+    print(message)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
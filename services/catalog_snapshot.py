@@ -0,0 +1,206 @@
+"""
+Catalog Snapshot Module - Columnar in-memory copy of the books table
+
+Holds the catalog as NumPy column arrays (ids, copies, interned title and
+author codes) for vectorized search and statistics. The snapshot follows
+the catalog_changes counter in database.py and only re-reads the books
+that changed since the last refresh. NumPy is optional: when it is not
+installed, snapshot_available() is False and callers use the row-based path.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import database
+from models import Book
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+def snapshot_available() -> bool:
+    """Whether the columnar snapshot can be used (NumPy is installed)."""
+    return np is not None
+
+
+class _StringColumn:
+    """Interned string column: per-row int codes into a table of unique values."""
+
+    def __init__(self):
+        self.codes_of: Dict[str, int] = {}
+        self.values: List[str] = []
+        self.lowered = np.array([], dtype=str)
+
+    def encode(self, values: List[str]) -> 'np.ndarray':
+        """Map strings to codes, adding unseen ones to the table."""
+        start = len(self.values)
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = self.codes_of.get(value)
+            if code is None:
+                code = self.codes_of[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        if len(self.values) > start:
+            added = np.char.lower(np.char.strip(np.array(self.values[start:], dtype=str)))
+            self.lowered = np.concatenate([self.lowered, added]) if start else added
+        return codes
+
+    def matching_codes(self, query: str) -> 'np.ndarray':
+        """Codes whose lowercased value contains `query`."""
+        if not self.values:
+            return np.array([], dtype=np.int32)
+        return np.flatnonzero(np.char.find(self.lowered, query) >= 0)
+
+
+class CatalogSnapshot:
+    """Columnar snapshot of the books table for one database file."""
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self._clear()
+        # Requests share one snapshot per file; refreshes and reads must not interleave
+        self._lock = threading.RLock()
+
+    def _clear(self) -> None:
+        self.seq = 0
+        self._row_of: Dict[int, int] = {}
+        self.ids = np.array([], dtype=np.int64)
+        self.total_copies = np.array([], dtype=np.int64)
+        self.available_copies = np.array([], dtype=np.int64)
+        self.alive = np.array([], dtype=bool)
+        self.titles = _StringColumn()
+        self.authors = _StringColumn()
+        self.title_codes = np.array([], dtype=np.int32)
+        self.author_codes = np.array([], dtype=np.int32)
+        # Object dtype so in-place updates never truncate to the current max width
+        self.isbns = np.array([], dtype=object)
+        self._loaded = False
+
+    def refresh(self) -> None:
+        """Load the catalog on first use, then apply only the changes logged since."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        if self._loaded and not database.catalog_changes_cover(self.seq):
+            self._clear()  # restored from a backup, or the changes since were pruned: reload
+        if not self._loaded:
+            self.seq = database.get_catalog_change_seq()
+            self._append(database.get_all_books())
+            self._loaded = True
+
+        seq, changed_ids = database.get_catalog_changes_since(self.seq)
+        if not changed_ids:
+            return
+
+        books = database.get_books_by_ids(changed_ids).values()
+        found = {book.id for book in books}
+
+        new_books = []
+        for book in books:
+            row = self._row_of.get(book.id)
+            if row is None:
+                new_books.append(book)
+                continue
+            self.total_copies[row] = book.total_copies
+            self.available_copies[row] = book.available_copies
+            self.title_codes[row] = self.titles.encode([book.title])[0]
+            self.author_codes[row] = self.authors.encode([book.author])[0]
+            self.isbns[row] = book.isbn
+            self.alive[row] = True
+
+        for book_id in changed_ids:
+            row = self._row_of.get(book_id)
+            if row is not None and book_id not in found:
+                self.alive[row] = False
+
+        if new_books:
+            self._append(new_books)
+        self.seq = seq
+
+    def _append(self, books: List[Book]) -> None:
+        if not books:
+            return
+        start = len(self.ids)
+        for offset, book in enumerate(books):
+            self._row_of[book.id] = start + offset
+        self.ids = np.concatenate([self.ids, [book.id for book in books]])
+        self.total_copies = np.concatenate([self.total_copies, [book.total_copies for book in books]])
+        self.available_copies = np.concatenate([self.available_copies, [book.available_copies for book in books]])
+        self.alive = np.concatenate([self.alive, np.ones(len(books), dtype=bool)])
+        self.title_codes = np.concatenate([self.title_codes, self.titles.encode([book.title for book in books])])
+        self.author_codes = np.concatenate([self.author_codes, self.authors.encode([book.author for book in books])])
+        self.isbns = np.concatenate([self.isbns, np.array([book.isbn for book in books], dtype=object)])
+
+    def _rows_to_books(self, rows: 'np.ndarray') -> List[Book]:
+        books = [
+            Book(int(self.ids[row]), self.titles.values[self.title_codes[row]],
+                 self.authors.values[self.author_codes[row]], self.isbns[row],
+                 int(self.total_copies[row]), int(self.available_copies[row]))
+            for row in rows
+        ]
+        books.sort(key=lambda book: book.title)
+        return books
+
+    def search(self, query: str, search_type: str) -> List[Book]:
+        """Vectorized case-insensitive substring search, ordered by title like get_all_books."""
+        with self._lock:
+            return self._search(query, search_type)
+
+    def _search(self, query: str, search_type: str) -> List[Book]:
+        if search_type == 'title':
+            mask = np.isin(self.title_codes, self.titles.matching_codes(query))
+        elif search_type == 'author':
+            mask = np.isin(self.author_codes, self.authors.matching_codes(query))
+        elif search_type == 'isbn':
+            mask = np.char.find(self.isbns.astype(str), query) >= 0 if len(self.isbns) else self.alive.copy()
+        else:
+            return []
+        return self._rows_to_books(np.flatnonzero(mask & self.alive))
+
+    def statistics(self, top_n: int = 5) -> Dict:
+        """Catalog totals, availability ratio and the authors with the most titles."""
+        with self._lock:
+            return self._statistics(top_n)
+
+    def _statistics(self, top_n: int) -> Dict:
+        total = int(self.total_copies[self.alive].sum())
+        available = int(self.available_copies[self.alive].sum())
+        counts = np.bincount(self.author_codes[self.alive], minlength=len(self.authors.values))
+        top = np.argsort(-counts, kind='stable')[:top_n]
+        return {
+            'total_titles': int(self.alive.sum()),
+            'total_copies': total,
+            'available_copies': available,
+            'availability_ratio': round(available / total, 4) if total else 0.0,
+            'top_authors': [(self.authors.values[code], int(counts[code])) for code in top if counts[code] > 0],
+        }
+
+
+# One snapshot per database file, so searches of different branch shards don't evict each other
+_snapshots: Dict[str, CatalogSnapshot] = {}
+
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    Get the refreshed snapshot for the active database file.
+
+    Returns:
+        CatalogSnapshot, or None when NumPy is not installed
+    """
+    if not snapshot_available():
+        return None
+    path = database.database_path()
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        snapshot = _snapshots.setdefault(path, CatalogSnapshot(path))
+    snapshot.refresh()
+    return snapshot
+
+
+def reset_catalog_snapshot() -> None:
+    """Drop the cached snapshots; the next call rebuilds them from scratch."""
+    _snapshots.clear()
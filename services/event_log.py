@@ -0,0 +1,276 @@
+"""
+Event Log Module - Append-only log of library operations with replay
+
+The service functions record every borrow, return, add-book, hold, payment
+and refund as an event. An event that goes with a change is handed to the
+database.py helper making it (see database.Event), which inserts it in the
+same transaction as the whole change (a borrow's loan, copy and hold, say):
+the log holds exactly the changes that committed, in commit order, so a
+checkpoint never counts a change twice.
+
+Events with no write of their own (overdue notices, or every event when the
+storage backend is not SQLite) go through record_event(), which only queues
+them; a writer thread commits queued events in groups (one transaction per
+batch). Events it cannot write are logged and counted in EventLog.dropped.
+
+replay_events() rebuilds book availability, open loans and the hold queues
+from the latest checkpoint plus the events after it, for audits (verify_against_tables) and
+for rebuilding derived state (rebuild_availability).
+
+Usage:
+    python -m services.event_log checkpoint|verify|rebuild
+"""
+
+import atexit
+import json
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import database
+from config import active_config
+
+logger = logging.getLogger(__name__)
+
+
+class EventLog:
+    """Buffered, group-committed writer for events that are not part of a database change."""
+
+    def __init__(self, batch_size: int = 256, flush_interval: float = 0.05):
+        """
+        Args:
+            batch_size: Queued events that trigger an immediate commit
+            flush_interval: Longest an event waits in the queue, in seconds
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._pending: List[Tuple] = []
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def append(self, event_type: str, patron_id: str = None, book_id: int = None, **data) -> None:
+        """Queue an event; it is committed with the next batch."""
+        event = (database.database_path(), active_config(), datetime.now().isoformat(), event_type, patron_id,
+                 book_id, json.dumps(data, default=str))
+        with self._cond:
+            self._pending.append(event)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> None:
+        """Commit everything queued so far before returning."""
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._write(batch)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            self.flush()
+
+    def _write(self, batch: List[Tuple]) -> None:
+        # Events are tagged with the database (and config) they belong to; commit each group in one transaction
+        by_path: Dict[str, List[Tuple]] = {}
+        configs = {}
+        for path, config, *event in batch:
+            by_path.setdefault(path, []).append(event)
+            configs.setdefault(path, config)
+        for path, events in by_path.items():
+            try:
+                conn = database.connect(path, configs[path])
+                with conn:
+                    conn.executemany('''
+                        INSERT INTO events (ts, type, patron_id, book_id, payload) VALUES (?, ?, ?, ?, ?)
+                    ''', events)
+                conn.close()
+                self.written += len(events)
+            except Exception:
+                self.dropped += len(events)
+                logger.exception('Dropped %d events for %s', len(events), path)
+
+
+event_log = EventLog()
+atexit.register(event_log.flush)
+
+
+def event(event_type: str, patron_id: str = None, book_id: int = None, **data) -> database.Event:
+    """An event for a database.py mutation helper to insert with its change."""
+    return event_type, patron_id, book_id, data
+
+
+def record_event(event_type: str, patron_id: str = None, book_id: int = None, **data) -> None:
+    """Queue an event that has no database change to be written with."""
+    event_log.append(event_type, patron_id, book_id, **data)
+
+
+def record_events(events: List[database.Event]) -> None:
+    """Queue events built with event(), e.g. when the storage backend cannot write them with its change."""
+    for event_type, patron_id, book_id, data in events:
+        event_log.append(event_type, patron_id, book_id, **data)
+
+
+def write_checkpoint() -> int:
+    """
+    Record the current books, open loans and holds as a checkpoint event, so replay can start from here.
+
+    Queued events are written first. The state is then read and the checkpoint
+    inserted in one write transaction, so each change's event is either before
+    the checkpoint and in its state, or after it and not.
+    """
+    event_log.flush()
+    conn = database.get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')  # no other writer between the reads and the insert
+        books = {row['id']: [row['total_copies'], row['available_copies']]
+                 for row in conn.execute('SELECT id, total_copies, available_copies FROM books')}
+        holds = [list(row) for row in conn.execute('''
+            SELECT id, book_id, status FROM holds WHERE status IN ('waiting', 'ready') ORDER BY id
+        ''')]
+        loans = [list(row) for row in conn.execute('''
+            SELECT patron_id, book_id, due_date FROM borrow_records WHERE return_date IS NULL ORDER BY due_date
+        ''')]
+        database.insert_events(conn, [event('checkpoint', books=books, loans=loans, holds=holds)])
+        seq = conn.execute("SELECT MAX(seq) FROM events WHERE type = 'checkpoint'").fetchone()[0]
+        conn.commit()
+        return seq
+    finally:
+        conn.close()
+
+
+def replay_events() -> Dict:
+    """
+    Rebuild book availability and open loans from the log.
+
+    Returned copies go to the oldest waiting hold on the book before the
+    shelf, as the books_allocate_holds trigger does.
+
+    Returns:
+        dict: books ({book_id: {'total_copies', 'available_copies'}}),
+              open_loans ({(patron_id, book_id): count}), events replayed,
+              the last sequence number and elapsed seconds
+    """
+    start = time.perf_counter()
+    event_log.flush()
+    conn = database.get_db_connection()
+    checkpoint = conn.execute('''
+        SELECT seq, payload FROM events WHERE type = 'checkpoint' ORDER BY seq DESC LIMIT 1
+    ''').fetchone()
+
+    books: Dict[int, Dict] = {}
+    open_loans: Dict[Tuple[str, int], int] = {}
+    waiting: Dict[int, List[int]] = {}  # book_id -> hold ids, oldest first
+    ready: Dict[int, int] = {}  # hold id -> book_id, for holds with a copy set aside
+    from_seq = 0
+    if checkpoint:
+        state = json.loads(checkpoint['payload'])
+        books = {int(book_id): {'total_copies': total, 'available_copies': available}
+                 for book_id, (total, available) in state['books'].items()}
+        for patron_id, book_id, _ in state['loans']:
+            open_loans[(patron_id, book_id)] = open_loans.get((patron_id, book_id), 0) + 1
+        for hold_id, book_id, status in state.get('holds', []):
+            if status == 'ready':
+                ready[hold_id] = book_id
+            else:
+                waiting.setdefault(book_id, []).append(hold_id)
+        from_seq = checkpoint['seq']
+
+    def release_copy(book_id):
+        if waiting.get(book_id):
+            ready[waiting[book_id].pop(0)] = book_id
+        elif book_id in books:
+            books[book_id]['available_copies'] += 1
+
+    # Book IDs are assigned by the books table; add-book events are keyed by ISBN
+    ids_by_isbn = dict(conn.execute('SELECT isbn, id FROM books').fetchall())
+
+    count = 0
+    last_seq = from_seq
+    for seq, event_type, patron_id, book_id, payload in conn.execute('''
+        SELECT seq, type, patron_id, book_id, payload FROM events WHERE seq > ? ORDER BY seq
+    ''', (from_seq,)):
+        count += 1
+        last_seq = seq
+        if event_type == 'book_added':
+            data = json.loads(payload)
+            added_id = ids_by_isbn.get(data['isbn'])
+            if added_id is not None:
+                books[added_id] = {'total_copies': data['total_copies'], 'available_copies': data['total_copies']}
+        elif event_type == 'book_borrowed':
+            # A borrow against a ready hold takes the copy set aside for it
+            if ready.pop(json.loads(payload).get('hold_id'), None) is None and book_id in books:
+                books[book_id]['available_copies'] -= 1
+            open_loans[(patron_id, book_id)] = open_loans.get((patron_id, book_id), 0) + 1
+        elif event_type == 'hold_placed':
+            waiting.setdefault(book_id, []).append(json.loads(payload)['hold_id'])
+        elif event_type == 'hold_cancelled':
+            hold_id = json.loads(payload)['hold_id']
+            if hold_id in waiting.get(book_id, []):
+                waiting[book_id].remove(hold_id)
+            elif ready.pop(hold_id, None) is not None:
+                release_copy(book_id)
+        elif event_type == 'book_returned':
+            release_copy(book_id)
+            remaining = open_loans.get((patron_id, book_id), 0) - 1
+            if remaining > 0:
+                open_loans[(patron_id, book_id)] = remaining
+            else:
+                open_loans.pop((patron_id, book_id), None)
+    conn.close()
+
+    return {
+        'books': books,
+        'open_loans': open_loans,
+        'events': count,
+        'last_seq': last_seq,
+        'elapsed': round(time.perf_counter() - start, 3),
+    }
+
+
+def verify_against_tables(replayed: Dict = None) -> List[Dict]:
+    """Compare replayed availability with the books table. Returns one entry per disagreeing book."""
+    replayed = replayed or replay_events()
+    conn = database.get_db_connection()
+    current = {row['id']: row['available_copies']
+               for row in conn.execute('SELECT id, available_copies FROM books')}
+    conn.close()
+    return [
+        {'book_id': book_id, 'table': current.get(book_id), 'log': state['available_copies']}
+        for book_id, state in sorted(replayed['books'].items())
+        if current.get(book_id) != state['available_copies']
+    ]
+
+
+def rebuild_availability(replayed: Dict = None) -> int:
+    """Overwrite books.available_copies with the replayed values. Returns the number of books changed."""
+    differences = verify_against_tables(replayed)
+    if differences:
+        # The replayed values already account for the hold queues; don't let the trigger allocate again
+        database.set_available_copies({d['book_id']: d['log'] for d in differences})
+    return len(differences)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    if command == 'checkpoint':
+        print(f'checkpoint written at seq {write_checkpoint()}')
+    else:
+        replayed = replay_events()
+        print(f"replayed {replayed['events']} events up to seq {replayed['last_seq']} in {replayed['elapsed']}s")
+        if command == 'rebuild':
+            print(f'{rebuild_availability(replayed)} books updated')
+        else:
+            for difference in verify_against_tables(replayed):
+                print(f"book {difference['book_id']}: table {difference['table']}, log {difference['log']}")
@@ -0,0 +1,151 @@
+"""
+Fee Ledger Module - Persisted late fee accrual
+
+Each overdue loan has one row in the `fees` table holding its days overdue,
+the fee accrued so far (R5 tiers, capped at $15) and how much has been paid.
+A daily job advances only the loans that are still open and overdue; returns
+settle the row through a database trigger. Reads use the ledger row when it
+is current and fall back to computing the same tiers from the due date.
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+import database
+from config import LibraryConfig, active_config, use_config
+from database import (
+    LATE_FEE_DAILY_RATE, LATE_FEE_EXTENDED_RATE, LATE_FEE_TIER_DAYS, MAX_LATE_FEE
+)
+
+
+def late_fee_for_days(days_overdue: int) -> float:
+    """R5 late fee for a loan `days_overdue` days past due."""
+    if days_overdue <= 0:
+        return 0.0
+    if days_overdue <= LATE_FEE_TIER_DAYS:
+        fee = days_overdue * LATE_FEE_DAILY_RATE
+    else:
+        fee = LATE_FEE_TIER_DAYS * LATE_FEE_DAILY_RATE + (days_overdue - LATE_FEE_TIER_DAYS) * LATE_FEE_EXTENDED_RATE
+    return round(min(fee, MAX_LATE_FEE), 2)
+
+
+def days_between(due_date: datetime, end: datetime) -> int:
+    """Whole calendar days from the due date to `end` (0 if not late)."""
+    return max((end.date() - due_date.date()).days, 0)
+
+
+def fee_for_loan(record: Dict, now: datetime = None) -> Tuple[int, float, float]:
+    """
+    Days overdue, fee accrued and amount paid for a borrow record.
+
+    Uses the record's ledger columns (fee_*) when they are up to date: through
+    today for an open loan, through the return date for a returned one.
+    Otherwise the fee is computed from the dates.
+
+    Returns:
+        tuple: (days_overdue, accrued, paid)
+    """
+    now = now or datetime.now()
+    end = record.get('return_date') or now
+    paid = record.get('fee_paid') or 0.0
+
+    if record.get('fee_accrued_through') == end.date().isoformat():
+        return record['fee_days_overdue'], record['fee_accrued'], paid
+
+    days = days_between(record['due_date'], end)
+    return days, late_fee_for_days(days), paid
+
+
+def accrue_late_fees(as_of: datetime = None) -> int:
+    """
+    Daily incremental accrual: advance the ledger for open, overdue loans.
+
+    Loans already accrued through the day, or already at the $15 cap, are
+    not touched, so re-running the job on the same day is cheap.
+
+    Returns:
+        int: Number of ledger rows written
+    """
+    as_of = as_of or datetime.now()
+    written = 0
+    for branch_id in database.branch_ids():
+        with database.use_branch(branch_id):
+            written += database.accrue_fees(as_of.date().isoformat())
+    return written
+
+
+class FeeAccrualJob:
+    """Runs accrue_late_fees() at start-up and then just after each midnight."""
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        """
+        Args:
+            clock: Returns the current time (injectable for testing)
+        """
+        self._clock = clock
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[date] = None
+        # The config and database file active at start(), for the worker thread to use
+        self._config: Optional[LibraryConfig] = None
+        self._database: Optional[str] = None
+
+    def run_if_due(self) -> int:
+        """Accrue once per calendar day. Returns the number of ledger rows written."""
+        now = self._clock()
+        if self.last_run == now.date():
+            return 0
+        written = accrue_late_fees(now)
+        self.last_run = now.date()
+        return written
+
+    def seconds_until_next_run(self) -> float:
+        now = self._clock()
+        midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        return max((midnight - now).total_seconds(), 0)
+
+    def start(self) -> None:
+        """Start the background job against the config and database active now."""
+        if self._thread is not None:
+            return
+        self._config, self._database = active_config(), database.database_path()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='fee-accrual', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background job."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with use_config(self._config), database.use_database(self._database):
+                    self.run_if_due()
+            except Exception:
+                pass  # database unavailable; try again at the next boundary
+            self._stop.wait(self.seconds_until_next_run() + 1)
+
+
+_job: Optional[FeeAccrualJob] = None
+
+
+def start_fee_accrual(job: FeeAccrualJob = None) -> FeeAccrualJob:
+    """Start the process-wide daily accrual job."""
+    global _job
+    if _job is None:
+        _job = job if job is not None else FeeAccrualJob()
+        _job.start()
+    return _job
+
+
+def stop_fee_accrual() -> None:
+    """Stop and discard the process-wide accrual job."""
+    global _job
+    if _job is not None:
+        _job.stop()
+        _job = None
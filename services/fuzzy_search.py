@@ -0,0 +1,227 @@
+"""
+Fuzzy Search Module - Typo-tolerant title and author search
+
+Finds "The Great Gatsby" for "gatsbby" and F. Scott Fitzgerald for
+"fitzgerld". Each query word may be a few edits away from a catalog word:
+none for words of up to 3 letters, one up to 6 letters, two beyond that.
+
+The distance is never computed against the whole catalog:
+1. A trigram index over the distinct title and author words (a few hundred
+   thousand even for millions of titles) picks the words that share enough
+   trigrams with the query word to be within the allowed edits.
+2. A Levenshtein check that gives up as soon as the limit is exceeded
+   confirms each candidate.
+3. The surviving words go to the books_fts full-text index as one query
+   (any spelling of each query word, all query words), and the matches are
+   ranked by total edits, then BM25.
+
+The word lists come from the full-text index and then follow the
+catalog_changes counter, like the catalog snapshot. Without a full-text
+index, fuzzy_scan() checks the query against every book instead.
+"""
+
+import heapq
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import database
+from services.search_query import words_of
+
+NGRAM = 3
+FUZZY_SEARCH_TYPES = ('title', 'author')
+
+
+def max_edits(word: str) -> int:
+    """Typos tolerated in a query word: none up to 3 letters, one up to 6, then two."""
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 6 else 2
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> Optional[int]:
+    """Edit distance between a and b, or None as soon as it is known to exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    if a == b:
+        return 0
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+def _ngrams(word: str) -> set:
+    padded = '$' * (NGRAM - 1) + word + '$' * (NGRAM - 1)
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class WordIndex:
+    """Distinct words with a trigram index, for finding the words a few edits away from a query word."""
+
+    def __init__(self):
+        self.words: List[str] = []
+        self._known = set()
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    def add(self, words: Iterable[str]) -> None:
+        for word in words:
+            if word in self._known:
+                continue
+            self._known.add(word)
+            for gram in _ngrams(word):
+                self._postings[gram].append(len(self.words))
+            self.words.append(word)
+
+    def similar(self, word: str, limit: int) -> Dict[str, int]:
+        """Indexed words within `limit` edits of `word`, with their distances."""
+        if limit == 0:
+            return {word: 0} if word in self._known else {}
+        grams = _ngrams(word)
+        # Each edit destroys at most NGRAM of the word's trigrams
+        needed = max(len(grams) - limit * NGRAM, 1)
+        shared = defaultdict(int)
+        for gram in grams:
+            for index in self._postings.get(gram, ()):
+                shared[index] += 1
+        found = {}
+        for index, count in shared.items():
+            if count >= needed:
+                distance = bounded_levenshtein(word, self.words[index], limit)
+                if distance is not None:
+                    found[self.words[index]] = distance
+        return found
+
+
+class CatalogWords:
+    """The title and author WordIndexes of one database file."""
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self._clear()
+        self._lock = threading.Lock()
+
+    def _clear(self) -> None:
+        self.seq = 0
+        self.columns = {column: WordIndex() for column in FUZZY_SEARCH_TYPES}
+        self._loaded = False
+
+    def refresh(self) -> bool:
+        """Load the words on first use, then add those of books changed since; False without an index."""
+        with self._lock:
+            if self._loaded and not database.catalog_changes_cover(self.seq):
+                self._clear()  # restored from a backup, or the changes since were pruned: reload
+            if not self._loaded:
+                seq = database.get_catalog_change_seq()
+                for column, index in self.columns.items():
+                    words = database.get_fts_vocabulary(column)
+                    if words is None:
+                        return False
+                    index.add(words)
+                self.seq, self._loaded = seq, True
+
+            # Words are only ever added: a word no book uses any more just finds nothing in books_fts
+            seq, changed_ids = database.get_catalog_changes_since(self.seq)
+            if changed_ids:
+                for book in database.get_books_by_ids(changed_ids).values():
+                    for column, index in self.columns.items():
+                        index.add(words_of(book[column]))
+            self.seq = seq
+            return True
+
+    def similar(self, column: str, word: str) -> Dict[str, int]:
+        with self._lock:
+            return self.columns[column].similar(word, max_edits(word))
+
+
+# One word list per database file, like the catalog snapshots
+_catalog_words: Dict[str, CatalogWords] = {}
+
+
+def get_catalog_words() -> Optional[CatalogWords]:
+    """The refreshed word lists of the active database file, or None when it has no full-text index."""
+    path = database.database_path()
+    words = _catalog_words.get(path)
+    if words is None:
+        words = _catalog_words.setdefault(path, CatalogWords(path))
+    return words if words.refresh() else None
+
+
+def reset_catalog_words() -> None:
+    """Drop the cached word lists; the next search reloads them."""
+    _catalog_words.clear()
+
+
+def _total_edits(spellings: List[Dict[str, int]], value: str) -> Optional[int]:
+    """Sum over query words of the closest spelling found in `value`, or None if one is missing."""
+    value_words = set(words_of(value))
+    total = 0
+    for distances in spellings:
+        found = [distance for word, distance in distances.items() if word in value_words]
+        if not found:
+            return None
+        total += min(found)
+    return total
+
+
+def fuzzy_search(query: str, search_type: str, limit: int, offset: int = 0) -> Optional[Tuple[List, int]]:
+    """
+    Typo-tolerant search of the active database through its indexes.
+
+    Returns:
+        tuple: (books on the requested page, total matches), or None when
+               the database has no full-text index
+    """
+    words = words_of(query or '')
+    if search_type not in FUZZY_SEARCH_TYPES or not words:
+        return [], 0
+    catalog_words = get_catalog_words()
+    if catalog_words is None:
+        return None
+
+    spellings = [catalog_words.similar(search_type, word) for word in words]
+    if not all(spellings):
+        return [], 0
+    expression = search_type + ' : (' + ' AND '.join(
+        '(' + ' OR '.join('"' + word.replace('"', '""') + '"' for word in distances) + ')'
+        for distances in spellings
+    ) + ')'
+    rows = database.get_fts_rows(expression, search_type)
+    if rows is None:
+        return None
+
+    ranked = []
+    for book_id, value, bm25 in rows:
+        edits = _total_edits(spellings, value)
+        # The index tokenizes a few characters (e.g. accents) differently; count those as worst case
+        ranked.append((sum(max_edits(word) for word in words) if edits is None else edits, -bm25, value.lower(), book_id))
+    page = heapq.nsmallest(offset + limit, ranked)[offset:]
+    books = database.get_books_by_ids([book_id for *_, book_id in page])
+    return [books[book_id] for *_, book_id in page if book_id in books], len(ranked)
+
+
+def fuzzy_scan(books: Iterable, query: str, search_type: str, limit: int, offset: int = 0) -> Tuple[List, int]:
+    """Typo-tolerant search by checking every book; for storage backends without a full-text index."""
+    words = words_of(query or '')
+    if search_type not in FUZZY_SEARCH_TYPES or not words:
+        return [], 0
+
+    ranked = []
+    for book in books:
+        value = str(book.get(search_type, ''))
+        total = 0
+        for word in words:
+            distances = [bounded_levenshtein(word, other, max_edits(word)) for other in set(words_of(value))]
+            distances = [distance for distance in distances if distance is not None]
+            if not distances:
+                break
+            total += min(distances)
+        else:
+            ranked.append((total, value.lower(), book.get('id'), book))
+    page = heapq.nsmallest(offset + limit, ranked, key=lambda entry: entry[:3])[offset:]
+    return [entry[3] for entry in page], len(ranked)
@@ -6,14 +6,117 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books
+    update_borrow_record_return_date, get_all_books, get_patron_borrow_history,
+    get_books_by_ids, borrow_books_batch, return_books_batch, get_open_borrow_record
 )
 from services.payment_service import PaymentGateway
+from services.payment_orchestrator import IdempotencyKeyReusedError, PaymentOrchestrator
+from services.catalog_snapshot import get_catalog_snapshot, snapshot_available
+from services.report_cache import patron_report_cache
+from services import overdue_sweeper
+from services.event_log import event, record_event, record_events
+from services.fee_ledger import fee_for_loan, late_fee_for_days
+from services.search_query import QueryError, evaluate as evaluate_query, matches as query_matches, parse_query
+from services.fuzzy_search import FUZZY_SEARCH_TYPES, fuzzy_scan, fuzzy_search
+from database import MAX_LATE_FEE, get_fee_payment, record_fee_payment, record_fee_refund
+from database import get_change_feed, get_change_feed_pruned_seq, get_change_feed_seq, get_patron_version
+from database import cancel_hold, fulfill_hold, get_hold, get_patron_hold, insert_hold
+import database
+import heapq
+import re
+import sys
+import threading
+import time
+
+# How often a long-polling change feed request re-checks for new entries (seconds)
+CHANGE_FEED_POLL_INTERVAL = 0.25
+
+# Hold status long-polls wake on returns and cancellations in this process, and
+# re-read the database at this interval for changes made by other processes (seconds)
+HOLD_POLL_INTERVAL = 1.0
+_hold_updates = threading.Condition()
+_hold_generation = 0
+
+# Page size for ranked searches when the caller does not give one
+SEARCH_PAGE_SIZE = 20
+
+
+# Data-access helpers the service functions look up by module-level name.
+STORAGE_HELPERS = (
+    'get_book_by_id', 'get_book_by_isbn', 'get_patron_borrow_count',
+    'insert_book', 'insert_borrow_record', 'update_book_availability',
+    'update_borrow_record_return_date', 'get_all_books',
+    'get_borrow_records_by_patron', 'get_books_by_ids',
+    'borrow_books_batch', 'return_books_batch', 'get_borrow_record'
+)
+_default_helpers: Dict = {}
+# The backend set by use_storage() (None: the database.py helpers) and the helpers it put in place
+_storage = None
+_installed_helpers: Dict = {}
+
+
+def use_storage(storage=None) -> None:
+    """
+    Point the service functions at a storage backend.
+
+    Rebinds the module-level data-access helpers (the same names tests
+    monkeypatch) to the methods of a storage.LibraryStorage instance.
+    Passing None restores the default SQLite helpers.
+
+    Args:
+        storage: Backend instance, e.g. storage.MemoryStorage(), or None
+    """
+    global _storage
+    patron_report_cache.clear()
+
+    _storage = storage
+    for name in STORAGE_HELPERS:
+        helper = getattr(storage, name) if storage is not None else _default_helpers[name]
+        _installed_helpers[name] = helper
+        for module in _service_modules():
+            setattr(module, name, helper)
+
+
+def _service_modules() -> List:
+    """This module and the library_service shim, whose helper names tests patch."""
+    modules = [sys.modules[__name__]]
+    if 'library_service' in sys.modules:
+        modules.append(sys.modules['library_service'])
+    return modules
+
+
+def _sqlite_backed(*helpers: str) -> bool:
+    """
+    Whether the SQLite-only features (holds, full-text and word indexes,
+    catalog snapshot) apply: the storage backend declares
+    LibraryStorage.sqlite_backed, and none of `helpers` has been replaced
+    since use_storage() (e.g. by a test fake with no database behind it).
+    """
+    if _storage is not None and not _storage.sqlite_backed:
+        return False
+    return all(getattr(module, name, _installed_helpers[name]) is _installed_helpers[name]
+               for module in _service_modules() for name in helpers)
+
+
+def _logged(name: str, *args, events: List[database.Event]):
+    """
+    Call the storage helper `name` so that `events` reach the event log with
+    its change: in the helper's own transaction when _sqlite_backed(name),
+    otherwise appended once the helper reports success.
+    """
+    helper = globals()[name]
+    if _sqlite_backed(name):
+        return helper(*args, events=events)
+    result = helper(*args)
+    if result[0] if isinstance(result, tuple) else result:  # stand-ins may return (ok, message)
+        record_events(events)
+    return result
 
 
 
@@ -50,12 +153,14 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
 
         return False, "A book with this ISBN already exists."
 
-    ins = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
+    ins = _logged('insert_book', title.strip(), author.strip(), isbn, total_copies, total_copies, events=[
+        event('book_added', isbn=isbn, title=title.strip(), author=author.strip(), total_copies=total_copies)
+    ])
     
     ok = ins[0] if isinstance(ins, tuple) else bool(ins)
 
     if ok:
- 
+
         return True, 'Book "{}" successfully added to the catalog.'.format(title.strip())
         
     else:
@@ -91,7 +196,14 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
         return False, "Book not found."
 
-    if book.get("available_copies", 0) <= 0:
+    # A copy set aside for this patron's ready hold is theirs, even with others on the shelf (holds live in SQLite)
+    hold = get_patron_hold(patron_id, book_id) if _sqlite_backed('get_book_by_id') else None
+
+    if hold and hold["status"] != "ready":
+
+        hold = None
+
+    if not hold and book.get("available_copies", 0) <= 0:
 
         return False, "This book is currently not available."
 
@@ -103,13 +215,30 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
     due_date = borrow_date + timedelta(days=14)
 
-    if not insert_borrow_record(patron_id, book_id, borrow_date, due_date):
-        
-        return False, "Database error occurred while creating borrow record."
+    if _sqlite_backed('get_book_by_id', 'insert_borrow_record', 'update_book_availability', 'borrow_books_batch'):
 
-    if not update_book_availability(book_id, -1):
+        # The loan, the copy (the ready hold's set-aside one first) and the event in one transaction
+        if not borrow_books_batch(patron_id, [book_id], borrow_date, due_date,
+                                  events=[event('book_borrowed', patron_id, book_id, due_date=due_date.isoformat())]):
 
-        return False, "Database error occurred while updating book availability."
+            return False, "Database error occurred while creating borrow record."
+
+    else:
+
+        if not insert_borrow_record(patron_id, book_id, borrow_date, due_date):
+
+            return False, "Database error occurred while creating borrow record."
+
+        # The copy set aside for a ready hold was never counted as available
+        borrowed = [event('book_borrowed', patron_id, book_id, due_date=due_date.isoformat(),
+                          hold_id=hold["id"] if hold else None)]
+        if not (fulfill_hold(hold["id"], events=borrowed) if hold
+                else _logged('update_book_availability', book_id, -1, events=borrowed)):
+
+            return False, "Database error occurred while updating book availability."
+
+    patron_report_cache.invalidate(_report_key(patron_id))
+    overdue_sweeper.loan_borrowed(patron_id, book_id, due_date)
 
     return True, f'Borrow successful. Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -149,13 +278,34 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not book:
         return False, "This book cannot be located."
 
-    if not update_borrow_record_return_date(patron_id, book_id, datetime.now()):
+    returned = [event('book_returned', patron_id, book_id)]
+
+    if _sqlite_backed('update_borrow_record_return_date', 'update_book_availability', 'return_books_batch'):
+
+        # The loan, the copy and the event in one transaction
+        closed = return_books_batch(patron_id, [book_id], datetime.now(), events=returned)
+
+        if closed is None:
 
-        return False, "No active borrow record."
+            return False, "Failed to update book availability."
 
-    if not update_book_availability(book_id, +1):
+        if not closed:
 
-        return False, "Failed to update book availability."
+            return False, "No active borrow record."
+
+    else:
+
+        if not update_borrow_record_return_date(patron_id, book_id, datetime.now()):
+
+            return False, "No active borrow record."
+
+        if not _logged('update_book_availability', book_id, +1, events=returned):
+
+            return False, "Failed to update book availability."
+
+    patron_report_cache.invalidate(_report_key(patron_id))
+    overdue_sweeper.loan_returned(patron_id, book_id)
+    _notify_hold_waiters()
 
     return True, f'Book "{book["title"]}" has been returned.'
 
@@ -175,6 +325,179 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
 
 
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow several books for one patron in a single transaction (checkout desk).
+
+    The patron is validated once, the 5-book limit is checked against the
+    whole batch, and every valid item is applied together or not at all.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow
+
+    Returns:
+        tuple: (success: bool, message: str, results: list of
+                {'book_id', 'success', 'message'} per requested item)
+    """
+
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+
+        return False, "Invalid patron ID. Must be exactly 6 digits.", []
+
+    if not book_ids:
+
+        return False, "No books to borrow.", []
+
+    books = get_books_by_ids(book_ids)
+
+    results = []
+    accepted = []
+    remaining = {book_id: book['available_copies'] for book_id, book in books.items()}
+    # As in borrow_book_by_patron, a ready hold's set-aside copy is the patron's to take first
+    ready = set()
+    if _sqlite_backed('get_books_by_ids', 'borrow_books_batch'):
+        for book_id in books:
+            hold = get_patron_hold(patron_id, book_id)
+            if hold and hold["status"] == "ready":
+                ready.add(book_id)
+
+    for book_id in book_ids:
+        if book_id not in books:
+            results.append({'book_id': book_id, 'success': False, 'message': "Book not found."})
+        elif book_id in ready:
+            ready.discard(book_id)
+            accepted.append(book_id)
+            results.append({'book_id': book_id, 'success': True, 'message': ''})
+        elif remaining[book_id] <= 0:
+            results.append({'book_id': book_id, 'success': False, 'message': "This book is currently not available."})
+        else:
+            remaining[book_id] -= 1
+            accepted.append(book_id)
+            results.append({'book_id': book_id, 'success': True, 'message': ''})
+
+    if not accepted:
+
+        return False, "None of the requested books could be borrowed.", results
+
+    if get_patron_borrow_count(patron_id) + len(accepted) > 5:
+
+        message = "You have reached the maximum borrowing limit of 5 books."
+        return False, message, [dict(r, success=False, message=r['message'] or message) for r in results]
+
+    borrow_date = datetime.now()
+
+    due_date = borrow_date + timedelta(days=14)
+
+    if not _logged('borrow_books_batch', patron_id, accepted, borrow_date, due_date, events=[
+        event('book_borrowed', patron_id, book_id, due_date=due_date.isoformat()) for book_id in accepted
+    ]):
+
+        message = "Database error occurred while creating borrow records."
+        return False, message, [dict(r, success=False, message=r['message'] or message) for r in results]
+
+    patron_report_cache.invalidate(_report_key(patron_id))
+    for book_id in accepted:
+        overdue_sweeper.loan_borrowed(patron_id, book_id, due_date)
+
+    due = f'Borrow successful. Due date: {due_date.strftime("%Y-%m-%d")}.'
+    results = [dict(r, message=due) if r['success'] else r for r in results]
+
+    return True, f"Borrowed {len(accepted)} of {len(book_ids)} books.", results
+
+
+
+
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Return several books for one patron in a single transaction.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books being returned
+
+    Returns:
+        tuple: (success: bool, message: str, results: list of
+                {'book_id', 'success', 'message'} per requested item)
+    """
+
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+
+        return False, "The patron ID entered is invalid - 6 digits only.", []
+
+    if not book_ids:
+
+        return False, "No books to return.", []
+
+    books = get_books_by_ids(book_ids)
+
+    requested = [book_id for book_id in book_ids if book_id in books]
+    # Only the books that had an open loan are logged, so the events are written per book
+    logged = _sqlite_backed('return_books_batch')
+    if logged:
+        returned = return_books_batch(patron_id, requested, datetime.now(),
+                                      events=[event('book_returned', patron_id, book_id) for book_id in requested])
+    else:
+        returned = return_books_batch(patron_id, requested, datetime.now())
+
+    if returned is None:
+
+        return False, "Database error occurred while returning books.", [
+            {'book_id': book_id, 'success': False, 'message': "Database error occurred while returning books."}
+            for book_id in book_ids
+        ]
+
+    results = []
+    for book_id in book_ids:
+        if book_id not in books:
+            results.append({'book_id': book_id, 'success': False, 'message': "This book cannot be located."})
+        elif book_id in returned:
+            returned.remove(book_id)
+            overdue_sweeper.loan_returned(patron_id, book_id)
+            if not logged:
+                record_event('book_returned', patron_id, book_id)
+            results.append({'book_id': book_id, 'success': True,
+                            'message': f'Book "{books[book_id]["title"]}" has been returned.'})
+        else:
+            results.append({'book_id': book_id, 'success': False, 'message': "No active borrow record."})
+
+    count = sum(1 for r in results if r['success'])
+    if count:
+        patron_report_cache.invalidate(_report_key(patron_id))
+        _notify_hold_waiters()
+
+    return count > 0, f"Returned {count} of {len(book_ids)} books.", results
+
+
+
+
+
+def get_book_availability(book_ids: List[int]) -> Dict[int, Optional[Dict]]:
+    """
+    Look up availability for many books at once.
+
+    Args:
+        book_ids: IDs of the books to check
+
+    Returns:
+        dict: For each requested ID, its available/total copies, or None if not found
+    """
+    books = get_books_by_ids(book_ids)
+    availability = {}
+    for book_id in book_ids:
+        book = books.get(book_id)
+        availability[book_id] = {
+            'available_copies': book['available_copies'],
+            'total_copies': book['total_copies'],
+            'available': book['available_copies'] > 0
+        } if book else None
+    return availability
+
+
+
+
+
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
 
     info_book = get_book_by_id(book_id)
@@ -184,28 +507,28 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
 
     import database
 
-    get_borrow_record = getattr(database, "get_borrow_record", None)
+    get_record = getattr(database, "get_borrow_record", None)
 
-    info_loan = get_borrow_record(patron_id, book_id) if callable(get_borrow_record) else None
+    if not callable(get_record):
+        from library_service import get_borrow_record as get_record  # same module name tests patch
+
+    info_loan = get_record(patron_id, book_id)
 
     if not info_loan or info_loan.get("due_date") is None:
 
         return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'The borrow record has not been located'}
 
-    past_due = info_loan["due_date"]
-    date_now = datetime.now()
-
-    days_past_due = max((date_now - past_due).days, 0)
-
-    daily_fine = 0.25
-
-    total_fine = round(days_past_due * daily_fine, 2)
+    # Ledger row if the daily accrual is current, otherwise the same R5 tiers from the due date
+    days_past_due, total_fine, amount_paid = fee_for_loan(info_loan)
 
     return {
 
-        'fee_amount': total_fine,
+        'fee_amount': round(max(total_fine - amount_paid, 0), 2),
         'days_overdue': days_past_due,
-        'status': 'Your late fee has been calculated' if days_past_due > 0 else 'No overdue charge'
+        'status': 'Your late fee has been calculated' if days_past_due > 0 else 'No overdue charge',
+        'fee_accrued': total_fine,
+        'amount_paid': amount_paid,
+        'loan_id': info_loan.get('id'),
     }
 
 
@@ -225,6 +548,11 @@ def search_books_in_catalog(query: str, search_type: str) -> List[Dict]:
 
     from library_service import get_all_books  # same module name tests patch
 
+    # The columnar snapshot mirrors the SQLite books table, so only use it
+    # when the catalog is read from there (not under another backend)
+    if _sqlite_backed('get_all_books') and snapshot_available():
+        return get_catalog_snapshot().search(query, search_type)
+
     books = get_all_books()
     if not books:
         return []
@@ -245,6 +573,291 @@ def search_books_in_catalog(query: str, search_type: str) -> List[Dict]:
     return matches
 
 
+def _match_tier(value: str, query: str) -> int:
+    """3 for an exact match, 2 for a prefix, 1 for a word prefix, 0 for any other substring."""
+    if value == query:
+        return 3
+    if value.startswith(query):
+        return 2
+    if re.search(r'(?<![0-9a-z])' + re.escape(query), value):
+        return 1
+    return 0
+
+
+def search_books_ranked(query: str, search_type: str, limit: int = SEARCH_PAGE_SIZE,
+                        offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    Search like search_books_in_catalog(), best matches first, one page at a time.
+
+    Matches are ranked exact, then prefix, then word prefix, then any other
+    substring. Within a tier, title and author searches order by BM25 when
+    the database has a full-text index, then by the matched value. Only the
+    top offset + limit matches are selected (a heap, not a full sort).
+    search_type 'query' runs a multi-field query instead (search_books_by_query).
+
+    Returns:
+        tuple: (books on the requested page, total number of matches)
+    """
+    if str(search_type).strip().lower() == "query":
+        return search_books_by_query(query, limit, offset)
+
+    matches = search_books_in_catalog(query, search_type)
+    if not matches or limit <= 0:
+        return [], len(matches)
+
+    query = str(query).strip().lower()
+    search_type = str(search_type).strip().lower()
+
+    from library_service import get_all_books  # same module name tests patch
+
+    bm25 = {}
+    if _sqlite_backed('get_all_books'):
+        terms = re.findall(r'[0-9a-z]+', query)
+        bm25 = database.get_fts_scores(terms, search_type) or {}
+
+    def rank(book):
+        value = str(book.get(search_type, "")).strip().lower()
+        return (-_match_tier(value, query), -bm25.get(book.get("id"), 0.0), value, book.get("id"))
+
+    return heapq.nsmallest(offset + limit, matches, key=rank)[offset:], len(matches)
+
+
+def search_books_by_query(query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    Run a multi-field query such as 'author:orwell title:1984' (see
+    services/search_query.py), best matches first, one page at a time.
+
+    Raises:
+        QueryError: The query is malformed or has nothing to search for
+
+    Returns:
+        tuple: (books on the requested page, total number of matches)
+    """
+    node = parse_query(query)
+
+    from library_service import get_all_books, get_books_by_ids  # same module name tests patch
+
+    scores = evaluate_query(node) if _sqlite_backed('get_all_books', 'get_books_by_ids') else None
+    books = None
+    if scores is None:
+        # No full-text index (or another storage backend): one pass over the catalog
+        books = {book.get("id"): book for book in get_all_books() if query_matches(node, book)}
+        scores = dict.fromkeys(books, 0.0)
+
+    page = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))[offset:]
+    page_ids = [book_id for book_id, _ in page]
+    if books is None:
+        books = get_books_by_ids(page_ids)
+    return [books[book_id] for book_id in page_ids if book_id in books], len(scores)
+
+
+def search_books_fuzzy(query: str, search_type: str, limit: int = SEARCH_PAGE_SIZE,
+                       offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    Typo-tolerant title or author search ("gatsbby", "fitzgerld"), fewest edits first.
+
+    Uses the n-gram word index and full-text index (services/fuzzy_search.py);
+    without them (another storage backend, or SQLite without FTS5) every book is checked.
+
+    Returns:
+        tuple: (books on the requested page, total number of matches)
+    """
+    search_type = str(search_type).strip().lower()
+
+    from library_service import get_all_books  # same module name tests patch
+
+    if _sqlite_backed('get_all_books'):
+        result = fuzzy_search(query, search_type, limit, offset)
+        if result is not None:
+            return result
+    return fuzzy_scan(get_all_books(), query, search_type, limit, offset)
+
+
+def search_books_across_branches(query: str, search_type: str, max_workers: int = 8) -> List[Dict]:
+    """
+    Search every branch's catalog in parallel and merge the results.
+
+    Each shard is searched on its own thread with search_books_in_catalog(),
+    so a slow branch only delays the merge, not the other searches.
+
+    Returns:
+        list: Matching books ordered by title then branch, each with a 'branch' key
+    """
+    branches = database.branch_ids()
+
+    def search_branch(branch_id):
+        with database.use_branch(branch_id):
+            books = search_books_in_catalog(query, search_type)
+        return [{**{key: book[key] for key in book.keys()}, "branch": branch_id} for book in books]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(branches)), thread_name_prefix="branch-search") as pool:
+        results = [book for books in pool.map(search_branch, branches) for book in books]
+    results.sort(key=lambda book: (book["title"], book["branch"] or ""))
+    return results
+
+
+
+
+
+
+
+
+
+def get_changes_since(since: int, limit: int = 500, wait: float = 0.0) -> Dict:
+    """
+    Read the change feed for books and loans after sequence number `since`.
+
+    Consumers keep the returned `next_since` and pass it back on the next call.
+    When `resync_required` is set, the cursor can no longer be served (the
+    database was replaced, or the entries after it were pruned): reload the
+    current books and loans, then follow the feed from `next_since`.
+    With `wait`, the call blocks up to that many seconds for a change to arrive
+    (long-poll) instead of returning an empty page straight away.
+
+    Returns:
+        dict: since, next_since, changes (seq, entity, entity_id, op,
+              changed_at, data), has_more, resync_required
+    """
+    deadline = time.monotonic() + wait
+    latest = get_change_feed_seq()
+    while latest <= since and time.monotonic() < deadline:
+        time.sleep(CHANGE_FEED_POLL_INTERVAL)
+        latest = get_change_feed_seq()
+    return change_feed_page(since, limit, latest)
+
+
+def change_feed_page(since: int, limit: int, latest: int) -> Dict:
+    """Build one change feed response page (shared by the sync and async readers)."""
+    # A cursor past the end of the feed means the database was replaced; one
+    # before the pruned entries has missed changes. Either way, start over at the end
+    resync = since > latest or since < get_change_feed_pruned_seq()
+    changes = get_change_feed(since, limit) if latest > since and not resync else []
+    return {
+        'since': since,
+        'next_since': changes[-1]['seq'] if changes else latest if resync else min(since, latest),
+        'changes': changes,
+        'has_more': bool(changes) and changes[-1]['seq'] < latest,
+        'resync_required': resync,
+    }
+
+
+def place_hold(patron_id: str, book_id: int) -> Tuple[bool, str, Optional[Dict]]:
+    """
+    Join the FIFO hold queue for a book with no copies available.
+
+    When a copy comes back it is set aside for the oldest waiting hold, whose
+    patron can then borrow it with borrow_book_by_patron().
+
+    Returns:
+        tuple: (success: bool, message: str, hold: dict or None)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+
+    book = get_book_by_id(book_id)
+    if not book:
+        return False, "Book not found.", None
+
+    if get_patron_hold(patron_id, book_id):
+        return False, "You already have a hold on this book.", None
+
+    if book["available_copies"] > 0:
+        return False, "This book is available; borrow it instead.", None
+
+    hold_id = insert_hold(patron_id, book_id, datetime.now(), events=[event('hold_placed', patron_id, book_id)])
+    if hold_id is None:
+        # A copy came back between the check and the insert
+        return False, "This book is available; borrow it instead.", None
+
+    hold = get_hold(hold_id)
+    return True, f'Hold placed on "{book["title"]}". Position in queue: {hold["position"]}.', hold
+
+
+def cancel_hold_for_patron(patron_id: str, hold_id: int) -> Tuple[bool, str]:
+    """Cancel a patron's waiting or ready hold; a copy set aside for it passes to the next hold."""
+    hold = get_hold(hold_id)
+    if not hold or hold["patron_id"] != patron_id:
+        return False, "Hold not found."
+
+    status = cancel_hold(hold_id, events=[event('hold_cancelled', patron_id, hold["book_id"], hold_id=hold_id)])
+    if status is None:
+        return False, f"Hold is already {get_hold(hold_id)['status']}."
+
+    _notify_hold_waiters()
+    return True, "Hold cancelled."
+
+
+def get_hold_status(hold_id: int, wait: float = 0.0, known_status: Optional[str] = None) -> Optional[Dict]:
+    """
+    Get a hold's status and queue position.
+
+    With `wait`, the call blocks up to that many seconds until the status
+    differs from `known_status` (by default, the status when the call began),
+    so clients can long-poll instead of polling the catalog.
+
+    Returns:
+        dict: id, patron_id, book_id, status (waiting, ready, fulfilled or
+              cancelled), position while waiting, placed_at and ready_at; None if not found
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        with _hold_updates:
+            generation = _hold_generation
+        hold = get_hold(hold_id)
+        if hold is None:
+            return None
+        known_status = known_status or hold["status"]
+        if hold["status"] != known_status or not time.monotonic() < deadline:
+            return hold
+        with _hold_updates:
+            if generation == _hold_generation:
+                _hold_updates.wait(max(min(HOLD_POLL_INTERVAL, deadline - time.monotonic()), 0))
+
+
+def _notify_hold_waiters() -> None:
+    # Holds may have changed: wake long-polling get_hold_status() calls to re-read them
+    global _hold_generation
+    with _hold_updates:
+        _hold_generation += 1
+        _hold_updates.notify_all()
+
+
+def get_catalog_statistics(top_n: int = 5) -> Dict:
+    """
+    Summarize the catalog: title and copy totals, availability ratio and top authors.
+
+    Uses the columnar snapshot when NumPy is installed and the SQLite
+    backend is active, otherwise a single pass over get_all_books().
+
+    Args:
+        top_n: Number of authors to list, by number of titles
+
+    Returns:
+        dict: total_titles, total_copies, available_copies,
+              availability_ratio and top_authors as (author, count) pairs
+    """
+    from library_service import get_all_books  # same module name tests patch
+
+    if _sqlite_backed('get_all_books') and snapshot_available():
+        return get_catalog_snapshot().statistics(top_n)
+
+    books = get_all_books()
+    total = sum(book["total_copies"] for book in books)
+    available = sum(book["available_copies"] for book in books)
+    author_counts: Dict[str, int] = {}
+    for book in books:
+        author_counts[book["author"]] = author_counts.get(book["author"], 0) + 1
+    top_authors = sorted(author_counts.items(), key=lambda item: -item[1])[:top_n]
+
+    return {
+        "total_titles": len(books),
+        "total_copies": total,
+        "available_copies": available,
+        "availability_ratio": round(available / total, 4) if total else 0.0,
+        "top_authors": top_authors,
+    }
+
+
 
 
 
@@ -254,8 +867,10 @@ def search_books_in_catalog(query: str, search_type: str) -> List[Dict]:
 
 def get_patron_status_report(patron_id: str) -> Dict:
     import database
-    get_borrow_records_by_patron = getattr(database, "get_borrow_records_by_patron", None)
-    info_loans = get_borrow_records_by_patron(patron_id) if callable(get_borrow_records_by_patron) else []
+    get_records = getattr(database, "get_borrow_records_by_patron", None)
+    if not callable(get_records):
+        from library_service import get_borrow_records_by_patron as get_records  # same module name tests patch
+    info_loans = get_records(patron_id)
 
     """
     Get status report for a patron.
@@ -267,21 +882,19 @@ def get_patron_status_report(patron_id: str) -> Dict:
     for info_loan in info_loans:
         past_due = info_loan["due_date"]
         returned_date = info_loan.get("return_date")
-        date_now = datetime.now()
 
-        if returned_date:
-            days_break = (returned_date - past_due).days
+        # Open loans the overdue sweeper has already priced today
+        precomputed = None if returned_date else overdue_sweeper.precomputed_fee(patron_id, info_loan.get("book_id"))
+        if precomputed:
+            days_past_due, total_fine = precomputed["days_overdue"], precomputed["fee_amount"]
         else:
-            days_break = (date_now - past_due).days
-
-        days_past_due = max(days_break, 0)
-        daily_fine = 0.25
-        total_fine = round(days_past_due * daily_fine, 2)
+            days_past_due, accrued, paid = fee_for_loan(info_loan)
+            total_fine = round(max(accrued - paid, 0), 2)
         fee_total += total_fine
 
         borrowd_summ.append({
             "book_title": info_loan["title"],
-            "isbn": info_loan["isbn"],
+            "isbn": info_loan.get("isbn"),
             "due_date": past_due.strftime("%Y-%m-%d"),
             "returned": bool(returned_date),
             "days_late": days_past_due,
@@ -295,13 +908,42 @@ def get_patron_status_report(patron_id: str) -> Dict:
     }
 
 
-#git test stuff
-def get_borrow_records_by_patron(patron_id: str):
-    """Temporary placeholder for CI tests."""
-    return []
+def get_cached_patron_status_report(patron_id: str) -> Dict:
+    """
+    Get a patron's status report, served from the per-patron report cache.
+
+    The cached report is dropped on the patron's next borrow, return or
+    payment, and otherwise expires at the next day boundary. On SQLite it is
+    also checked against the patron's version in the database, which changes
+    made by other processes bump.
+    """
+    version = get_patron_version(patron_id) if _sqlite_backed('get_borrow_records_by_patron') else None
+    return patron_report_cache.get_or_compute(_report_key(patron_id),
+                                              lambda _: get_patron_status_report(patron_id), version)
+
+
+def _report_key(patron_id: str) -> str:
+    # A patron's report differs per database file: each app's own, or each branch shard
+    return f"{database.database_path()}:{patron_id}"
+
+
+def get_borrow_record(patron_id: str, book_id: int) -> Optional[Dict]:
+    """Get the patron's open borrow record for a book."""
+    return get_open_borrow_record(patron_id, book_id)
+
 
+def get_borrow_records_by_patron(patron_id: str) -> List[Dict]:
+    """Get every borrow record (open and returned) for a patron."""
+    return get_patron_borrow_history(patron_id)
 
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+
+# Shared by all requests so coalescing and the circuit breaker see every submission;
+# the gateway itself is looked up per call
+payment_orchestrator = PaymentOrchestrator(lambda: PaymentGateway())
+
+
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None,
+                  idempotency_key: str = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
     
@@ -311,10 +953,16 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     Args:
         patron_id: 6-digit library card ID
         book_id: ID of the book with late fees
-        payment_gateway: Payment gateway instance (injectable for testing)
+        payment_gateway: Payment gateway instance (injectable for testing);
+                         defaults to the shared PaymentOrchestrator
+        idempotency_key: Client-chosen key; resubmitting with the same key
+                         returns the original result instead of charging again
         
     Returns:
         tuple: (success: bool, message: str, transaction_id: Optional[str])
+
+    Raises:
+        IdempotencyKeyReusedError: idempotency_key was already used for another patron or book
         
     Example for you to mock:
         # In tests, mock the payment gateway:
@@ -323,59 +971,105 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
 
-    if not patron_id.isdigit() or len(patron_id) != 6:
-        return False, "invalid patron id"
-
-    fee = calculate_late_fee_for_book(book_id)
-
-   
-
-
-    if isinstance(fee, str) and "error" in fee.lower():
-        return False, fee
-    if not isinstance(fee, (int, float)):
-        return False, "invalid fee type"
-
-    if fee <= 0:
-        return False, "no fee due"
-
-
-
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "book not found"
+    if payment_gateway is None:
+        payment_gateway = payment_orchestrator
+
+    options = {}
+    if isinstance(payment_gateway, PaymentOrchestrator):
+        options.update(idempotency_key=idempotency_key, book_id=book_id)
+        if idempotency_key:
+            error, book = check_late_fee_request(patron_id, book_id)
+            if error:
+                return False, error, None
+            # A retry of a payment that already went through: replay it (the fee now reads as paid)
+            replay = payment_gateway.completed_result(idempotency_key, patron_id, book_id, late_fee_description(book))
+            if replay:
+                return True, f"Payment successful! {replay[2]}", replay[1]
+
+    error, payment = prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
 
     try:
-
-        ok = payment_gateway.process_payment(patron_id, fee)
-        if ok:
-            return True, "payment successful"
-        return False, "payment declined"
+        result = payment_gateway.process_payment(patron_id=patron_id, amount=payment['amount'],
+                                                 description=payment['description'], **options)
+    except IdempotencyKeyReusedError:
+        raise
     except Exception as e:
-        return False, f"gateway error: {e}"
-
-
-
-
-
-
-
-
-
+        return False, f"Payment processing error: {str(e)}", None
 
+    return finish_late_fee_payment(patron_id, payment, result)
 
 
+def check_late_fee_request(patron_id: str, book_id: int) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    Validate the patron ID and book of a late fee payment.
 
+    Returns:
+        tuple: (error message or None, the book)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits.", None
 
+    book = get_book_by_id(book_id)
+    if not book:
+        return "Book not found.", None
+    return None, book
 
 
+def late_fee_description(book: Dict) -> str:
+    """The gateway description of a late fee payment for a book."""
+    return f"Late fees for '{book['title']}'"
 
 
+def prepare_late_fee_payment(patron_id: str, book_id: int) -> Tuple[Optional[str], Dict]:
+    """
+    Validate a late fee payment and work out what to charge.
 
+    The amount is what the ledger says is still owed (accrued minus paid).
 
+    Returns:
+        tuple: (error message or None, payment dict with amount, description and ledger details)
+    """
+    error, book = check_late_fee_request(patron_id, book_id)
+    if error:
+        return error, {}
+
+    fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    if not isinstance(fee_info, dict) or 'fee_amount' not in fee_info:
+        return "Unable to calculate late fees.", {}
+
+    fee_amount = fee_info['fee_amount']
+    if fee_amount <= 0:
+        return "No late fees to pay for this book.", {}
+
+    return None, {
+        'book_id': book_id,
+        'amount': fee_amount,
+        'description': late_fee_description(book),
+        'loan_id': fee_info.get('loan_id'),
+        'days_overdue': fee_info.get('days_overdue', 0),
+        'fee_accrued': fee_info.get('fee_accrued', fee_amount),
+    }
 
 
+def finish_late_fee_payment(patron_id: str, payment: Dict, result) -> Tuple[bool, str, Optional[str]]:
+    """Turn a gateway (success, transaction_id, message) result into pay_late_fees' return value,
+    recording a successful payment in the fee ledger."""
+    success, transaction_id, message = result
+    if not success:
+        return False, f"Payment failed: {message}", None
 
+    paid = event('fee_paid', patron_id, payment.get('book_id'), amount=payment.get('amount'),
+                 transaction_id=transaction_id)
+    # The gateway has taken the money: log it even when there is no ledger entry to write it with
+    if payment.get('loan_id') is None or not record_fee_payment(
+            transaction_id, payment['loan_id'], patron_id, payment['book_id'], payment['amount'],
+            payment['days_overdue'], payment['fee_accrued'], datetime.now().date().isoformat(), events=[paid]):
+        record_events([paid])
+    patron_report_cache.invalidate(_report_key(patron_id))
+    overdue_sweeper.fee_paid(patron_id, payment.get('book_id'))
+    return True, f"Payment successful! {message}", transaction_id
 
 
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
@@ -394,16 +1088,46 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     """
 
     if not transaction_id or not isinstance(transaction_id, str):
-        return False, "invalid transaction id"
+        return False, "Invalid transaction ID."
+
+    if amount <= 0:
+        return False, "Refund amount must be greater than 0."
+
+    if amount > MAX_LATE_FEE:
+        return False, "Refund amount exceeds maximum late fee."
 
-    if amount <= 0 or amount > 15:
-        return False, "invalid refund amount"
+    # Payments made through pay_late_fees are in the ledger; never refund more than was paid
+    payment = get_fee_payment(transaction_id)
+    if payment and amount > round(payment['amount'] - payment['refunded'], 2):
+        return False, "Refund amount exceeds the amount paid on this transaction."
+
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
 
     try:
-        ok = payment_gateway.refund_payment(transaction_id, amount)
-        if ok:
-            return True, "refund successful"
-        return False, "refund failed"
+        result = payment_gateway.refund_payment(transaction_id, amount)
     except Exception as e:
-        
-        return False, f"gateway error: {e}"
+        return False, f"Refund processing error: {str(e)}"
+
+    # Gateways return (success, message); older stand-ins return a bare bool
+    if isinstance(result, tuple):
+        success, message = result
+    else:
+        success, message = bool(result), "Refund processed."
+
+    if not success:
+        return False, f"Refund failed: {message}"
+
+    refunded = event('fee_refunded', payment['patron_id'] if payment else None,
+                     transaction_id=transaction_id, amount=amount)
+    if not (payment and record_fee_refund(transaction_id, amount, events=[refunded])):
+        record_events([refunded])
+    if payment:
+        patron_report_cache.invalidate(_report_key(payment['patron_id']))
+        overdue_sweeper.fee_paid(payment['patron_id'])
+    return True, message
+
+
+# Snapshot the SQLite-backed helpers so use_storage(None) can restore them
+_default_helpers.update({name: globals()[name] for name in STORAGE_HELPERS})
+_installed_helpers.update(_default_helpers)
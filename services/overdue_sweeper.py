@@ -0,0 +1,260 @@
+"""
+Overdue Sweeper Module - Background detection of overdue loans
+
+Keeps a min-heap of open loans ordered by due date. Each database file
+(an app's own, or a branch shard) is read once; after that, borrow and
+return events keep the heap current, and the sweeper thread sleeps until
+the earliest due date instead of polling. When a loan comes due it is
+marked overdue, a 'loan_overdue' notice goes to the event log and its late
+fee is pre-computed. The loan is then re-queued for the next midnight, when
+its fee next changes, until the book comes back.
+
+get_patron_status_report() reads the pre-computed fees of open loans
+through precomputed_fee(), falling back to computing them when the entry
+is missing, from an earlier day, or older than the patron's version in the
+database (a payment, refund or return handled by another process).
+"""
+
+import heapq
+import threading
+from datetime import datetime, time, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database
+from services.event_log import record_event
+from services.fee_ledger import days_between
+
+LoanKey = Tuple[str, str, int]  # (database file, patron_id, book_id)
+
+
+class OverdueSweeper:
+    """Due-date priority queue of open loans with a sleeping worker thread."""
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now,
+                 fee_calculator: Optional[Callable[[str, int], Dict]] = None):
+        """
+        Args:
+            clock: Returns the current time (injectable for testing)
+            fee_calculator: (patron_id, book_id) -> late fee dict
+                            (default: library_service.calculate_late_fee_for_book)
+        """
+        self._clock = clock
+        self._fee_calculator = fee_calculator
+        self._heap: List[Tuple[datetime, LoanKey, datetime]] = []
+        self._open: Dict[LoanKey, datetime] = {}
+        self._loaded_paths = set()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.overdue: Dict[LoanKey, Dict] = {}
+
+    def load(self) -> None:
+        """Seed the heap from the open borrow records of the active database and its branch shards,
+        once per file (the only table scans)."""
+        for branch_id in database.branch_ids():
+            with database.use_branch(branch_id):
+                path = database.database_path()
+                with self._condition:
+                    if path in self._loaded_paths:
+                        continue
+                    self._loaded_paths.add(path)
+                records = database.get_open_borrow_records()
+                with self._condition:
+                    for record in records:
+                        key = (path, record['patron_id'], record['book_id'])
+                        self._open.setdefault(key, record['due_date'])
+                        heapq.heappush(self._heap, (record['due_date'], key, record['due_date']))
+                    self._condition.notify()
+
+    def _push(self, key: LoanKey, due_date: datetime, wake_at: datetime = None) -> None:
+        self._open[key] = due_date
+        heapq.heappush(self._heap, (wake_at or due_date, key, due_date))
+
+    def track(self, patron_id: str, book_id: int, due_date: datetime) -> None:
+        """Add a new loan of the active database; wakes the worker if it is now the earliest."""
+        with self._condition:
+            self._push((database.database_path(), patron_id, book_id), due_date)
+            self._condition.notify()
+
+    def untrack(self, patron_id: str, book_id: int) -> None:
+        """Forget a returned loan; its heap entry is discarded lazily when it surfaces."""
+        self._forget((database.database_path(), patron_id, book_id))
+
+    def _forget(self, key: LoanKey) -> None:
+        with self._condition:
+            self._open.pop(key, None)
+            self.overdue.pop(key, None)
+
+    def refresh(self, patron_id: str, book_id: Optional[int] = None) -> None:
+        """Recompute the fees of a patron's overdue loans (one book, or all of them) now,
+        e.g. after a payment or refund."""
+        path = database.database_path()
+        with self._condition:
+            keys = [key for key in self.overdue
+                    if key[:2] == (path, patron_id) and book_id in (None, key[2])]
+            for key in keys:
+                del self.overdue[key]
+                self._push(key, self._open[key], self._clock())
+            if keys:
+                self._condition.notify()
+
+    def next_wake(self) -> Optional[datetime]:
+        """When the next loan becomes due (or its fee next changes)."""
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(self) -> int:
+        """Process every heap entry whose time has come. Returns how many loans were updated."""
+        now = self._clock()
+        processed = 0
+        while True:
+            with self._condition:
+                if not self._heap or self._heap[0][0] > now:
+                    return processed
+                _, key, due_date = heapq.heappop(self._heap)
+                if self._open.get(key) != due_date:
+                    continue  # returned, or superseded by a newer loan of the same book
+
+            path, patron_id, book_id = key
+            # The worker thread has no request context: route to the loan's own database file
+            with self._condition:
+                previous = self.overdue.get(key)
+            with database.use_database(path):
+                version = database.get_patron_version(patron_id)
+                if previous and previous['version'] != version and \
+                        database.get_open_borrow_record(patron_id, book_id) is None:
+                    self._forget(key)  # returned through another process
+                    continue
+                fee = self._calculate_fee(patron_id, book_id)
+            entry = {
+                'patron_id': patron_id,
+                'book_id': book_id,
+                'due_date': due_date,
+                'days_overdue': fee.get('days_overdue', days_between(due_date, now)),
+                'fee_amount': fee.get('fee_amount', 0.0),
+                'as_of': now.date(),
+                'version': version,
+            }
+
+            with self._condition:
+                if self._open.get(key) != due_date:
+                    continue
+                # Fees move once a day, at midnight (whole calendar days, as in the fee ledger)
+                self._push(key, due_date, datetime.combine(now.date() + timedelta(days=1), time()))
+                if not fee:
+                    continue  # the calculation failed; reads compute the fee themselves until the next try
+                first_time = key not in self.overdue
+                self.overdue[key] = entry
+            if first_time:
+                with database.use_database(path):
+                    record_event('loan_overdue', patron_id, book_id, due_date=due_date.isoformat(),
+                                 fee_amount=entry['fee_amount'])
+            processed += 1
+
+    def _calculate_fee(self, patron_id: str, book_id: int) -> Dict:
+        calculator = self._fee_calculator
+        if calculator is None:
+            from library_service import calculate_late_fee_for_book as calculator
+        try:
+            return calculator(patron_id, book_id)
+        except Exception:
+            return {}
+
+    def get_precomputed_fee(self, patron_id: str, book_id: int) -> Optional[Dict]:
+        """The fee computed for a loan of the active database today, or None if it is not overdue,
+        has not been computed since midnight, or the patron's loans or fees changed since."""
+        with self._condition:
+            entry = self.overdue.get((database.database_path(), patron_id, book_id))
+            if not entry or entry['as_of'] != self._clock().date():
+                return None
+        if entry['version'] != database.get_patron_version(patron_id):
+            return None
+        return dict(entry)
+
+    # Worker thread
+
+    def start(self) -> None:
+        """Load open loans and start the background worker."""
+        if self._running:
+            return
+        self.load()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='overdue-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background worker."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                timeout = None
+                if self._heap:
+                    timeout = max((self._heap[0][0] - self._clock()).total_seconds(), 0)
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+            self.run_pending()
+
+
+_sweeper: Optional[OverdueSweeper] = None
+
+
+def start_overdue_sweeper(sweeper: OverdueSweeper = None) -> OverdueSweeper:
+    """Start the process-wide sweeper that borrow/return events are reported to,
+    or load the active database into the one already running."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = sweeper if sweeper is not None else OverdueSweeper()
+        _sweeper.start()
+    else:
+        _sweeper.load()
+    return _sweeper
+
+
+def stop_overdue_sweeper() -> None:
+    """Stop and discard the process-wide sweeper."""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.stop()
+        _sweeper = None
+
+
+def get_overdue_sweeper() -> Optional[OverdueSweeper]:
+    return _sweeper
+
+
+def loan_borrowed(patron_id: str, book_id: int, due_date: datetime) -> None:
+    """Report a new loan to the running sweeper (no-op when none is running)."""
+    if _sweeper is not None:
+        _sweeper.track(patron_id, book_id, due_date)
+
+
+def loan_returned(patron_id: str, book_id: int) -> None:
+    """Report a return to the running sweeper (no-op when none is running)."""
+    if _sweeper is not None:
+        _sweeper.untrack(patron_id, book_id)
+
+
+def fee_paid(patron_id: str, book_id: Optional[int] = None) -> None:
+    """Report a late fee payment or refund to the running sweeper, which recomputes the fees
+    (no-op when none is running)."""
+    if _sweeper is not None:
+        _sweeper.refresh(patron_id, book_id)
+
+
+def precomputed_fee(patron_id: str, book_id: int) -> Optional[Dict]:
+    """The running sweeper's fee for an open loan of the active database, computed today; None otherwise."""
+    if _sweeper is None:
+        return None
+    return _sweeper.get_precomputed_fee(patron_id, book_id)
@@ -0,0 +1,244 @@
+"""
+Payment Orchestrator Module - Safe submission of charges to the payment gateway
+
+Wraps PaymentGateway.process_payment with:
+- idempotency keys recorded in the local `payment_requests` table, so a client
+  retrying after a timeout gets the original result instead of a second charge
+- in-flight coalescing, so concurrent duplicate submissions share one charge
+- retries with exponential backoff and full jitter for transient gateway errors
+- a circuit breaker that fails fast while the gateway is unhealthy
+"""
+
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+import database
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the gateway while the circuit breaker is open."""
+
+
+class IdempotencyKeyReusedError(Exception):
+    """Raised when an idempotency key is reused for a different payment."""
+
+
+def _check_same_payment(stored: Dict, patron_id: str, book_id: Optional[int], amount: Optional[float],
+                        description: str) -> None:
+    """Raise IdempotencyKeyReusedError unless a stored (or in-flight) payment request matches this one.
+    Requests recorded before book IDs or descriptions were kept are not compared on them."""
+    if (stored['patron_id'] != patron_id
+            or (stored['book_id'] is not None and stored['book_id'] != book_id)
+            or (amount is not None and round(stored['amount'], 2) != round(amount, 2))
+            or (stored['description'] is not None and stored['description'] != description)):
+        raise IdempotencyKeyReusedError("Idempotency key was already used for a different payment")
+
+
+class CircuitBreaker:
+    """Opens after consecutive gateway failures; lets one trial call through after a cool-down."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before allowing a trial call
+            clock: Monotonic time source (injectable for testing)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+
+    def allow(self) -> bool:
+        """Whether a gateway call may be made now."""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class _InFlight:
+    """A submission other callers with the same key can wait on."""
+
+    def __init__(self, request: Dict):
+        self.request = request  # patron_id, book_id, amount and description, for _check_same_payment
+        self.done = threading.Event()
+        self.result: Optional[Tuple[bool, str, str]] = None
+        self.error: Optional[BaseException] = None
+
+
+class PaymentOrchestrator:
+    """
+    Drop-in replacement for PaymentGateway.process_payment with idempotency,
+    coalescing, retries and a circuit breaker.
+    """
+
+    # A 'pending' key older than this is assumed abandoned (crashed worker) and may be retried
+    PENDING_TIMEOUT = 300
+
+    def __init__(self, gateway_factory: Callable[[], object], max_attempts: int = 3,
+                 base_delay: float = 0.1, max_delay: float = 2.0, breaker: CircuitBreaker = None,
+                 sleep: Callable[[float], None] = time.sleep, rand: Callable[[], float] = random.random):
+        """
+        Args:
+            gateway_factory: Returns the PaymentGateway to charge through
+            max_attempts: Gateway calls per submission before giving up
+            base_delay: Backoff before the first retry, in seconds (doubles each retry)
+            max_delay: Upper bound on any one backoff
+            breaker: Circuit breaker (default: CircuitBreaker())
+            sleep, rand: Injectable for testing
+        """
+        self._gateway_factory = gateway_factory
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._sleep = sleep
+        self._rand = rand
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, _InFlight] = {}
+
+    def completed_result(self, idempotency_key: str, patron_id: str, book_id: Optional[int],
+                         description: str) -> Optional[Tuple[bool, str, str]]:
+        """
+        The stored gateway result for a key that already succeeded, or None.
+
+        The amount is not compared: once paid, the fee no longer reads as owed.
+
+        Raises:
+            IdempotencyKeyReusedError: The key was used for another patron, book or description
+        """
+        stored = database.get_payment_request(idempotency_key)
+        if stored is None:
+            return None
+        _check_same_payment(stored, patron_id, book_id, None, description)
+        if stored['status'] == 'succeeded':
+            return True, stored['transaction_id'], stored['message']
+        return None
+
+    def process_payment(self, patron_id: str, amount: float, description: str = "",
+                        idempotency_key: str = None, book_id: int = None) -> Tuple[bool, str, str]:
+        """
+        Charge once per idempotency key.
+
+        The key is bound to the patron, book (the loan whose fee is paid),
+        amount and description of its first use. Without a key, only
+        concurrent duplicates of the same payment are coalesced.
+
+        Returns:
+            tuple: (success: bool, transaction_id: str, message: str), as PaymentGateway
+
+        Raises:
+            CircuitOpenError: The gateway is failing and was not called
+            IdempotencyKeyReusedError: The key belongs to a different payment
+            Exception: The gateway's last error once retries are exhausted
+        """
+        request = {'patron_id': patron_id, 'book_id': book_id, 'amount': amount, 'description': description}
+        coalesce_key = idempotency_key or f"{patron_id}:{book_id}:{amount:.2f}:{description}"
+        with self._lock:
+            flight = self._in_flight.get(coalesce_key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[coalesce_key] = _InFlight(request)
+
+        if not leader:
+            # Only a duplicate of the leader's payment may share its result
+            _check_same_payment(flight.request, patron_id, book_id, amount, description)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._submit(patron_id, book_id, amount, description, idempotency_key)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[coalesce_key]
+            flight.done.set()
+
+    def _submit(self, patron_id: str, book_id: Optional[int], amount: float, description: str,
+                idempotency_key: Optional[str]) -> Tuple[bool, str, str]:
+        if idempotency_key:
+            stored = database.claim_payment_request(idempotency_key, patron_id, book_id, amount, description,
+                                                    self.PENDING_TIMEOUT)
+            if stored is not None:
+                _check_same_payment(stored, patron_id, book_id, amount, description)
+                if stored['status'] == 'succeeded':
+                    return True, stored['transaction_id'], stored['message']
+                return False, "", "A payment with this idempotency key is already in progress"
+
+        try:
+            # The same key on every attempt lets the gateway drop duplicates of a charge that timed out
+            result = self._call_with_retries(patron_id, amount, description, idempotency_key or uuid.uuid4().hex)
+        except BaseException:
+            if idempotency_key:
+                database.release_payment_request(idempotency_key)
+            raise
+
+        if idempotency_key:
+            success, transaction_id, message = result
+            if success:
+                database.complete_payment_request(idempotency_key, transaction_id, message)
+            else:
+                # Declines are not replayed; the patron may try again with the same key
+                database.release_payment_request(idempotency_key)
+        return result
+
+    def _call_with_retries(self, patron_id: str, amount: float, description: str,
+                           gateway_key: str) -> Tuple[bool, str, str]:
+        gateway = self._gateway_factory()
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError("Payment gateway is unavailable; please try again later")
+            try:
+                result = gateway.process_payment(patron_id=patron_id, amount=amount, description=description,
+                                                 idempotency_key=gateway_key)
+            except Exception:
+                self.breaker.record_failure()
+                if attempt + 1 == self.max_attempts:
+                    raise
+                self._sleep(self.backoff(attempt))
+                continue
+            # A decline is still a healthy response
+            self.breaker.record_success()
+            return result
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt + 1`."""
+        return self._rand() * min(self.max_delay, self.base_delay * (2 ** attempt))
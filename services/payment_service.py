@@ -6,10 +6,17 @@ For Assignment 3: You will learn to mock this service in their tests
 since we cannot make actual payment API calls during testing.
 """
 
+import asyncio
+import contextvars
+import functools
+import os
 import requests
 from typing import Dict, Tuple
 import time
 
+from config import active_config
+from services.payment_transport import HTTPPaymentTransport, get_shared_transport
+
 
 class PaymentGateway:
     """
@@ -22,17 +29,27 @@ class PaymentGateway:
     - Incurring costs or rate limits
     """
     
-    def __init__(self, api_key: str = "test_key_12345"):
+    def __init__(self, api_key: str = None, transport: HTTPPaymentTransport = None):
         """
         Initialize payment gateway with API credentials.
         
         Args:
-            api_key: API key for authentication (default is test key)
+            api_key: API key for authentication (default: the active config's, a test key)
+            transport: HTTP client for the real gateway API. Defaults to the
+                       shared keep-alive transport when the active config or
+                       PAYMENT_GATEWAY_URL names a gateway URL; without
+                       either, payments are simulated.
         """
-        self.api_key = api_key
-        self.base_url = "https://api.payment-gateway.example.com"
+        config = active_config()
+        self.api_key = api_key or config.payment_api_key
+        gateway_url = config.payment_gateway_url or os.environ.get('PAYMENT_GATEWAY_URL')
+        self.base_url = gateway_url or "https://api.payment-gateway.example.com"
+        if transport is None and gateway_url:
+            transport = get_shared_transport(self.base_url, self.api_key, config.payment_pool_size)
+        self.transport = transport
     
-    def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+    def process_payment(self, patron_id: str, amount: float, description: str = "",
+                        idempotency_key: str = None) -> Tuple[bool, str, str]:
         """
         Process a payment through the external gateway.
         
@@ -43,6 +60,8 @@ class PaymentGateway:
             patron_id: 6-digit patron/customer ID
             amount: Payment amount in dollars
             description: Payment description
+            idempotency_key: Sent as the Idempotency-Key header so the gateway
+                             charges at most once for retried requests
             
         Returns:
             tuple: (success: bool, transaction_id: str, message: str)
@@ -51,21 +70,19 @@ class PaymentGateway:
             gateway = PaymentGateway()
             success, txn_id, msg = gateway.process_payment("123456", 10.50, "Late fees")
         """
+        if self.transport is not None:
+            status, body = self.transport.request(
+                'POST', '/charges',
+                json={"customer_id": patron_id, "amount": amount, "currency": "usd", "description": description},
+                headers={"Idempotency-Key": idempotency_key} if idempotency_key else None
+            )
+            if 200 <= status < 300 and body.get("status") == "succeeded":
+                return True, body["id"], body.get("message", f"Payment of ${amount:.2f} processed successfully")
+            return False, "", body.get("message", f"Payment declined (HTTP {status})")
+
         # Simulate API call delay
         time.sleep(0.5)
         
-        # In a real implementation, this would make an HTTP request:
-        # response = requests.post(
-        #     f"{self.base_url}/charges",
-        #     headers={"Authorization": f"Bearer {self.api_key}"},
-        #     json={
-        #         "customer_id": patron_id,
-        #         "amount": amount,
-        #         "currency": "usd",
-        #         "description": description
-        #     }
-        # )
-        
         # For this template, we simulate different scenarios based on amount
         # This allows testing without a real API
         
@@ -96,6 +113,12 @@ class PaymentGateway:
         Returns:
             tuple: (success: bool, message: str)
         """
+        if self.transport is not None:
+            status, body = self.transport.request('POST', '/refunds', json={"charge": transaction_id, "amount": amount})
+            if 200 <= status < 300 and body.get("status") == "succeeded":
+                return True, body.get("message", f"Refund of ${amount:.2f} processed successfully. Refund ID: {body.get('id')}")
+            return False, body.get("message", f"Refund declined (HTTP {status})")
+
         time.sleep(0.5)
         
         if not transaction_id or not transaction_id.startswith("txn_"):
@@ -120,6 +143,12 @@ class PaymentGateway:
         Returns:
             dict: Payment status information
         """
+        if self.transport is not None:
+            status, body = self.transport.request('GET', f'/charges/{transaction_id}')
+            if status == 404:
+                return {"status": "not_found", "message": "Transaction not found"}
+            return body
+
         time.sleep(0.3)
         
         if not transaction_id or not transaction_id.startswith("txn_"):
@@ -131,4 +160,42 @@ class PaymentGateway:
             "status": "completed",
             "amount": 10.50,
             "timestamp": time.time()
-        }
\ No newline at end of file
+        }
+
+class AsyncPaymentGateway:
+    """
+    Awaitable wrapper around a PaymentGateway for the ASGI serving mode.
+
+    The wrapped gateway's calls block (network I/O, or the simulated delay
+    above), so they run on a thread pool and the event loop stays free to
+    serve other requests while a charge is in flight.
+    """
+
+    def __init__(self, gateway: PaymentGateway = None, executor=None):
+        """
+        Args:
+            gateway: Gateway to wrap (default: a new PaymentGateway)
+            executor: concurrent.futures executor to run calls on (default: the loop's)
+        """
+        self.gateway = gateway if gateway is not None else PaymentGateway()
+        self.executor = executor
+
+    async def _call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Run in the caller's context, so the call uses the request's database and config
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, method, *args, **kwargs))
+
+    async def process_payment(self, patron_id: str, amount: float, description: str = "",
+                              **kwargs) -> Tuple[bool, str, str]:
+        """Awaitable PaymentGateway.process_payment (extra keyword arguments, e.g. idempotency_key, are passed on)."""
+        return await self._call(self.gateway.process_payment, patron_id=patron_id, amount=amount,
+                                description=description, **kwargs)
+
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Awaitable PaymentGateway.refund_payment."""
+        return await self._call(self.gateway.refund_payment, transaction_id, amount)
+
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Awaitable PaymentGateway.verify_payment_status."""
+        return await self._call(self.gateway.verify_payment_status, transaction_id)
@@ -0,0 +1,175 @@
+"""
+Payment Transport Module - Pooled HTTP client for the payment gateway API
+
+One requests.Session per gateway URL and API key, shared by every
+PaymentGateway instance, so charges reuse kept-alive TCP/TLS connections
+instead of opening a new one per call. The pool is bounded (callers wait
+for a free connection rather than opening more), every request has
+connect/read timeouts, and metrics() reports how well connections are reused.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class GatewayHTTPError(Exception):
+    """The gateway answered with a server error (5xx); safe to retry with the same idempotency key."""
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections report when they open and close to the transport."""
+
+    def __init__(self, transport: 'HTTPPaymentTransport', **kwargs):
+        self._transport = transport
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': self._counting_pool(HTTPConnectionPool),
+            'https': self._counting_pool(HTTPSConnectionPool),
+        }
+
+    def _counting_pool(self, pool_class: type) -> type:
+        transport = self._transport
+
+        class Connection(pool_class.ConnectionCls):
+            def connect(self):
+                super().connect()
+                transport._connection_opened()
+
+            def close(self):
+                if self.sock is not None:
+                    transport._connection_closed()
+                super().close()
+
+        return type(pool_class.__name__, (pool_class,), {'ConnectionCls': Connection})
+
+
+class HTTPPaymentTransport:
+    """Keep-alive JSON client for the payment gateway with a bounded connection pool."""
+
+    def __init__(self, base_url: str, api_key: str, pool_size: int = 10,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 session: requests.Session = None):
+        """
+        Args:
+            base_url: Gateway API root, e.g. https://api.payment-gateway.example.com
+            api_key: Bearer token sent on every request
+            pool_size: Most connections kept open (and in use at once) per host
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            read_timeout: Seconds to wait for the response
+            session: Session to use (default: a new one)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.session = session if session is not None else requests.Session()
+        # Retries belong to the payment orchestrator, which knows which calls are idempotent
+        self.adapter = _CountingAdapter(self, pool_connections=1, pool_maxsize=pool_size, pool_block=True,
+                                        max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Connection': 'keep-alive',
+        })
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._seconds = 0.0
+        # Pool usage, counted here rather than read from urllib3's internals
+        self._connections_opened = 0
+        self._connections_open = 0
+        self._in_flight = 0
+
+    def _connection_opened(self) -> None:
+        with self._lock:
+            self._connections_opened += 1
+            self._connections_open += 1
+
+    def _connection_closed(self) -> None:
+        with self._lock:
+            self._connections_open -= 1
+
+    def request(self, method: str, path: str, json: Dict = None, headers: Dict = None) -> Tuple[int, Dict]:
+        """
+        Send a request and decode the JSON reply.
+
+        Returns:
+            tuple: (HTTP status, JSON body)
+
+        Raises:
+            requests.RequestException: Connection failure or timeout
+            GatewayHTTPError: The gateway returned a 5xx status
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            response = self.session.request(method, self.base_url + path, json=json, headers=headers,
+                                            timeout=self.timeout)
+            if response.status_code >= 500:
+                raise GatewayHTTPError(f"Gateway returned HTTP {response.status_code}")
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+            return response.status_code, body
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._requests += 1
+                self._seconds += time.perf_counter() - start
+
+    def metrics(self) -> Dict:
+        """Request counts, latency and connection reuse for this transport."""
+        with self._lock:
+            count, errors, seconds = self._requests, self._errors, self._seconds
+            connections, in_use = self._connections_opened, min(self._in_flight, self._connections_open)
+            idle = self._connections_open - in_use
+        return {
+            'requests': count,
+            'errors': errors,
+            'connections_opened': connections,
+            'connections_idle': idle,
+            'connections_in_use': in_use,
+            'pool_maxsize': self.pool_size,
+            'reuse_ratio': round(1 - connections / count, 3) if count else 0.0,
+            'mean_latency_ms': round(seconds / count * 1000, 2) if count else 0.0,
+        }
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        self.session.close()
+
+
+_shared: Dict[Tuple[str, str], HTTPPaymentTransport] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(base_url: str, api_key: str, pool_size: int = 10) -> HTTPPaymentTransport:
+    """The process-wide transport for a gateway URL and key (created on first use)."""
+    with _shared_lock:
+        transport = _shared.get((base_url, api_key))
+        if transport is None:
+            transport = _shared[(base_url, api_key)] = HTTPPaymentTransport(base_url, api_key, pool_size)
+        return transport
+
+
+def close_shared_transports() -> None:
+    """Close and forget every shared transport."""
+    with _shared_lock:
+        for transport in _shared.values():
+            transport.close()
+        _shared.clear()
@@ -0,0 +1,140 @@
+"""
+Reconciliation Module - Bulk verification of late fee payments against the gateway
+
+Collects the payments in the local `fee_payments` table that have not been
+verified yet, checks them with verify_payment_status concurrently under a
+rate limit, writes every result back in one transaction, and reports where
+the local ledger and the gateway disagree.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import database
+from services.payment_service import PaymentGateway
+
+
+class RateLimiter:
+    """Token bucket shared by the verification threads."""
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            rate: Calls allowed per second
+            burst: Calls allowed back to back before the rate applies
+            clock, sleep: Injectable for testing
+        """
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def acquire(self) -> None:
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class PaymentReconciler:
+    """Verifies outstanding payments against the gateway and records the outcome."""
+
+    def __init__(self, gateway_factory: Callable[[], PaymentGateway] = PaymentGateway,
+                 max_workers: int = 8, rate_per_second: float = 20.0, limiter: RateLimiter = None):
+        """
+        Args:
+            gateway_factory: Returns the gateway to verify with (shared by all workers)
+            max_workers: Verification calls in flight at once
+            rate_per_second: Gateway calls allowed per second across all workers
+            limiter: Rate limiter to use instead of one built from rate_per_second
+        """
+        self.gateway_factory = gateway_factory
+        self.max_workers = max_workers
+        self.limiter = limiter if limiter is not None else RateLimiter(rate_per_second, burst=max_workers)
+
+    def reconcile(self, day: str = None) -> Dict:
+        """
+        Verify every unverified payment (optionally only those made on `day`, YYYY-MM-DD).
+
+        Returns:
+            dict: checked, verified and failed counts, mismatches (local vs
+                  gateway), errors (left unverified for the next run) and elapsed seconds
+        """
+        start = time.perf_counter()
+        payments = database.get_unverified_fee_payments(day)
+        gateway = self.gateway_factory()
+
+        def verify(payment: Dict) -> Dict:
+            self.limiter.acquire()
+            try:
+                return {'payment': payment, 'status': gateway.verify_payment_status(payment['transaction_id'])}
+            except Exception as e:
+                return {'payment': payment, 'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='reconcile') as pool:
+            outcomes = list(pool.map(verify, payments))
+
+        verified_at = datetime.now().isoformat()
+        updates, mismatches, errors = [], [], []
+        for outcome in outcomes:
+            payment = outcome['payment']
+            if 'error' in outcome:
+                errors.append({'transaction_id': payment['transaction_id'], 'error': outcome['error']})
+                continue
+            status = outcome['status'] or {}
+            issue = self._compare(payment, status)
+            updates.append((status.get('status'), status.get('amount'), issue, verified_at, payment['transaction_id']))
+            if issue:
+                mismatches.append({
+                    'transaction_id': payment['transaction_id'],
+                    'patron_id': payment['patron_id'],
+                    'local_amount': payment['amount'],
+                    'gateway_amount': status.get('amount'),
+                    'gateway_status': status.get('status'),
+                    'issue': issue,
+                })
+
+        if updates and not database.record_payment_verifications(updates):
+            errors.extend({'transaction_id': u[-1], 'error': 'Could not save verification'} for u in updates)
+            updates = []
+
+        return {
+            'checked': len(payments),
+            'verified': len(updates),
+            'failed': len(errors),
+            'mismatches': mismatches,
+            'errors': errors,
+            'elapsed': round(time.perf_counter() - start, 3),
+        }
+
+    @staticmethod
+    def _compare(payment: Dict, status: Dict) -> Optional[str]:
+        """Describe how the gateway's record differs from ours, or None if they agree."""
+        gateway_status = status.get('status')
+        if gateway_status == 'not_found':
+            return 'missing_at_gateway'
+        if gateway_status != 'completed':
+            return f'gateway_status_{gateway_status}'
+        if status.get('amount') is None or round(status['amount'], 2) != round(payment['amount'], 2):
+            return 'amount_mismatch'
+        return None
+
+
+def reconcile_payments(day: str = None, gateway_factory: Callable[[], PaymentGateway] = PaymentGateway,
+                       max_workers: int = 8, rate_per_second: float = 20.0) -> Dict:
+    """Run one reconciliation pass; see PaymentReconciler.reconcile."""
+    return PaymentReconciler(gateway_factory, max_workers, rate_per_second).reconcile(day)
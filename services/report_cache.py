@@ -0,0 +1,102 @@
+"""
+Report Cache Module - Per-patron cache of computed status reports
+
+Late fees only change once per day, so a patron's status report is kept
+until the next day boundary. Borrow, return and payment events for a patron
+invalidate that patron's entry straight away. Entries can also carry a
+version read from the database (database.get_patron_version), so a change
+made by another process invalidates them too. The least recently used
+entries are evicted beyond max_entries.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+MAX_ENTRIES = 10000
+
+
+class PatronReportCache:
+    """Thread-safe, size-bounded cache of patron status reports that expires at midnight."""
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now, max_entries: int = MAX_ENTRIES):
+        """
+        Args:
+            clock: Returns the current time (injectable for testing)
+            max_entries: Reports kept before the least recently used is evicted
+        """
+        self._clock = clock
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[datetime, Optional[int], Dict]]' = OrderedDict()
+        # [generation, computations running] for patrons whose report is being computed:
+        # invalidation bumps the generation so a report computed before an event is not
+        # stored after it. Dropped when the last computation finishes.
+        self._computing: Dict[str, List[int]] = {}
+
+    def _next_day_boundary(self) -> datetime:
+        now = self._clock()
+        return datetime(now.year, now.month, now.day) + timedelta(days=1)
+
+    def get(self, patron_id: str, version: Optional[int] = None) -> Optional[Dict]:
+        """Get the cached report, or None if missing, expired or cached at another `version`."""
+        with self._lock:
+            entry = self._entries.get(patron_id)
+            if entry is None:
+                return None
+            expires_at, cached_version, report = entry
+            if self._clock() >= expires_at or cached_version != version:
+                del self._entries[patron_id]
+                return None
+            self._entries.move_to_end(patron_id)
+            return report
+
+    def put(self, patron_id: str, report: Dict, generation: Optional[int] = None,
+            version: Optional[int] = None) -> None:
+        """Cache a report until the next day boundary, unless invalidated since `generation`."""
+        with self._lock:
+            computing = self._computing.get(patron_id)
+            if generation is not None and generation != (computing[0] if computing else 0):
+                return
+            self._entries[patron_id] = (self._next_day_boundary(), version, report)
+            self._entries.move_to_end(patron_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, patron_id: str, compute: Callable[[str], Dict],
+                       version: Optional[int] = None) -> Dict:
+        """Get the cached report, computing and caching it on a miss. `version` is the patron's
+        database version read before the call; a report cached at another version is recomputed."""
+        report = self.get(patron_id, version)
+        if report is not None:
+            return report
+        with self._lock:
+            computing = self._computing.setdefault(patron_id, [0, 0])
+            computing[1] += 1
+            generation = computing[0]
+        try:
+            report = compute(patron_id)
+            self.put(patron_id, report, generation, version)
+        finally:
+            with self._lock:
+                computing[1] -= 1
+                if not computing[1]:
+                    del self._computing[patron_id]
+        return report
+
+    def invalidate(self, patron_id: str) -> None:
+        """Drop a patron's report after a borrow, return or payment."""
+        with self._lock:
+            self._entries.pop(patron_id, None)
+            computing = self._computing.get(patron_id)
+            if computing:
+                computing[0] += 1
+
+    def clear(self) -> None:
+        """Drop every cached report."""
+        with self._lock:
+            self._entries.clear()
+
+
+patron_report_cache = PatronReportCache()
@@ -0,0 +1,193 @@
+"""
+Search Query Module - Multi-field search queries
+
+Parses queries such as
+    author:orwell title:1984
+    (author:orwell OR author:huxley) AND title:"brave new"
+into a small tree of Term and BooleanQuery nodes. Terms are ANDed unless
+joined by OR, and parentheses group. A term names a field (title, author or
+isbn) or, bare, matches title or author. Each word of a term matches the
+start of a word in the field, and a quoted phrase matches consecutive words.
+
+evaluate() answers a query from the indexes. Title and author terms go to
+the books_fts full-text index as one FTS5 expression, which intersects the
+posting lists inside SQLite. ISBN terms use range scans of the ISBN index.
+Mixed subtrees combine those ID sets, smallest first. Without a full-text
+index, matches() checks a query against one book, so callers fall back to
+a single pass over the catalog.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Union
+
+import database
+
+FIELDS = ('title', 'author', 'isbn')
+
+_TOKEN = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?:(?P<field>[A-Za-z]+):)?(?:"(?P<phrase>[^"]*)"?|(?P<word>[^\s()"]+)))')
+
+
+class QueryError(ValueError):
+    """A search query that cannot be parsed."""
+
+
+@dataclass(frozen=True)
+class Term:
+    field: Optional[str]  # None: title or author
+    words: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class BooleanQuery:
+    op: str  # 'AND' or 'OR'
+    parts: Tuple['Node', ...]
+
+
+Node = Union[Term, BooleanQuery]
+
+
+def words_of(text: str) -> Tuple[str, ...]:
+    """Lowercased words, split the way the full-text index tokenizes them."""
+    return tuple(re.findall(r'[0-9a-z]+', text.lower()))
+
+
+def _tokenize(text: str):
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError(f"Cannot parse the query near '{text[position:].strip()}'")
+        position = match.end()
+        if match['open'] or match['close']:
+            tokens.append((match['open'] or match['close'],))
+            continue
+        field, value = match['field'], match['phrase'] if match['phrase'] is not None else match['word']
+        if field is None and value in ('AND', 'OR'):
+            tokens.append((value,))
+        elif field is not None and field.lower() not in FIELDS:
+            tokens.append(('term', None, f'{field} {value}'))  # e.g. "re:zero" is just two words
+        else:
+            tokens.append(('term', field and field.lower(), value))
+    return tokens
+
+
+def _term(field: Optional[str], value: str) -> Term:
+    if field == 'isbn':
+        words = (re.sub(r'[^0-9X]', '', value.upper()),)
+    else:
+        words = words_of(value)
+    if not any(words):
+        raise QueryError(f"Nothing to search for in '{value}'")
+    return Term(field, words)
+
+
+def parse_query(text: str) -> Node:
+    """Parse a query string; raises QueryError when it is malformed or empty."""
+    tokens = _tokenize(text or '')
+    if not tokens:
+        raise QueryError('Search query is empty')
+    position = 0
+
+    def peek():
+        return tokens[position][0] if position < len(tokens) else None
+
+    def parse_or() -> Node:
+        nonlocal position
+        parts = [parse_and()]
+        while peek() == 'OR':
+            position += 1
+            parts.append(parse_and())
+        return parts[0] if len(parts) == 1 else BooleanQuery('OR', tuple(parts))
+
+    def parse_and() -> Node:
+        nonlocal position
+        parts = [parse_unary()]
+        while peek() not in (None, ')', 'OR'):
+            if peek() == 'AND':
+                position += 1
+            parts.append(parse_unary())
+        return parts[0] if len(parts) == 1 else BooleanQuery('AND', tuple(parts))
+
+    def parse_unary() -> Node:
+        nonlocal position
+        token = tokens[position] if position < len(tokens) else None
+        if token is None or token[0] in ('AND', 'OR', ')'):
+            raise QueryError('Expected a search term' + (f" before '{token[0]}'" if token else ' at the end'))
+        position += 1
+        if token[0] == '(':
+            node = parse_or()
+            if peek() != ')':
+                raise QueryError("Missing ')'")
+            position += 1
+            return node
+        return _term(token[1], token[2])
+
+    node = parse_or()
+    if position < len(tokens):
+        raise QueryError(f"Unexpected '{tokens[position][0]}'")
+    return node
+
+
+def _has_isbn(node: Node) -> bool:
+    if isinstance(node, Term):
+        return node.field == 'isbn'
+    return any(_has_isbn(part) for part in node.parts)
+
+
+def fts_expression(node: Node) -> str:
+    """FTS5 MATCH expression for a query without ISBN terms."""
+    if isinstance(node, Term):
+        columns = node.field or '{title author}'
+        return f'{columns} : ("{" ".join(node.words)}"*)'
+    return '(' + f' {node.op} '.join(fts_expression(part) for part in node.parts) + ')'
+
+
+def evaluate(node: Node) -> Optional[Dict[int, float]]:
+    """Matching book IDs with a relevance score, from the indexes; None without a full-text index."""
+    if not _has_isbn(node):
+        return database.get_fts_matches(fts_expression(node))
+    if isinstance(node, Term):
+        return {book_id: 0.0 for book_id in database.get_book_ids_by_isbn_prefix(node.words[0])}
+
+    results = []
+    for part in node.parts:
+        result = evaluate(part)
+        if result is None:
+            return None
+        results.append(result)
+
+    if node.op == 'OR':
+        combined: Dict[int, float] = {}
+        for result in results:
+            for book_id, score in result.items():
+                combined[book_id] = combined.get(book_id, 0.0) + score
+        return combined
+
+    results.sort(key=len)  # intersect from the smallest set down
+    combined = results[0]
+    for result in results[1:]:
+        combined = {book_id: score + result[book_id] for book_id, score in combined.items() if book_id in result}
+    return combined
+
+
+def _phrase_in(words: Tuple[str, ...], value: str) -> bool:
+    candidates = words_of(value)
+    *exact, prefix = words
+    for start in range(len(candidates) - len(words) + 1):
+        window = candidates[start:start + len(words)]
+        if list(window[:-1]) == exact and window[-1].startswith(prefix):
+            return True
+    return False
+
+
+def matches(node: Node, book) -> bool:
+    """Whether one book record matches the query (the scan fallback for evaluate())."""
+    if isinstance(node, BooleanQuery):
+        check = all if node.op == 'AND' else any
+        return check(matches(part, book) for part in node.parts)
+    if node.field == 'isbn':
+        return str(book.get('isbn', '')).upper().startswith(node.words[0])
+    fields = (node.field,) if node.field else ('title', 'author')
+    return any(_phrase_in(node.words, str(book.get(field, ''))) for field in fields)
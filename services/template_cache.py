@@ -0,0 +1,104 @@
+"""
+Template Cache Module - Precompiled Jinja templates shared by every worker
+
+Jinja parses and compiles a template the first time it is rendered, once per
+worker. create_app() avoids paying that on a request in two ways:
+- it installs a persistent bytecode cache, so compiled templates written by
+  one process (or by the build step below) are loaded by all the others
+- it loads every template at startup (precompile_templates in config.py)
+
+Cache entries are keyed by template name and a checksum of its source, so an
+edited template is simply recompiled; stale bytecode is never served.
+
+Usage:
+    python -m services.template_cache build [cache_dir]
+    python -m services.template_cache clear [cache_dir]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from jinja2 import FileSystemBytecodeCache
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'build', 'jinja')
+CACHE_PATTERN = '%s.cache'
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """A FileSystemBytecodeCache that never fails a render because the cache could not be written."""
+
+    def dump_bytecode(self, bucket) -> None:
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass  # read-only or removed cache directory: the template still renders
+
+
+def install_template_cache(app, directory: Optional[str] = None) -> Optional[TemplateBytecodeCache]:
+    """
+    Have `app` load and store compiled templates in `directory` (None: DEFAULT_CACHE_DIR).
+
+    Must run before app.jinja_env is first used. Returns None, leaving the
+    app without a persistent cache, when the directory cannot be created.
+    """
+    directory = directory or DEFAULT_CACHE_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+    cache = TemplateBytecodeCache(directory, CACHE_PATTERN)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': cache}
+    return cache
+
+
+def precompile_templates(app) -> List[str]:
+    """Load every HTML template of `app` into its Jinja environment (and bytecode cache); returns their names."""
+    names = sorted(name for name in app.jinja_env.list_templates() if name.endswith('.html'))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+def build_template_cache(directory: Optional[str] = None) -> List[str]:
+    """Compile every template into `directory` ahead of a deploy, using the same Jinja settings as the app."""
+    from app import create_app
+    from config import LibraryConfig
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = LibraryConfig(database_path=os.path.join(tmp, 'build.db'), pragma_profile='tmpfs',
+                               template_cache_dir=directory or DEFAULT_CACHE_DIR, precompile_templates=False)
+        return precompile_templates(create_app(config))
+
+
+def clear_template_cache(directory: Optional[str] = None) -> None:
+    """Remove every compiled template from `directory`."""
+    directory = directory or DEFAULT_CACHE_DIR
+    if os.path.isdir(directory):
+        TemplateBytecodeCache(directory, CACHE_PATTERN).clear()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m services.template_cache', description='Precompiled Jinja templates')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='compile every template into the cache')
+    build.add_argument('cache_dir', nargs='?', default=DEFAULT_CACHE_DIR)
+    clear = commands.add_parser('clear', help='remove compiled templates')
+    clear.add_argument('cache_dir', nargs='?', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'clear':
+        clear_template_cache(args.cache_dir)
+        print(f"cleared {args.cache_dir}")
+        return 0
+    start = time.perf_counter()
+    names = build_template_cache(args.cache_dir)
+    print(f"compiled {len(names)} templates into {args.cache_dir} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
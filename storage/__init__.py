@@ -0,0 +1,7 @@
+"""
+Storage Package - Pluggable book and loan repositories
+"""
+
+from .base import LibraryStorage
+from .sqlite_storage import SQLiteStorage
+from .memory_storage import MemoryStorage
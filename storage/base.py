@@ -0,0 +1,84 @@
+"""
+Storage interface for books and borrow records.
+
+Every backend exposes the same helper names as database.py so the service
+layer can be pointed at any of them without changing its call sites.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from models import Book, Loan
+
+
+class LibraryStorage(ABC):
+    """Repository interface for the books and borrow_records data."""
+
+    # True when the data lives in the database.py SQLite file, so the service
+    # layer may also use the holds, full-text index and catalog change tables there.
+    # Such a backend's insert_book, update_book_availability, borrow_books_batch
+    # and return_books_batch also take an `events` list written in the same transaction.
+    sqlite_backed = False
+
+    # Books
+
+    @abstractmethod
+    def get_all_books(self) -> List[Book]:
+        """Get all books ordered by title."""
+
+    @abstractmethod
+    def get_book_by_id(self, book_id: int) -> Optional[Book]:
+        """Get a specific book by ID."""
+
+    @abstractmethod
+    def get_books_by_ids(self, book_ids: List[int]) -> Dict[int, Book]:
+        """Get several books by ID in one lookup, keyed by ID (missing IDs are omitted)."""
+
+    @abstractmethod
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        """Get a specific book by ISBN."""
+
+    @abstractmethod
+    def insert_book(self, title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
+        """Insert a new book. Returns False if the ISBN already exists."""
+
+    @abstractmethod
+    def update_book_availability(self, book_id: int, change: int) -> bool:
+        """Update the available copies of a book by a given amount."""
+
+    # Loans
+
+    @abstractmethod
+    def get_patron_borrowed_books(self, patron_id: str) -> List[Loan]:
+        """Get currently borrowed books for a patron, oldest borrow first."""
+
+    @abstractmethod
+    def get_patron_borrow_count(self, patron_id: str) -> int:
+        """Get the number of books currently borrowed by a patron."""
+
+    @abstractmethod
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
+        """Insert a new borrow record."""
+
+    @abstractmethod
+    def update_borrow_record_return_date(self, patron_id: str, book_id: int, return_date: datetime) -> bool:
+        """Set the return date on the patron's open record for a book."""
+
+    @abstractmethod
+    def get_borrow_record(self, patron_id: str, book_id: int) -> Optional[Dict]:
+        """Get the patron's open borrow record for a book, with parsed dates."""
+
+    @abstractmethod
+    def get_borrow_records_by_patron(self, patron_id: str) -> List[Dict]:
+        """Get every borrow record (open and returned) for a patron, with book details."""
+
+    # Batches
+
+    @abstractmethod
+    def borrow_books_batch(self, patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime) -> bool:
+        """Borrow one copy of each book atomically; nothing is applied if any copy is missing."""
+
+    @abstractmethod
+    def return_books_batch(self, patron_id: str, book_ids: List[int], return_date: datetime) -> Optional[List[int]]:
+        """Return one open loan per book atomically; gives the IDs that had an open loan."""
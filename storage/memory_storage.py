@@ -0,0 +1,168 @@
+"""
+In-memory storage backend - indexed dicts for simulations, load tests and fast test runs
+"""
+
+import threading
+from bisect import insort
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from models import Book, Loan
+from .base import LibraryStorage
+
+
+class MemoryStorage(LibraryStorage):
+    """
+    Storage held entirely in process memory.
+
+    Books live in a dict keyed by id with a unique ISBN index and a sorted
+    (title, id) index so catalog listings never need a sort. Loans live in
+    a dict keyed by record id, with per-patron lists kept in borrow order
+    and a (patron_id, book_id) index of open loans for O(1) returns.
+    Behaviour mirrors the SQLite backend, including its return values.
+    Every mutation (and every read that walks the indexes) holds one lock,
+    so request threads sharing an instance never see a half-applied change.
+    """
+
+    def __init__(self):
+        # Reentrant: the batch methods call insert_borrow_record and update_book_availability
+        self._lock = threading.RLock()
+        self._books: Dict[int, Book] = {}
+        self._isbn_index: Dict[str, int] = {}
+        self._title_index: List[Tuple[str, int]] = []
+        self._next_book_id = 1
+
+        self._loans: Dict[int, Dict] = {}
+        self._patron_loans: Dict[str, List[Tuple[datetime, int]]] = {}
+        self._open_loans: Dict[Tuple[str, int], List[Tuple[datetime, int]]] = {}
+        self._open_counts: Dict[str, int] = {}
+        self._next_loan_id = 1
+
+    # Books
+
+    def get_all_books(self) -> List[Book]:
+        with self._lock:
+            return [replace(self._books[book_id]) for _, book_id in self._title_index]
+
+    def get_book_by_id(self, book_id: int) -> Optional[Book]:
+        book = self._books.get(book_id)
+        return replace(book) if book else None
+
+    def get_books_by_ids(self, book_ids: List[int]) -> Dict[int, Book]:
+        with self._lock:
+            return {book_id: replace(self._books[book_id]) for book_id in book_ids if book_id in self._books}
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        book_id = self._isbn_index.get(isbn)
+        return replace(self._books[book_id]) if book_id is not None else None
+
+    def insert_book(self, title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
+        with self._lock:
+            if isbn in self._isbn_index:
+                return False
+            book_id = self._next_book_id
+            self._next_book_id += 1
+            self._books[book_id] = Book(book_id, title, author, isbn, total_copies, available_copies)
+            self._isbn_index[isbn] = book_id
+            insort(self._title_index, (title, book_id))
+            return True
+
+    def update_book_availability(self, book_id: int, change: int) -> bool:
+        with self._lock:
+            book = self._books.get(book_id)
+            if book:
+                book.available_copies += change
+            return True
+
+    # Loans
+
+    def get_patron_borrowed_books(self, patron_id: str) -> List[Loan]:
+        with self._lock:
+            now = datetime.now()
+            borrowed_books = []
+            for _, loan_id in self._patron_loans.get(patron_id, []):
+                loan = self._loans[loan_id]
+                book = self._books.get(loan['book_id'])
+                if loan['return_date'] is not None or not book:
+                    continue
+                borrowed_books.append(Loan(loan['book_id'], book.title, book.author,
+                                           loan['borrow_date'], loan['due_date'], now > loan['due_date']))
+            return borrowed_books
+
+    def get_patron_borrow_count(self, patron_id: str) -> int:
+        return self._open_counts.get(patron_id, 0)
+
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
+        with self._lock:
+            loan_id = self._next_loan_id
+            self._next_loan_id += 1
+            self._loans[loan_id] = {
+                'id': loan_id,
+                'patron_id': patron_id,
+                'book_id': book_id,
+                'borrow_date': borrow_date,
+                'due_date': due_date,
+                'return_date': None,
+            }
+            insort(self._patron_loans.setdefault(patron_id, []), (borrow_date, loan_id))
+            insort(self._open_loans.setdefault((patron_id, book_id), []), (borrow_date, loan_id))
+            self._open_counts[patron_id] = self._open_counts.get(patron_id, 0) + 1
+            return True
+
+    def update_borrow_record_return_date(self, patron_id: str, book_id: int, return_date: datetime) -> bool:
+        with self._lock:
+            # Like the SQL UPDATE, every open record for the pair is closed.
+            open_loans = self._open_loans.pop((patron_id, book_id), [])
+            for _, loan_id in open_loans:
+                self._loans[loan_id]['return_date'] = return_date
+            if open_loans:
+                self._open_counts[patron_id] -= len(open_loans)
+            return True
+
+    def get_borrow_record(self, patron_id: str, book_id: int) -> Optional[Dict]:
+        with self._lock:
+            open_loans = self._open_loans.get((patron_id, book_id))
+            return dict(self._loans[open_loans[0][1]]) if open_loans else None
+
+    def get_borrow_records_by_patron(self, patron_id: str) -> List[Dict]:
+        with self._lock:
+            records = []
+            for _, loan_id in self._patron_loans.get(patron_id, []):
+                loan = self._loans[loan_id]
+                book = self._books.get(loan['book_id'])
+                if not book:
+                    continue
+                records.append(dict(loan, title=book.title, author=book.author, isbn=book.isbn))
+            return records
+
+    # Batches
+
+    def borrow_books_batch(self, patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime) -> bool:
+        with self._lock:
+            needed: Dict[int, int] = {}
+            for book_id in book_ids:
+                needed[book_id] = needed.get(book_id, 0) + 1
+            if any(book_id not in self._books or self._books[book_id].available_copies < count
+                   for book_id, count in needed.items()):
+                return False
+            for book_id in book_ids:
+                self._books[book_id].available_copies -= 1
+                self.insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+            return True
+
+    def return_books_batch(self, patron_id: str, book_ids: List[int], return_date: datetime) -> Optional[List[int]]:
+        with self._lock:
+            returned = []
+            for book_id in book_ids:
+                open_loans = self._open_loans.get((patron_id, book_id))
+                if not open_loans:
+                    continue
+                _, loan_id = open_loans.pop(0)
+                if not open_loans:
+                    del self._open_loans[(patron_id, book_id)]
+                self._loans[loan_id]['return_date'] = return_date
+                self._open_counts[patron_id] -= 1
+                self.update_book_availability(book_id, +1)
+                returned.append(book_id)
+            return returned
@@ -0,0 +1,66 @@
+"""
+SQLite storage backend - wraps the helper functions in database.py
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import database
+from models import Book, Loan
+from .base import LibraryStorage
+
+
+class SQLiteStorage(LibraryStorage):
+    """
+    Storage backed by the SQLite file configured in database.py.
+
+    Helpers are looked up on the database module at call time so that
+    changes to database.DATABASE (and test monkeypatches) are honoured.
+    """
+
+    sqlite_backed = True
+
+    def get_all_books(self) -> List[Book]:
+        return database.get_all_books()
+
+    def get_book_by_id(self, book_id: int) -> Optional[Book]:
+        return database.get_book_by_id(book_id)
+
+    def get_books_by_ids(self, book_ids: List[int]) -> Dict[int, Book]:
+        return database.get_books_by_ids(book_ids)
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        return database.get_book_by_isbn(isbn)
+
+    def insert_book(self, title: str, author: str, isbn: str, total_copies: int, available_copies: int,
+                    events: List[database.Event] = ()) -> bool:
+        return database.insert_book(title, author, isbn, total_copies, available_copies, events)
+
+    def update_book_availability(self, book_id: int, change: int, events: List[database.Event] = ()) -> bool:
+        return database.update_book_availability(book_id, change, events)
+
+    def get_patron_borrowed_books(self, patron_id: str) -> List[Loan]:
+        return database.get_patron_borrowed_books(patron_id)
+
+    def get_patron_borrow_count(self, patron_id: str) -> int:
+        return database.get_patron_borrow_count(patron_id)
+
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
+        return database.insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+
+    def update_borrow_record_return_date(self, patron_id: str, book_id: int, return_date: datetime) -> bool:
+        return database.update_borrow_record_return_date(patron_id, book_id, return_date)
+
+    def get_borrow_record(self, patron_id: str, book_id: int) -> Optional[Dict]:
+        return database.get_open_borrow_record(patron_id, book_id)
+
+    def get_borrow_records_by_patron(self, patron_id: str) -> List[Dict]:
+        return database.get_patron_borrow_history(patron_id)
+
+    def borrow_books_batch(self, patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime,
+                           events: List[database.Event] = ()) -> bool:
+        return database.borrow_books_batch(patron_id, book_ids, borrow_date, due_date, events)
+
+    def return_books_batch(self, patron_id: str, book_ids: List[int], return_date: datetime,
+                           events: List[database.Event] = ()) -> Optional[List[int]]:
+        return database.return_books_batch(patron_id, book_ids, return_date, events)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from app import create_app
+from asgi import create_asgi_app
+from services import async_service
+
+
+def call(asgi_app, method, path, query=b"", body=b"", headers=()):
+    """Send one HTTP request through an ASGI app and collect the response."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(b"content-type", b"application/json"), *headers]}
+    asyncio.run(asgi_app(scope, receive, send))
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+
+@pytest.fixture
+def asgi_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "asgi.db"))
+    return create_asgi_app(create_app())
+
+
+def test_async_search_route(asgi_app):
+    status, body = call(asgi_app, "GET", "/api/search", b"q=gatsby&type=title")
+    data = json.loads(body)
+    assert status == 200 and data["count"] == 1
+    assert data["results"][0]["title"] == "The Great Gatsby"
+
+
+def test_async_route_validation(asgi_app):
+    status, _ = call(asgi_app, "GET", "/api/search")
+    assert status == 400
+    status, _ = call(asgi_app, "GET", "/api/availability", b"ids=1,x")
+    assert status == 400
+
+
+def test_non_async_routes_fall_back_to_flask(asgi_app):
+    status, body = call(asgi_app, "GET", "/catalog")
+    assert status == 200 and b"The Great Gatsby" in body
+    status, body = call(asgi_app, "POST", "/api/borrow/batch",
+                        body=json.dumps({"patron_id": "654321", "book_ids": [1]}).encode())
+    assert status == 200 and json.loads(body)["success"] is True
+
+
+def test_pay_late_fees_async_awaits_gateway(asgi_app):
+    now = datetime.now()
+    database.insert_borrow_record("654321", 1, now - timedelta(days=20), now - timedelta(days=6))
+
+    class AwaitableGateway:
+        async def process_payment(self, patron_id, amount, description=""):
+            await asyncio.sleep(0)
+            return True, "txn_async", f"Charged {amount}"
+
+    ok, message, txn = asyncio.run(async_service.pay_late_fees_async("654321", 1, AwaitableGateway()))
+    assert ok and txn == "txn_async" and "successful" in message.lower()
+
+    ok, message, txn = asyncio.run(async_service.pay_late_fees_async("12", 1, AwaitableGateway()))
+    assert not ok and txn is None
+
+
+def test_async_payment_uses_the_app_database(monkeypatch, tmp_path):
+    import library_service
+    from config import LibraryConfig
+    from services.payment_orchestrator import PaymentOrchestrator
+
+    class Gateway:
+        def process_payment(self, patron_id, amount, description="", idempotency_key=None):
+            return True, "txn_asgi", f"Charged {amount}"
+
+    default_path, own_path = tmp_path / "default.db", tmp_path / "own.db"
+    monkeypatch.setattr(database, "DATABASE", str(default_path))
+    monkeypatch.setattr(library_service, "payment_orchestrator", PaymentOrchestrator(lambda: Gateway()))
+    asgi_app = create_asgi_app(create_app(LibraryConfig(database_path=str(own_path))))
+    with database.use_database(str(own_path)):
+        now = datetime.now()
+        database.insert_borrow_record("654321", 1, now - timedelta(days=20), now - timedelta(days=6))
+
+    status, body = call(asgi_app, "POST", "/api/late_fee/654321/1/pay", headers=[(b"idempotency-key", b"k1")])
+    assert status == 200 and json.loads(body)["transaction_id"] == "txn_asgi"
+    with database.use_database(str(own_path)):
+        assert database.get_payment_request("k1")["status"] == "succeeded"
+    assert not default_path.exists()
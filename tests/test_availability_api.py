@@ -0,0 +1,39 @@
+import pytest
+
+import database
+import services.library_service as svc
+from app import create_app
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "availability.db"))
+    return create_app().test_client()
+
+
+def test_get_books_by_ids_beyond_parameter_limit(client):
+    for i in range(1000):
+        database.insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+    books = database.get_books_by_ids(list(range(1, 1004)))
+    assert len(books) == 1003  # 3 sample books + 1000 added
+
+
+def test_availability_keyed_by_id(client):
+    data = client.get("/api/availability?ids=1,3,42").get_json()
+    assert data["1"] == {"available_copies": 3, "total_copies": 3, "available": True}
+    assert data["3"]["available"] is False
+    assert data["42"] is None
+
+
+def test_availability_rejects_bad_input(client):
+    assert client.get("/api/availability").status_code == 400
+    assert client.get("/api/availability?ids=1,x").status_code == 400
+    too_many = ",".join(str(i) for i in range(201))
+    assert client.get(f"/api/availability?ids={too_many}").status_code == 400
+
+
+def test_service_uses_bulk_helper(monkeypatch):
+    calls = []
+    monkeypatch.setattr(svc, "get_books_by_ids", lambda ids: calls.append(ids) or {})
+    assert svc.get_book_availability([5, 6]) == {5: None, 6: None}
+    assert calls == [[5, 6]]
@@ -0,0 +1,146 @@
+import gzip
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from config import LibraryConfig, use_config
+import services.library_service as svc
+from services.backup import backup_database, list_backups, main, restore_database, verify_backup
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    database.init_database()
+    conn = database.get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, 'Author', ?, 2, 2)",
+            [(f"Book {i}", f"{i:013d}") for i in range(2000)],
+        )
+    conn.close()
+    return tmp_path
+
+
+def test_backup_is_compressed_and_verified(db):
+    result = backup_database(str(db / "backups"), pages_per_step=8, step_pause=0)
+    assert result["path"].endswith(".db.gz")
+    assert result["steps"] > 1  # copied in several steps, not one locked pass
+    assert result["bytes"] < (db / "library.db").stat().st_size
+    assert verify_backup(result["path"]) == (True, verify_backup(result["path"])[1])
+    assert "passed" in verify_backup(result["path"])[1]
+
+
+def test_writers_are_not_blocked_during_backup(db):
+    done = threading.Event()
+    writes = []
+
+    def writer():
+        i = 0
+        while not done.is_set():
+            writes.append(database.update_book_availability(1 + i % 100, 0))
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        result = backup_database(str(db / "backups"), pages_per_step=4, step_pause=0.002)
+    finally:
+        done.set()
+        thread.join()
+    assert writes and all(writes)
+    assert result["restarts"] <= 4  # gave up chasing the writer instead of looping
+    assert verify_backup(result["path"])[0]
+
+
+def test_rotation_keeps_the_newest(db):
+    paths = [backup_database(str(db / "backups"), keep=2, step_pause=0)["path"] for _ in range(4)]
+    assert list_backups(str(db / "backups")) == paths[:1:-1]
+
+
+def test_restore_brings_back_the_snapshot(db):
+    path = backup_database(str(db / "backups"), step_pause=0)["path"]
+    database.update_book_availability(1, -2)
+    database.insert_book("Later", "Author", "9999999999999", 1, 1)
+
+    ok, message = restore_database(path)
+    assert ok, message
+    assert database.get_book_by_id(1).available_copies == 2
+    assert database.get_book_by_isbn("9999999999999") is None
+
+
+def test_backup_and_restore_use_the_configured_pragmas(db):
+    config = LibraryConfig(pragma_profile="wal", busy_timeout=2.0)
+    with use_config(config):
+        conn = database.get_db_connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+        path = backup_database(str(db / "backups"), step_pause=0)["path"]
+        database.update_book_availability(1, -2)
+
+        ok, message = restore_database(path)
+        assert ok, message
+        assert database.get_book_by_id(1).available_copies == 2
+        conn = database.get_db_connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+
+def test_corrupt_backup_is_rejected(db):
+    path = db / "backups" / "library-corrupt.db.gz"
+    path.parent.mkdir()
+    with gzip.open(path, "wb") as out:
+        out.write(b"SQLite format 3\x00" + b"\x00" * 4000)
+
+    ok, message = verify_backup(str(path))
+    assert not ok
+    assert restore_database(str(path))[0] is False
+    assert database.get_book_by_id(1) is not None
+
+
+def test_command_line(db, capsys):
+    assert main(["create", str(db / "backups"), "--keep", "3"]) == 0
+    [path] = list_backups(str(db / "backups"))
+    assert main(["verify", path]) == 0
+    assert main(["verify", str(db / "missing.db.gz")]) == 1
+
+
+def titles(books):
+    return [book["title"] for book in books]
+
+
+def test_search_after_restore(db):
+    path = backup_database(str(db / "backups"), step_pause=0)["path"]
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 1, 1)
+    assert titles(svc.search_books_in_catalog("dune", "title")) == ["Dune"]
+    assert titles(svc.search_books_fuzzy("dunr", "title")[0]) == ["Dune"]
+
+    assert restore_database(path)[0]
+    database.insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    assert svc.search_books_in_catalog("dune", "title") == []
+    assert titles(svc.search_books_in_catalog("emma", "title")) == ["Emma"]
+    assert titles(svc.search_books_fuzzy("emna", "title")[0]) == ["Emma"]
+
+
+def test_search_after_restore_by_another_process(db):
+    path = backup_database(str(db / "backups"), step_pause=0)["path"]
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 1, 1)
+    database.insert_book("Dune Messiah", "Frank Herbert", "9780593098233", 1, 1)
+    assert len(svc.search_books_in_catalog("dune", "title")) == 2
+    assert len(svc.search_books_fuzzy("dunr", "title")[0]) == 2
+
+    # Copy the backup in behind the caches' back, as the command line would
+    with gzip.open(path) as compressed, open(db / "restored.db", "wb") as out:
+        out.write(compressed.read())
+    source = sqlite3.connect(str(db / "restored.db"))
+    target = sqlite3.connect(str(db / "library.db"))
+    source.backup(target)
+    target.close()
+    source.close()
+
+    database.insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    assert svc.search_books_in_catalog("dune", "title") == []
+    assert titles(svc.search_books_in_catalog("emma", "title")) == ["Emma"]
+    assert titles(svc.search_books_fuzzy("emna", "title")[0]) == ["Emma"]
@@ -0,0 +1,82 @@
+import pytest
+from datetime import datetime
+
+import database
+import services.library_service as svc
+from app import create_app
+from storage import MemoryStorage
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def catalog(request, monkeypatch, tmp_path):
+    if request.param == "sqlite":
+        monkeypatch.setattr(database, "DATABASE", str(tmp_path / "batch.db"))
+        database.init_database()
+    else:
+        svc.use_storage(MemoryStorage())
+    svc.insert_book("Dune", "Frank Herbert", "9780441013593", 2, 2)
+    svc.insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    svc.insert_book("Ulysses", "James Joyce", "9780199535675", 1, 0)
+    yield
+    svc.use_storage(None)
+
+
+def test_batch_borrow_reports_each_item(catalog):
+    ok, message, results = svc.borrow_books_by_patron("123456", [1, 2, 3, 99])
+    assert ok and "2 of 4" in message
+    assert [r["success"] for r in results] == [True, True, False, False]
+    assert "due date" in results[0]["message"].lower()
+    assert "not available" in results[2]["message"]
+    assert "not found" in results[3]["message"].lower()
+    assert svc.get_patron_borrow_count("123456") == 2
+    assert svc.get_book_by_id(1)["available_copies"] == 1
+
+
+def test_batch_borrow_counts_repeated_copies(catalog):
+    ok, _, results = svc.borrow_books_by_patron("123456", [2, 2])
+    assert ok and [r["success"] for r in results] == [True, False]
+
+
+def test_batch_borrow_limit_checked_against_whole_batch(catalog):
+    svc.insert_book("Solaris", "Stanislaw Lem", "9780156027601", 5, 5)
+    svc.borrow_books_by_patron("123456", [4, 4, 4])
+    ok, message, results = svc.borrow_books_by_patron("123456", [1, 2, 4])
+    assert not ok and "limit of 5" in message
+    assert not any(r["success"] for r in results)
+    assert svc.get_patron_borrow_count("123456") == 3
+
+
+def test_batch_borrow_invalid_patron(catalog):
+    ok, message, results = svc.borrow_books_by_patron("12", [1])
+    assert not ok and "6 digits" in message and results == []
+
+
+def test_batch_return(catalog):
+    svc.borrow_books_by_patron("123456", [1, 2])
+    ok, message, results = svc.return_books_by_patron("123456", [1, 3, 99])
+    assert ok and "1 of 3" in message
+    assert [r["success"] for r in results] == [True, False, False]
+    assert "no active borrow record" in results[1]["message"].lower()
+    assert svc.get_patron_borrow_count("123456") == 1
+    assert svc.get_book_by_id(1)["available_copies"] == 2
+
+
+def test_batch_borrow_is_atomic(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "atomic.db"))
+    database.init_database()
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 1, 1)
+    database.insert_book("Emma", "Jane Austen", "9780141439587", 1, 0)
+    assert database.borrow_books_batch("123456", [1, 2], datetime.now(), datetime.now()) is False
+    assert database.get_book_by_id(1).available_copies == 1
+    assert database.get_patron_borrow_count("123456") == 0
+
+
+def test_batch_api(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "api.db"))
+    client = create_app().test_client()
+    data = client.post("/api/borrow/batch", json={"patron_id": "654321", "book_ids": [1, 2, 3]}).get_json()
+    assert data["success"] and [r["success"] for r in data["results"]] == [True, True, False]
+    data = client.post("/api/return/batch", json={"patron_id": "654321", "book_ids": [1, 2]}).get_json()
+    assert data["success"] and all(r["success"] for r in data["results"])
+    assert client.post("/api/borrow/batch", json={"patron_id": "654321", "book_ids": ["1"]}).status_code == 400
+    assert client.post("/api/return/batch", json={"patron_id": "654321"}).status_code == 400
@@ -0,0 +1,101 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database
+import services.library_service as svc
+from app import create_app
+from asgi import create_asgi_app
+from services import catalog_snapshot
+from tests.test_asgi_mode import call
+
+
+@pytest.fixture
+def branches(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    monkeypatch.setattr(database, "BRANCH_DATABASES", {})
+    catalog_snapshot.reset_catalog_snapshot()
+    app = create_app()
+    database.configure_branches({"north": str(tmp_path / "north.db"), "south": str(tmp_path / "south.db")})
+    with database.use_branch("north"):
+        assert svc.add_book_to_catalog("Dune", "Frank Herbert", "1000000000001", 2)[0]
+        assert svc.add_book_to_catalog("Emma", "Jane Austen", "1000000000002", 1)[0]
+    with database.use_branch("south"):
+        assert svc.add_book_to_catalog("Dune", "Frank Herbert", "1000000000001", 1)[0]
+    yield app
+    catalog_snapshot.reset_catalog_snapshot()
+
+
+def test_each_branch_reads_and_writes_its_own_shard(branches):
+    with database.use_branch("north"):
+        assert svc.borrow_book_by_patron("123456", 1)[0]
+        assert database.get_book_by_id(1).available_copies == 1
+        assert len(database.get_all_books()) == 2
+    with database.use_branch("south"):
+        assert database.get_book_by_id(1).available_copies == 1
+        assert [book.title for book in database.get_all_books()] == ["Dune"]
+        assert database.get_patron_borrow_count("123456") == 0
+
+    with pytest.raises(KeyError):
+        with database.use_branch("west"):
+            pass
+
+
+def test_cross_branch_search_merges_results(branches):
+    results = svc.search_books_across_branches("dune", "title")
+    assert [(book["branch"], book["available_copies"]) for book in results] == [("north", 2), ("south", 1)]
+    assert svc.search_books_across_branches("austen", "author")[0]["branch"] == "north"
+
+
+def test_branches_are_searched_in_parallel(branches, monkeypatch):
+    both_running = threading.Barrier(2, timeout=5)
+
+    def search(query, search_type):
+        both_running.wait()  # only returns once the other branch's search has started too
+        return []
+
+    monkeypatch.setattr(svc, "search_books_in_catalog", search)
+    assert svc.search_books_across_branches("dune", "title") == []
+
+
+def test_writes_on_one_branch_do_not_wait_for_another(branches):
+    locker = sqlite3.connect(database.BRANCH_DATABASES["north"])
+    locker.execute("BEGIN IMMEDIATE")  # hold north's write lock
+    try:
+        start = time.perf_counter()
+        with database.use_branch("south"):
+            assert svc.borrow_book_by_patron("123456", 1)[0]
+        assert time.perf_counter() - start < 1
+    finally:
+        locker.rollback()
+        locker.close()
+
+
+def test_requests_are_routed_by_branch(branches):
+    client = branches.test_client()
+    assert client.post("/api/borrow/batch", json={"patron_id": "123456", "book_ids": [2]},
+                       headers={"X-Branch-Id": "north"}).status_code == 200
+    assert client.get("/api/availability?ids=2&branch=north").get_json()["2"]["available_copies"] == 0
+    assert client.get("/api/availability?ids=2&branch=south").get_json()["2"] is None
+    assert client.get("/api/availability?ids=2&branch=west").status_code == 404
+
+    found = client.get("/api/branches/search?q=dune").get_json()
+    assert found["count"] == 2 and {book["branch"] for book in found["results"]} == {"north", "south"}
+
+
+def test_async_requests_are_routed_by_branch(branches):
+    asgi_app = create_asgi_app(branches)
+    with database.use_branch("north"):
+        svc.borrow_book_by_patron("123456", 2)
+
+    status, body = call(asgi_app, "GET", "/api/availability", b"ids=2",
+                        headers=[(b"x-branch-id", b"north")])
+    assert status == 200 and json.loads(body)["2"]["available_copies"] == 0
+    status, body = call(asgi_app, "GET", "/api/availability", b"ids=1&branch=south")
+    assert status == 200 and json.loads(body)["1"]["available_copies"] == 1
+    assert json.loads(call(asgi_app, "GET", "/api/availability", b"ids=2&branch=south")[1])["2"] is None
+    status, body = call(asgi_app, "GET", "/api/availability", b"ids=2&branch=west")
+    assert status == 404 and "west" in json.loads(body)["error"]
@@ -0,0 +1,90 @@
+import pytest
+
+import database
+import library_service
+import services.library_service as svc
+from services import catalog_snapshot
+
+
+@pytest.fixture
+def catalog_db(monkeypatch, tmp_path):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "snapshot.db"))
+    database.init_database()
+    database.insert_book("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565", 3, 3)
+    database.insert_book("Tender Is the Night", "F. Scott Fitzgerald", "9780684801544", 2, 1)
+    database.insert_book("1984", "George Orwell", "9780451524935", 1, 0)
+    catalog_snapshot.reset_catalog_snapshot()
+    yield
+    catalog_snapshot.reset_catalog_snapshot()
+
+
+def test_search_matches_row_based_search(catalog_db, monkeypatch):
+    fast = svc.search_books_in_catalog("the", "title")
+    monkeypatch.setattr(library_service, "get_all_books", lambda: database.get_all_books())
+    slow = svc.search_books_in_catalog("the", "title")
+    assert fast == slow
+    assert [b.title for b in fast] == ["Tender Is the Night", "The Great Gatsby"]
+
+
+def test_search_by_author_and_isbn(catalog_db):
+    assert len(svc.search_books_in_catalog("FITZGERALD", "author")) == 2
+    assert [b.title for b in svc.search_books_in_catalog("9780451", "isbn")] == ["1984"]
+    assert svc.search_books_in_catalog("orwell", "publisher") == []
+
+
+def test_snapshot_refreshes_only_changed_rows(catalog_db):
+    snap = catalog_snapshot.get_catalog_snapshot()
+    seq = snap.seq
+    gatsby = database.get_book_by_isbn("9780743273565")
+
+    database.update_book_availability(gatsby.id, -1)
+    database.insert_book("Animal Farm", "George Orwell", "9780451526342", 4, 4)
+    snap = catalog_snapshot.get_catalog_snapshot()
+
+    assert snap.seq > seq
+    assert len(snap.ids) == 4
+    assert svc.search_books_in_catalog("gatsby", "title")[0].available_copies == 2
+    assert [b.title for b in svc.search_books_in_catalog("orwell", "author")] == ["1984", "Animal Farm"]
+
+
+def test_catalog_statistics(catalog_db):
+    stats = svc.get_catalog_statistics(top_n=1)
+    assert stats["total_titles"] == 3
+    assert stats["total_copies"] == 6 and stats["available_copies"] == 4
+    assert stats["availability_ratio"] == round(4 / 6, 4)
+    assert stats["top_authors"] == [("F. Scott Fitzgerald", 2)]
+
+
+def test_catalog_statistics_without_snapshot(monkeypatch):
+    monkeypatch.setattr(library_service, "get_all_books", lambda: [
+        {"id": 1, "title": "A", "author": "X", "isbn": "1", "total_copies": 2, "available_copies": 1},
+        {"id": 2, "title": "B", "author": "Y", "isbn": "2", "total_copies": 2, "available_copies": 2},
+    ])
+    stats = svc.get_catalog_statistics()
+    assert stats["availability_ratio"] == 0.75
+    assert stats["top_authors"] == [("X", 1), ("Y", 1)]
+
+
+def test_snapshot_reloads_when_the_changes_it_missed_were_pruned(monkeypatch, tmp_path):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "pruned.db"))
+    monkeypatch.setattr(database, "CATALOG_CHANGES_KEPT", 2)
+    monkeypatch.setattr(database, "CHANGE_LOG_PRUNE_INTERVAL", 2)
+    database.init_database()
+    database.insert_book("Book 0", "Author", "9780000000000", 1, 1)
+    catalog_snapshot.reset_catalog_snapshot()
+    assert len(catalog_snapshot.get_catalog_snapshot().ids) == 1
+
+    for i in range(1, 6):
+        database.insert_book(f"Book {i}", "Author", f"978000000000{i}", 1, 1)
+    conn = database.get_db_connection()
+    kept = conn.execute("SELECT COUNT(*) FROM catalog_changes").fetchone()[0]
+    conn.close()
+
+    assert kept <= 3
+    assert not database.catalog_changes_cover(1)
+    snap = catalog_snapshot.get_catalog_snapshot()
+    assert sorted(b.title for b in svc.search_books_in_catalog("book", "title")) == [f"Book {i}" for i in range(6)]
+    assert snap.seq == database.get_catalog_change_seq()
+    catalog_snapshot.reset_catalog_snapshot()
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import pytest
+
+import database
+import services.library_service as svc
+from app import create_app
+from asgi import create_asgi_app
+from tests.test_asgi_mode import call
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "feed.db"))
+    monkeypatch.setattr(svc, "CHANGE_FEED_POLL_INTERVAL", 0.02)
+    return create_app()
+
+
+def test_feed_starts_with_sample_data_and_follows_changes(app):
+    client = app.test_client()
+    first = client.get("/api/changes?since=0").get_json()
+    assert [(c["entity"], c["op"]) for c in first["changes"]] == [("book", "insert")] * 3 + \
+        [("loan", "insert"), ("book", "update")]
+    assert first["changes"][0]["data"]["title"] == "The Great Gatsby"
+    cursor = first["next_since"]
+
+    assert svc.borrow_book_by_patron("111111", 1)[0]
+    page = client.get(f"/api/changes?since={cursor}").get_json()
+    assert [(c["entity"], c["entity_id"], c["op"]) for c in page["changes"]] == [
+        ("loan", 2, "insert"), ("book", 1, "update")]
+    assert page["changes"][1]["data"]["available_copies"] == 2
+    assert page["has_more"] is False
+
+    empty = client.get(f"/api/changes?since={page['next_since']}").get_json()
+    assert empty["changes"] == [] and empty["next_since"] == page["next_since"]
+
+
+def test_paging_and_deleted_rows(app):
+    conn = database.get_db_connection()
+    conn.execute("DELETE FROM books WHERE id = 3")
+    conn.commit()
+    conn.close()
+
+    page = svc.get_changes_since(0, limit=2)
+    assert len(page["changes"]) == 2 and page["has_more"] is True
+    rest = svc.get_changes_since(page["next_since"], limit=100)
+    assert rest["has_more"] is False
+    deleted = rest["changes"][-1]
+    assert (deleted["entity_id"], deleted["op"], deleted["data"]) == (3, "delete", None)
+
+
+def test_long_poll_returns_when_a_change_arrives(app):
+    client = app.test_client()
+    cursor = client.get("/api/changes").get_json()["next_since"]
+    threading.Timer(0.2, lambda: database.update_book_availability(2, -1)).start()
+
+    start = time.monotonic()
+    page = client.get(f"/api/changes?since={cursor}&wait=5").get_json()
+    assert 0.15 < time.monotonic() - start < 4
+    assert [(c["entity_id"], c["op"]) for c in page["changes"]] == [(2, "update")]
+
+
+def test_stale_cursor_and_bad_arguments(app):
+    client = app.test_client()
+    assert client.get("/api/changes?since=99999").get_json()["resync_required"] is True
+    assert client.get("/api/changes?since=x").status_code == 400
+    assert client.get("/api/changes?limit=0").status_code == 400
+
+
+def test_async_route_long_polls_on_the_event_loop(app):
+    asgi_app = create_asgi_app(app)
+    cursor = svc.get_changes_since(0)["next_since"]
+    threading.Timer(0.2, lambda: database.update_book_availability(1, -1)).start()
+
+    status, body = call(asgi_app, "GET", "/api/changes", f"since={cursor}&wait=5".encode())
+    assert status == 200
+    assert [c["entity_id"] for c in json.loads(body)["changes"]] == [1]
+
+
+def test_cursor_older_than_the_pruned_entries_must_resync(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "pruned.db"))
+    monkeypatch.setattr(database, "CHANGE_FEED_KEPT", 2)
+    monkeypatch.setattr(database, "CHANGE_LOG_PRUNE_INTERVAL", 2)
+    database.init_database()
+    for i in range(5):
+        database.insert_book(f"Book {i}", "Author", f"978000000000{i}", 1, 1)
+
+    stale = svc.get_changes_since(1)
+    assert stale["resync_required"] is True and stale["changes"] == []
+    assert stale["next_since"] == database.get_change_feed_seq() == 5
+
+    current = svc.get_changes_since(database.get_change_feed_pruned_seq())
+    assert current["resync_required"] is False
+    assert [c["entity_id"] for c in current["changes"]] == [3, 4, 5]
+    conn = database.get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM change_feed").fetchone()[0] <= 3
+    conn.close()
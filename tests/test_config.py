@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import database
+from app import create_app
+from config import LibraryConfig, active_config, use_config
+from services import payment_transport
+from services.payment_service import PaymentGateway
+
+
+def test_toml_values_then_environment_overrides(tmp_path):
+    path = tmp_path / "library.toml"
+    path.write_text('[library]\ndatabase_path = "branch.db"\npragma_profile = "wal"\ndb_threads = 4\n')
+    config = LibraryConfig.load(str(path), environ={"LIBRARY_DB_THREADS": "8", "LIBRARY_BUSY_TIMEOUT": "0.5"})
+    assert (config.database_path, config.pragma_profile, config.db_threads, config.busy_timeout) == ("branch.db", "wal", 8, 0.5)
+
+    assert LibraryConfig.load(environ={"LIBRARY_CONFIG": str(path)}).database_path == "branch.db"
+    with pytest.raises(ValueError):
+        LibraryConfig.from_mapping({"pragma_profile": "turbo"})
+    with pytest.raises(ValueError):
+        LibraryConfig.from_mapping({"databse_path": "typo.db"})
+
+
+def test_process_default_reads_the_config_file(tmp_path):
+    path = tmp_path / "library.toml"
+    path.write_text('database_path = "from-file.db"\nbusy_timeout = 2.5\n')
+    env = dict(os.environ, LIBRARY_CONFIG=str(path), LIBRARY_BUSY_TIMEOUT="1.5")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = "from config import active_config as c; print(c().database_path, c().busy_timeout)"
+    output = subprocess.run([sys.executable, "-c", script], cwd=root, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["from-file.db", "1.5"]
+
+
+def test_connections_use_the_pragma_profile(tmp_path):
+    config = LibraryConfig(database_path=str(tmp_path / "wal.db"), pragma_profile="wal", sqlite_cache_kib=8192)
+    with use_config(config):
+        conn = database.get_db_connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -8192
+        conn.close()
+    assert active_config().database_path is None
+
+
+def test_each_app_serves_requests_with_its_own_config(tmp_path):
+    app = create_app(LibraryConfig(database_path=str(tmp_path / "own.db"), pragma_profile="tmpfs"))
+    with app.test_request_context("/"):
+        app.preprocess_request()
+        assert active_config() is app.config["LIBRARY_CONFIG"]
+        assert database.database_path() == str(tmp_path / "own.db")
+    assert active_config().pragma_profile == "default"
+
+
+def test_payment_settings_come_from_the_active_config():
+    config = LibraryConfig(payment_gateway_url="http://127.0.0.1:9", payment_api_key="live_key", payment_pool_size=3)
+    try:
+        with use_config(config):
+            gateway = PaymentGateway()
+        assert (gateway.api_key, gateway.base_url) == ("live_key", "http://127.0.0.1:9")
+        assert gateway.transport.pool_size == 3
+        assert PaymentGateway().transport is None  # default config: simulated payments
+    finally:
+        payment_transport.close_shared_transports()
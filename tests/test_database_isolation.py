@@ -0,0 +1,42 @@
+import json
+import os
+
+import database
+from app import create_app
+from asgi import create_asgi_app
+from config import LibraryConfig
+from tests.test_asgi_mode import call
+
+
+def test_library_db_is_a_private_copy_of_the_template(library_db, template_database):
+    assert database.DATABASE == library_db != template_database
+    assert [book.title for book in database.get_all_books()] == ["1984", "The Great Gatsby", "To Kill a Mockingbird"]
+
+    database.update_book_availability(1, -1)
+    with database.use_database(template_database):
+        assert database.get_book_by_id(1).available_copies == 3
+
+
+def test_each_app_uses_its_own_database(tmp_path):
+    first, second = str(tmp_path / "first.db"), str(tmp_path / "second.db")
+    first_app = create_app(LibraryConfig(database_path=first))
+    second_app = create_app(LibraryConfig(database_path=second))
+
+    reply = first_app.test_client().post("/api/borrow/batch", json={"patron_id": "111111", "book_ids": [1]})
+    assert reply.get_json()["success"]
+
+    def availability(app):
+        return app.test_client().get("/api/availability?ids=1").get_json()["1"]["available_copies"]
+
+    assert (availability(first_app), availability(second_app)) == (2, 3)
+    assert not os.path.exists(database.DATABASE)  # the default file was never touched
+
+
+def test_async_routes_use_the_app_database(library_app, tmp_path):
+    other = create_asgi_app(create_app(LibraryConfig(database_path=str(tmp_path / "other.db"))))
+    with database.use_database(library_app.config["LIBRARY_CONFIG"].database_path):
+        database.update_book_availability(1, -2)
+
+    status, body = call(create_asgi_app(library_app), "GET", "/api/availability", b"ids=1")
+    assert status == 200 and json.loads(body)["1"]["available_copies"] == 1
+    assert json.loads(call(other, "GET", "/api/availability", b"ids=1")[1])["1"]["available_copies"] == 3
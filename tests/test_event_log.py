@@ -0,0 +1,138 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import database
+from config import active_config
+import services.library_service as svc
+from services import event_log
+from services.event_log import (
+    EventLog, rebuild_availability, replay_events, verify_against_tables, write_checkpoint
+)
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "events.db"))
+    database.init_database()
+    yield
+    event_log.event_log.flush()
+
+
+def events():
+    event_log.event_log.flush()
+    conn = database.get_db_connection()
+    rows = conn.execute("SELECT type, patron_id, book_id, payload FROM events ORDER BY seq").fetchall()
+    conn.close()
+    return [(r["type"], r["patron_id"], r["book_id"], json.loads(r["payload"])) for r in rows]
+
+
+def test_service_operations_are_logged_in_order(db):
+    assert svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 2)[0]
+    assert svc.borrow_book_by_patron("111111", 1)[0]
+    assert svc.borrow_books_by_patron("222222", [1])[0]
+    assert svc.return_book_by_patron("111111", 1)[0]
+
+    logged = [(t, p, b) for t, p, b, _ in events()]
+    assert logged == [
+        ("book_added", None, None),
+        ("book_borrowed", "111111", 1),
+        ("book_borrowed", "222222", 1),
+        ("book_returned", "111111", 1),
+    ]
+    assert events()[0][3]["isbn"] == "9780441013593"
+
+
+def test_replay_rebuilds_availability_and_open_loans(db):
+    svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 3)
+    svc.add_book_to_catalog("Emma", "Jane Austen", "9780141439587", 1)
+    svc.borrow_book_by_patron("111111", 1)
+    svc.borrow_book_by_patron("222222", 1)
+    svc.borrow_book_by_patron("222222", 2)
+    svc.return_books_by_patron("222222", [1, 2])
+
+    replayed = replay_events()
+    assert replayed["events"] == 7
+    assert replayed["books"] == {1: {"total_copies": 3, "available_copies": 2},
+                                 2: {"total_copies": 1, "available_copies": 1}}
+    assert replayed["open_loans"] == {("111111", 1): 1}
+    assert verify_against_tables(replayed) == []
+
+
+def test_checkpoint_covers_rows_written_outside_the_service(db):
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    write_checkpoint()
+    svc.borrow_book_by_patron("111111", 1)
+
+    # Simulate a derived value drifting from the log
+    database.update_book_availability(1, +5)
+    assert verify_against_tables() == [{"book_id": 1, "table": 7, "log": 2}]
+    assert rebuild_availability() == 1
+    assert database.get_book_by_id(1).available_copies == 2
+
+
+def test_group_commit_batches_appends(db, monkeypatch):
+    log = EventLog(batch_size=1000, flush_interval=60)
+    commits = []
+    write = log._write
+    monkeypatch.setattr(log, "_write", lambda batch: (commits.append(len(batch)), write(batch)))
+
+    for i in range(50):
+        log.append("book_returned", "111111", i)
+    log.flush()
+
+    assert commits == [50]
+    assert log.written == 50
+    assert len(events()) == 50
+
+
+def test_changes_are_logged_in_their_own_transaction(db, monkeypatch):
+    log = EventLog(batch_size=1000, flush_interval=60)
+    monkeypatch.setattr(event_log, "event_log", log)
+    svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 3)
+    svc.borrow_book_by_patron("111111", 1)
+    assert svc.return_books_by_patron("111111", [1, 1])[0]
+
+    # Nothing waited in the queue, and the return that found no open loan was not logged
+    assert log._pending == []
+    assert [t for t, *_ in events()] == ["book_added", "book_borrowed", "book_returned"]
+
+
+def test_checkpoint_while_events_are_queued_replays_each_change_once(db, monkeypatch):
+    log = EventLog(batch_size=1000, flush_interval=60)
+    monkeypatch.setattr(event_log, "event_log", log)
+    svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 3)
+    svc.borrow_book_by_patron("111111", 1)
+    event_log.record_event("loan_overdue", "111111", 1)
+    assert len(log._pending) == 1
+
+    seq = write_checkpoint()
+    assert log._pending == []
+    assert [t for t, *_ in events()] == ["book_added", "book_borrowed", "loan_overdue", "checkpoint"]
+
+    svc.borrow_book_by_patron("222222", 1)
+    replayed = replay_events()
+    assert replayed["events"] == 1 and replayed["last_seq"] == seq + 1
+    assert replayed["books"] == {1: {"total_copies": 3, "available_copies": 1}}
+    assert replayed["open_loans"] == {("111111", 1): 1, ("222222", 1): 1}
+    assert verify_against_tables(replayed) == []
+
+
+def test_dropped_events_are_logged(tmp_path, caplog):
+    log = EventLog(batch_size=1000, flush_interval=60)
+    path = str(tmp_path / "missing" / "events.db")
+    log._write([(path, active_config(), "2024-01-01T00:00:00", "loan_overdue", "111111", 1, "{}")])
+
+    assert log.dropped == 1
+    assert "Dropped 1 events" in caplog.text
+
+
+def test_borrow_without_a_copy_leaves_no_loan_and_no_event(db):
+    svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 1)
+    database.update_book_availability(1, -1)  # the copy goes between the check and the write
+
+    assert database.borrow_books_batch("111111", [1], datetime.now(), datetime.now(),
+                                       events=[event_log.event("book_borrowed", "111111", 1)]) is False
+    assert database.get_patron_borrow_count("111111") == 0
+    assert [t for t, *_ in events()] == ["book_added"]
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import services.library_service as svc
+from app import create_app
+from asgi import create_asgi_app
+from config import LibraryConfig
+from services import fee_ledger
+from services.fee_ledger import FeeAccrualJob, accrue_late_fees, late_fee_for_days
+
+
+class FakeGateway:
+    def __init__(self):
+        self.refunds = []
+
+    def process_payment(self, patron_id, amount, description):
+        return True, f"txn_{patron_id}_{amount}", "Paid"
+
+    def refund_payment(self, transaction_id, amount):
+        self.refunds.append((transaction_id, amount))
+        return True, f"Refunded ${amount:.2f}"
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "fees.db"))
+    database.init_database()
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    database.insert_book("Emma", "Jane Austen", "9780141439587", 3, 3)
+
+
+def ledger():
+    conn = database.get_db_connection()
+    rows = conn.execute("SELECT * FROM fees ORDER BY borrow_record_id").fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def test_r5_tiers_and_cap():
+    assert late_fee_for_days(0) == 0.0
+    assert late_fee_for_days(3) == 1.50
+    assert late_fee_for_days(7) == 3.50
+    assert late_fee_for_days(10) == 6.50
+    assert late_fee_for_days(40) == 15.00
+
+
+def test_accrual_advances_only_open_overdue_loans(db):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=24), now - timedelta(days=10))
+    database.insert_borrow_record("222222", 2, now - timedelta(days=5), now + timedelta(days=9))
+
+    assert accrue_late_fees(now) == 1
+    [row] = ledger()
+    assert (row["patron_id"], row["days_overdue"], row["accrued"]) == ("111111", 10, 6.50)
+
+    # Same day again: nothing left to do
+    assert accrue_late_fees(now) == 0
+
+    assert accrue_late_fees(now + timedelta(days=1)) == 1
+    assert ledger()[0]["accrued"] == 7.50
+
+
+def test_capped_loans_are_not_revisited(db):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=60), now - timedelta(days=40))
+    assert accrue_late_fees(now) == 1
+    assert ledger()[0]["accrued"] == 15.00
+    assert accrue_late_fees(now + timedelta(days=1)) == 0
+
+
+def test_return_settles_the_ledger_row(db):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=17), now - timedelta(days=3))
+    database.update_book_availability(1, -1)
+    accrue_late_fees(now - timedelta(days=1))
+
+    ok, _ = svc.return_book_by_patron("111111", 1)
+    assert ok
+    [row] = ledger()
+    assert (row["days_overdue"], row["accrued"], row["accrued_through"]) == (3, 1.50, now.date().isoformat())
+
+    # A returned loan is no longer advanced
+    assert accrue_late_fees(now + timedelta(days=5)) == 0
+
+
+def test_fee_read_uses_ledger_and_payment_reduces_amount_owed(db, monkeypatch):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=24), now - timedelta(days=10))
+    accrue_late_fees(now)
+    conn = database.get_db_connection()
+    conn.execute("UPDATE fees SET accrued = 9.99")  # prove the read comes from the ledger row
+    conn.commit()
+    conn.close()
+
+    assert svc.calculate_late_fee_for_book("111111", 1)["fee_amount"] == 9.99
+
+    ok, _, txn = svc.pay_late_fees("111111", 1, FakeGateway())
+    assert ok
+    assert ledger()[0]["paid"] == 9.99
+    assert svc.calculate_late_fee_for_book("111111", 1)["fee_amount"] == 0.0
+    assert svc.get_patron_status_report("111111")["total_late_fees"] == 0.0
+
+    ok, msg, _ = svc.pay_late_fees("111111", 1, FakeGateway())
+    assert not ok and msg == "No late fees to pay for this book."
+
+
+def test_payment_without_accrual_creates_ledger_row(db):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=17), now - timedelta(days=3))
+
+    ok, _, txn = svc.pay_late_fees("111111", 1, FakeGateway())
+    assert ok
+    [row] = ledger()
+    assert (row["accrued"], row["paid"], row["accrued_through"]) == (1.50, 1.50, now.date().isoformat())
+    assert database.get_fee_payment(txn)["amount"] == 1.50
+
+
+def test_refund_is_limited_to_amount_paid_and_restores_balance(db):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=17), now - timedelta(days=3))
+    ok, _, txn = svc.pay_late_fees("111111", 1, FakeGateway())
+
+    gateway = FakeGateway()
+    ok, msg = svc.refund_late_fee_payment(txn, 5.00, gateway)
+    assert not ok and "amount paid" in msg
+    assert gateway.refunds == []
+
+    ok, msg = svc.refund_late_fee_payment(txn, 1.00, gateway)
+    assert ok and msg == "Refunded $1.00"
+    assert ledger()[0]["paid"] == 0.50
+    assert svc.calculate_late_fee_for_book("111111", 1)["fee_amount"] == 1.00
+
+
+def test_accrual_job_runs_once_per_day(db):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=24), now - timedelta(days=10))
+
+    class Clock:
+        value = now
+
+        def __call__(self):
+            return self.value
+
+    clock = Clock()
+    job = FeeAccrualJob(clock=clock)
+    assert job.run_if_due() == 1
+    assert job.run_if_due() == 0
+    clock.value = now + timedelta(days=1)
+    assert job.run_if_due() == 1
+    assert 0 < job.seconds_until_next_run() <= 24 * 3600
+
+
+def test_asgi_lifespan_accrues_fees_in_the_apps_database(db, tmp_path):
+    path = str(tmp_path / "app.db")
+    asgi_app = create_asgi_app(create_app(LibraryConfig(database_path=path)))
+    now = datetime.now()
+    with database.use_database(path):
+        database.insert_borrow_record("111111", 1, now - timedelta(days=24), now - timedelta(days=10))
+
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        message = next(messages)
+        if message["type"] == "lifespan.shutdown":
+            deadline = time.monotonic() + 5
+            while (fee_ledger._job is None or fee_ledger._job.last_run is None) and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+        return message
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi_app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    with database.use_database(path):
+        assert "111111" in [row["patron_id"] for row in ledger()]
+    assert ledger() == []
@@ -0,0 +1,86 @@
+import random
+import string
+
+import pytest
+
+import database
+import services.library_service as svc
+from services import fuzzy_search
+from services.fuzzy_search import WordIndex, bounded_levenshtein, max_edits
+
+
+@pytest.fixture(autouse=True)
+def fresh_word_lists():
+    fuzzy_search.reset_catalog_words()
+    yield
+    fuzzy_search.reset_catalog_words()
+
+
+def full_levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return previous[-1]
+
+
+def test_bounded_levenshtein():
+    assert bounded_levenshtein("gatsbby", "gatsby", 2) == 1
+    assert bounded_levenshtein("fitzgerld", "fitzgerald", 2) == 1
+    assert bounded_levenshtein("kitten", "sitting", 2) is None
+    assert bounded_levenshtein("kitten", "sitting", 3) == 3
+    assert bounded_levenshtein("a", "abcd", 2) is None
+    assert (max_edits("the"), max_edits("orwel"), max_edits("gatsbby")) == (0, 1, 2)
+
+
+def test_ngram_candidates_match_a_brute_force_scan():
+    rng = random.Random(11)
+    vocabulary = ["".join(rng.choice("abcdefg") for _ in range(rng.randint(3, 9))) for _ in range(2000)]
+    index = WordIndex()
+    index.add(vocabulary)
+    for query in rng.sample(vocabulary, 40) + ["abcabc", "gggg", "fedcbaf"]:
+        limit = max_edits(query)
+        expected = {word: full_levenshtein(query, word) for word in set(vocabulary)
+                    if full_levenshtein(query, word) <= limit}
+        assert index.similar(query, limit) == expected
+
+
+def test_typos_in_titles_and_authors(library_db):
+    assert [book.title for book in svc.search_books_fuzzy("Gatsbby", "title")[0]] == ["The Great Gatsby"]
+    assert [book.title for book in svc.search_books_fuzzy("grat gatsbby", "title")[0]] == ["The Great Gatsby"]
+    assert [book.author for book in svc.search_books_fuzzy("Fitzgerld", "author")[0]] == ["F. Scott Fitzgerald"]
+    assert svc.search_books_fuzzy("mockingbrd orwell", "title") == ([], 0)
+    assert svc.search_books_fuzzy("Gatsbby", "isbn") == ([], 0)
+
+
+def test_fewest_edits_first_and_new_books_are_found(library_db):
+    svc.search_books_fuzzy("warmup", "title")
+    database.insert_book("Gatsbby Returns", "A. Writer", "9990000000001", 1, 1)
+    books, total = svc.search_books_fuzzy("gatsbby", "title")
+    assert total == 2 and [book.title for book in books] == ["Gatsbby Returns", "The Great Gatsby"]
+
+
+def test_scan_fallback_agrees_with_the_index(library_db, monkeypatch):
+    rng = random.Random(5)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 9))) for _ in range(60)]
+    for i in range(200):
+        database.insert_book(" ".join(rng.sample(words, 3)), "Author", f"98{i:011d}", 1, 1)
+    queries = [word[:2] + word[3:] for word in words[:20]]  # one letter dropped from each
+    indexed = [svc.search_books_fuzzy(query, "title", limit=500) for query in queries]
+
+    monkeypatch.setattr(database, "get_fts_vocabulary", lambda column: None)  # SQLite without FTS5
+    fuzzy_search.reset_catalog_words()
+    for query, (books, total) in zip(queries, indexed):
+        scanned, scanned_total = svc.search_books_fuzzy(query, "title", limit=500)
+        assert scanned_total == total > 0
+        assert sorted(book.id for book in scanned) == sorted(book.id for book in books)
+
+
+def test_search_endpoints_fall_back_to_fuzzy(library_app):
+    client = library_app.test_client()
+    data = client.get("/api/search?q=gatsbby").get_json()
+    assert data["fuzzy"] is True and [book["title"] for book in data["results"]] == ["The Great Gatsby"]
+    assert client.get("/api/search?q=gatsby").get_json()["fuzzy"] is False
+    assert "similar spellings" in client.get("/search?q=fitzgerld&type=author").get_data(as_text=True)
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+
+import pytest
+
+import database
+import services.library_service as svc
+from services.event_log import rebuild_availability, verify_against_tables, write_checkpoint
+
+
+@pytest.fixture
+def app(library_app):
+    return library_app  # book 3 ("1984") has its only copy on loan to 123456
+
+
+def test_returned_copy_goes_to_the_oldest_hold(app):
+    ok, message, first = svc.place_hold("111111", 3)
+    assert ok and first["position"] == 1 and "Position in queue: 1" in message
+    second = svc.place_hold("222222", 3)[2]
+    assert second["position"] == 2
+
+    assert svc.borrow_book_by_patron("111111", 3) == (False, "This book is currently not available.")
+    assert svc.return_book_by_patron("123456", 3)[0]
+
+    assert svc.get_hold_status(first["id"])["status"] == "ready"
+    assert svc.get_hold_status(second["id"])["position"] == 1
+    assert database.get_book_by_id(3).available_copies == 0  # set aside, not on the shelf
+    assert svc.borrow_book_by_patron("333333", 3)[0] is False
+
+    assert svc.borrow_book_by_patron("111111", 3)[0]
+    assert svc.get_hold_status(first["id"])["status"] == "fulfilled"
+    assert database.get_book_by_id(3).available_copies == 0
+
+
+def test_hold_rules(app):
+    assert svc.place_hold("12345", 3)[1] == "Invalid patron ID. Must be exactly 6 digits."
+    assert svc.place_hold("111111", 99)[1] == "Book not found."
+    assert svc.place_hold("111111", 1)[1] == "This book is available; borrow it instead."
+    assert svc.place_hold("111111", 3)[0]
+    assert svc.place_hold("111111", 3)[1] == "You already have a hold on this book."
+
+
+def test_cancelling_a_ready_hold_passes_the_copy_on(app):
+    first = svc.place_hold("111111", 3)[2]
+    second = svc.place_hold("222222", 3)[2]
+    svc.return_books_by_patron("123456", [3])
+
+    assert svc.cancel_hold_for_patron("222222", first["id"]) == (False, "Hold not found.")
+    assert svc.cancel_hold_for_patron("111111", first["id"]) == (True, "Hold cancelled.")
+    assert svc.get_hold_status(second["id"])["status"] == "ready"
+
+    assert svc.cancel_hold_for_patron("222222", second["id"])[0]
+    assert svc.cancel_hold_for_patron("222222", second["id"]) == (False, "Hold is already cancelled.")
+    assert database.get_book_by_id(3).available_copies == 1
+
+
+def test_long_poll_wakes_up_on_return(app, monkeypatch):
+    monkeypatch.setattr(svc, "HOLD_POLL_INTERVAL", 10)
+    client = app.test_client()
+    hold = client.post("/api/holds", json={"patron_id": "111111", "book_id": 3}).get_json()["hold"]
+
+    threading.Timer(0.2, lambda: svc.return_book_by_patron("123456", 3)).start()
+    start = time.perf_counter()
+    polled = client.get(f"/api/holds/{hold['id']}?wait=5&status=waiting").get_json()
+    assert polled["status"] == "ready"
+    assert time.perf_counter() - start < 2  # woken by the return, not the 10 s re-read
+
+    assert client.get(f"/api/holds/{hold['id']}?wait=0.1").get_json()["status"] == "ready"
+    assert client.get("/api/holds/999").status_code == 404
+    for wait in ("nan", "inf", "soon"):
+        assert client.get(f"/api/holds/{hold['id']}?wait={wait}").status_code == 400
+    assert svc.get_hold_status(hold["id"], float("nan"))["status"] == "ready"
+    assert client.post(f"/api/holds/{hold['id']}/cancel", json={"patron_id": "111111"}).status_code == 200
+
+
+def test_replay_follows_hold_allocation(app):
+    first = svc.place_hold("111111", 3)[2]
+    write_checkpoint()
+    svc.place_hold("222222", 3)
+    svc.return_book_by_patron("123456", 3)
+    svc.cancel_hold_for_patron("111111", first["id"])
+    svc.borrow_book_by_patron("222222", 3)
+    svc.return_book_by_patron("222222", 3)
+
+    assert database.get_book_by_id(3).available_copies == 1
+    assert verify_against_tables() == []
+
+
+def test_ready_hold_is_fulfilled_even_with_a_copy_on_the_shelf(app):
+    hold = svc.place_hold("111111", 3)[2]
+    assert svc.return_book_by_patron("123456", 3)[0]
+    assert svc.get_hold_status(hold["id"])["status"] == "ready"
+    database.update_book_availability(3, +1)  # another copy reaches the shelf
+
+    assert svc.borrow_book_by_patron("111111", 3)[0]
+    assert svc.get_hold_status(hold["id"])["status"] == "fulfilled"
+    assert database.get_book_by_id(3).available_copies == 1
+
+
+def test_batch_borrow_fulfills_a_ready_hold(app):
+    hold = svc.place_hold("111111", 3)[2]
+    write_checkpoint()
+    assert svc.return_book_by_patron("123456", 3)[0]
+    client = app.test_client()
+
+    body = client.post("/api/borrow/batch", json={"patron_id": "111111", "book_ids": [3]}).get_json()
+    assert body["success"] and body["results"][0]["success"]
+    assert svc.get_hold_status(hold["id"])["status"] == "fulfilled"
+    assert database.get_book_by_id(3).available_copies == 0
+    assert verify_against_tables() == []
+
+
+def test_batch_borrow_takes_the_set_aside_copy_before_the_shelf(app):
+    hold = svc.place_hold("111111", 3)[2]
+    assert svc.return_book_by_patron("123456", 3)[0]
+    database.update_book_availability(3, +1)  # another copy reaches the shelf
+
+    ok, _, results = svc.borrow_books_by_patron("111111", [3, 3])
+    assert ok and [r["success"] for r in results] == [True, True]
+    assert svc.get_hold_status(hold["id"])["status"] == "fulfilled"
+    assert database.get_book_by_id(3).available_copies == 0
+
+    conn = database.get_db_connection()
+    payloads = [row[0] for row in conn.execute("SELECT payload FROM events WHERE type = 'book_borrowed' ORDER BY seq")]
+    conn.close()
+    assert [json.loads(payload)["hold_id"] for payload in payloads] == [hold["id"], None]
+
+
+def test_rebuild_does_not_allocate_copies_to_holds_again(app):
+    write_checkpoint()
+    conn = database.get_db_connection()
+    with conn:
+        # A hold the log never saw, and availability drifting below the log's value
+        conn.execute("INSERT INTO holds (patron_id, book_id, placed_at) VALUES ('111111', 1, '2024-01-01T00:00:00')")
+        conn.execute("UPDATE books SET available_copies = available_copies - 2 WHERE id = 1")
+    conn.close()
+    expected = database.get_book_by_id(1).available_copies + 2
+
+    assert rebuild_availability() == 1
+    assert database.get_book_by_id(1).available_copies == expected
+    assert database.get_patron_hold("111111", 1)["status"] == "waiting"
+
+    # The trigger is back for later returns
+    assert svc.borrow_book_by_patron("222222", 1)[0]
+    conn = database.get_db_connection()
+    with conn:
+        conn.execute("UPDATE books SET available_copies = 0 WHERE id = 1")
+    conn.close()
+    assert svc.return_book_by_patron("222222", 1)[0]
+    assert database.get_patron_hold("111111", 1)["status"] == "ready"
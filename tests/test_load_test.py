@@ -0,0 +1,45 @@
+import pytest
+
+import database
+from app import create_app
+from benchmarks.load_test import DEFAULT_MIX, InProcessClient, LoadStats, Population, parse_mix, run_load
+from benchmarks.payment_stub_server import PaymentStubServer
+from services import payment_transport
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "load.db"))
+    with PaymentStubServer() as stub:
+        monkeypatch.setenv("PAYMENT_GATEWAY_URL", stub.url)
+        yield create_app()
+        payment_transport.close_shared_transports()
+
+
+def test_mixed_load_reports_every_endpoint(app):
+    population = Population(books=40, patrons=30, seed=3)
+    population.seed()
+    assert population.overdue
+
+    result = run_load(lambda: InProcessClient(app), population, workers=4, total_requests=300, seed=3)
+    endpoints = result["endpoints"]
+    assert set(endpoints) == set(DEFAULT_MIX) | {"total"}
+    assert endpoints["total"]["requests"] == 300
+    assert endpoints["total"]["errors"] == 0
+    for row in endpoints.values():
+        assert row["p50_ms"] <= row["p90_ms"] <= row["p99_ms"] <= row["max_ms"]
+
+
+def test_percentiles_and_error_rate():
+    stats = LoadStats()
+    for ms in range(1, 101):
+        stats.record("search", ms / 1000, "error" if ms <= 5 else "ok")
+    row = stats.report(elapsed=2.0)["search"]
+    assert (row["p50_ms"], row["p90_ms"], row["p99_ms"], row["max_ms"]) == (50.0, 90.0, 99.0, 100.0)
+    assert row["error_rate"] == 0.05 and row["per_second"] == 50.0
+
+
+def test_parse_mix():
+    assert parse_mix("search=3, borrow=1") == {"search": 3.0, "borrow": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("browse=1")
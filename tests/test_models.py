@@ -0,0 +1,36 @@
+import pytest
+from datetime import datetime, timedelta
+
+import database
+from models import Book, Loan
+
+
+def test_book_has_no_instance_dict():
+    book = Book(1, "Dune", "Frank Herbert", "9780441013593", 3, 2)
+    assert not hasattr(book, "__dict__")
+
+
+def test_book_mapping_access():
+    book = Book(1, "Dune", "Frank Herbert", "9780441013593", 3, 2)
+    assert book["title"] == "Dune"
+    assert book.get("available_copies", 0) == 2
+    assert book.get("missing", "x") == "x"
+    assert "isbn" in book
+    assert dict(book)["total_copies"] == 3
+    with pytest.raises(KeyError):
+        book["missing"]
+
+
+def test_row_factories_build_records(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "models.db"))
+    database.init_database()
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    book = database.get_book_by_isbn("9780441013593")
+    assert isinstance(book, Book) and database.get_all_books() == [book]
+
+    now = datetime.now()
+    database.insert_borrow_record("123456", book.id, now - timedelta(days=20), now - timedelta(days=6))
+    loans = database.get_patron_borrowed_books("123456")
+    assert len(loans) == 1 and isinstance(loans[0], Loan)
+    assert loans[0].title == "Dune" and loans[0].is_overdue is True
+    assert loans[0].to_dict()["due_date"] == now - timedelta(days=6)
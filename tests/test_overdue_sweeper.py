@@ -0,0 +1,161 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import services.library_service as svc
+from services import overdue_sweeper
+from services.event_log import event_log
+from services.overdue_sweeper import OverdueSweeper
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def overdue_notices(path=None):
+    event_log.flush()
+    with database.use_database(path):
+        conn = database.get_db_connection()
+        rows = conn.execute("SELECT patron_id, book_id FROM events WHERE type = 'loan_overdue' ORDER BY seq").fetchall()
+        conn.close()
+    return [tuple(row) for row in rows]
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "sweeper.db"))
+    database.init_database()
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    database.insert_book("Emma", "Jane Austen", "9780141439587", 3, 3)
+
+
+def test_loads_open_loans_once_and_wakes_at_earliest_due(db, monkeypatch):
+    start = datetime(2026, 1, 1, 12, 0)
+    database.insert_borrow_record("111111", 1, start - timedelta(days=10), start + timedelta(days=4))
+    database.insert_borrow_record("222222", 2, start - timedelta(days=10), start + timedelta(days=2))
+    sweeper = OverdueSweeper(clock=FakeClock(start), fee_calculator=lambda p, b: {"fee_amount": 0.5})
+    sweeper.load()
+
+    monkeypatch.setattr(database, "get_open_borrow_records",
+                        lambda: pytest.fail("sweeper must not rescan the table"))
+    assert sweeper.next_wake() == start + timedelta(days=2)
+    assert sweeper.run_pending() == 0
+
+
+def test_marks_overdue_records_notice_and_precomputes_fee(db):
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    due = clock.now + timedelta(days=1)
+    sweeper = OverdueSweeper(clock=clock, fee_calculator=lambda p, b: {"fee_amount": 0.25})
+    sweeper.track("111111", 1, due)
+
+    clock.now = due + timedelta(hours=1)
+    assert sweeper.run_pending() == 1
+    assert sweeper.get_precomputed_fee("111111", 1)["fee_amount"] == 0.25
+    assert overdue_notices() == [("111111", 1)]
+    assert sweeper.next_wake() == datetime(2026, 1, 3)  # the fee next changes at midnight
+
+    # Next day: the fee is refreshed but no second notice is sent
+    clock.now = datetime(2026, 1, 3, 0, 30)
+    assert sweeper.get_precomputed_fee("111111", 1) is None  # yesterday's fee is not served
+    assert sweeper.run_pending() == 1
+    assert sweeper.get_precomputed_fee("111111", 1)["days_overdue"] == 1
+    assert overdue_notices() == [("111111", 1)]
+
+
+def test_returned_loans_are_dropped(db):
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    sweeper = OverdueSweeper(clock=clock, fee_calculator=lambda p, b: {"fee_amount": 0.25})
+    sweeper.track("111111", 1, clock.now + timedelta(hours=1))
+    sweeper.untrack("111111", 1)
+    clock.now += timedelta(days=3)
+    assert sweeper.run_pending() == 0
+    assert sweeper.get_precomputed_fee("111111", 1) is None
+
+
+def test_service_events_reach_running_sweeper(db):
+    sweeper = overdue_sweeper.start_overdue_sweeper(OverdueSweeper(fee_calculator=lambda p, b: {}))
+    try:
+        ok, _ = svc.borrow_book_by_patron("333333", 1)
+        assert ok
+        assert sweeper.next_wake() > datetime.now() + timedelta(days=13)
+        svc.return_book_by_patron("333333", 1)
+        assert (database.database_path(), "333333", 1) not in sweeper._open
+    finally:
+        overdue_sweeper.stop_overdue_sweeper()
+
+
+def test_worker_thread_wakes_when_loan_comes_due(db):
+    sweeper = OverdueSweeper(fee_calculator=lambda p, b: {"fee_amount": 1.0})
+    sweeper.start()
+    try:
+        sweeper.track("444444", 2, datetime.now() + timedelta(milliseconds=50))
+        deadline = time.monotonic() + 2
+        while not overdue_notices() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert overdue_notices() == [("444444", 2)]
+    finally:
+        sweeper.stop()
+
+
+def test_loans_are_kept_per_database(db, tmp_path):
+    other = str(tmp_path / "other.db")
+    with database.use_database(other):
+        database.init_database()
+        database.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=20), now - timedelta(days=6))
+    with database.use_database(other):
+        database.insert_borrow_record("111111", 1, now - timedelta(days=16), now - timedelta(days=2))
+
+    sweeper = OverdueSweeper()
+    sweeper.load()
+    with database.use_database(other):
+        sweeper.load()
+    assert sweeper.run_pending() == 2
+
+    # Each fee was computed against its own file, off the request thread
+    assert sweeper.get_precomputed_fee("111111", 1)["days_overdue"] == 6
+    with database.use_database(other):
+        assert sweeper.get_precomputed_fee("111111", 1)["days_overdue"] == 2
+        assert overdue_notices(other) == [("111111", 1)]
+    assert overdue_notices() == [("111111", 1)]
+
+
+def test_status_report_reads_precomputed_fees(db, monkeypatch):
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=20), now - timedelta(days=6))
+    sweeper = OverdueSweeper(fee_calculator=lambda p, b: {"days_overdue": 6, "fee_amount": 1.23})
+    sweeper.load()
+    monkeypatch.setattr(overdue_sweeper, "_sweeper", sweeper)  # registered, but no worker thread
+
+    sweeper.run_pending()
+    assert svc.get_patron_status_report("111111")["total_late_fees"] == 1.23
+    overdue_sweeper.fee_paid("111111", 1)
+    assert sweeper.get_precomputed_fee("111111", 1) is None
+    assert svc.get_patron_status_report("111111")["total_late_fees"] == 3.0  # computed on read
+    assert sweeper.run_pending() == 1
+
+
+def test_changes_made_by_another_process_are_not_served_from_the_sweeper(db):
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    due = clock.now - timedelta(days=3)
+    database.insert_borrow_record("111111", 1, due - timedelta(days=14), due)
+    sweeper = OverdueSweeper(clock=clock, fee_calculator=lambda p, b: {"fee_amount": 1.5})
+    sweeper.load()
+    assert sweeper.run_pending() == 1
+    assert sweeper.get_precomputed_fee("111111", 1)["fee_amount"] == 1.5
+
+    # Another worker process takes the book back: this sweeper is never told
+    database.update_borrow_record_return_date("111111", 1, clock.now)
+    assert sweeper.get_precomputed_fee("111111", 1) is None
+
+    # At the next wake the loan is found closed and dropped instead of being re-priced daily
+    clock.now = datetime(2026, 1, 2, 0, 30)
+    assert sweeper.run_pending() == 0
+    assert sweeper.next_wake() is None and not sweeper.overdue
@@ -0,0 +1,133 @@
+import shutil
+
+import pytest
+from datetime import datetime, timedelta
+
+import database
+import services.library_service as svc
+from app import create_app
+from config import LibraryConfig
+from services.report_cache import PatronReportCache, patron_report_cache
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_hits_until_day_boundary():
+    clock = FakeClock(datetime(2026, 3, 1, 23, 0))
+    cache = PatronReportCache(clock=clock)
+    calls = []
+    compute = lambda pid: calls.append(pid) or {"patron_id": pid, "n": len(calls)}
+
+    assert cache.get_or_compute("123456", compute)["n"] == 1
+    clock.now = datetime(2026, 3, 1, 23, 59)
+    assert cache.get_or_compute("123456", compute)["n"] == 1
+    clock.now = datetime(2026, 3, 2, 0, 0)
+    assert cache.get_or_compute("123456", compute)["n"] == 2
+
+
+def test_invalidate_is_per_patron():
+    cache = PatronReportCache()
+    cache.put("111111", {"a": 1})
+    cache.put("222222", {"b": 2})
+    cache.invalidate("111111")
+    assert cache.get("111111") is None
+    assert cache.get("222222") == {"b": 2}
+
+
+def test_report_computed_before_invalidation_is_not_stored():
+    cache = PatronReportCache()
+
+    def compute(pid):
+        cache.invalidate(pid)  # an event lands while the report is being built
+        return {"stale": True}
+
+    assert cache.get_or_compute("123456", compute) == {"stale": True}
+    assert cache.get("123456") is None
+
+
+def test_cache_evicts_least_recently_used_and_forgets_finished_computations():
+    cache = PatronReportCache(max_entries=2)
+    for pid in ("111111", "222222"):
+        cache.get_or_compute(pid, lambda p: {"patron_id": p})
+    cache.get("111111")
+    cache.get_or_compute("333333", lambda p: {"patron_id": p})
+    cache.invalidate("444444")
+
+    assert cache.get("222222") is None
+    assert cache.get("111111") and cache.get("333333")
+    assert cache._computing == {}
+
+
+def test_report_cached_at_another_version_is_recomputed():
+    cache = PatronReportCache()
+    calls = []
+    compute = lambda pid: calls.append(pid) or {"n": len(calls)}
+    assert cache.get_or_compute("123456", compute, version=1)["n"] == 1
+    assert cache.get_or_compute("123456", compute, version=1)["n"] == 1
+    assert cache.get_or_compute("123456", compute, version=2)["n"] == 2
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "patron.db"))
+    patron_report_cache.clear()
+    app = create_app()
+    yield app.test_client()
+    patron_report_cache.clear()
+
+
+def test_patron_status_api_and_invalidation(client):
+    first = client.get("/api/patron/123456/status").get_json()
+    assert first["patron_id"] == "123456"
+    assert [b["book_title"] for b in first["borrowed_books"]] == ["1984"]
+
+    ok, _ = svc.borrow_book_by_patron("123456", 1)
+    assert ok
+    second = client.get("/api/patron/123456/status").get_json()
+    assert len(second["borrowed_books"]) == 2
+
+
+def test_changes_made_by_another_process_invalidate_the_report(client):
+    assert len(client.get("/api/patron/123456/status").get_json()["borrowed_books"]) == 1
+
+    # Another worker process writes straight to the file: this process's cache hears nothing
+    conn = database.get_db_connection()
+    conn.execute("UPDATE borrow_records SET return_date = ? WHERE patron_id = '123456'",
+                 (datetime.now().isoformat(),))
+    conn.commit()
+    conn.close()
+
+    report = client.get("/api/patron/123456/status").get_json()
+    assert [b["returned"] for b in report["borrowed_books"]] == [True]
+
+
+def test_patron_status_api_rejects_bad_id(client):
+    assert client.get("/api/patron/12ab/status").status_code == 400
+
+
+def test_patron_status_page(client):
+    page = client.get("/patron/123456").get_data(as_text=True)
+    assert "Patron 123456" in page and "1984" in page
+    assert client.get("/patron?patron_id=123456").status_code == 302
+
+
+def test_apps_on_different_databases_keep_separate_reports(template_database, tmp_path):
+    clients = []
+    for name in ("a.db", "b.db"):
+        path = str(tmp_path / name)
+        shutil.copyfile(template_database, path)
+        clients.append(create_app(LibraryConfig(database_path=path)).test_client())
+    a, b = clients
+
+    assert len(a.get("/api/patron/123456/status").get_json()["borrowed_books"]) == 1
+    assert len(b.get("/api/patron/123456/status").get_json()["borrowed_books"]) == 1
+    assert b.post("/api/borrow/batch", json={"patron_id": "123456", "book_ids": [1, 2]}).get_json()["success"]
+
+    assert len(b.get("/api/patron/123456/status").get_json()["borrowed_books"]) == 3
+    assert len(a.get("/api/patron/123456/status").get_json()["borrowed_books"]) == 1
@@ -0,0 +1,234 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import services.library_service as svc
+from services.payment_orchestrator import (
+    CircuitBreaker, CircuitOpenError, IdempotencyKeyReusedError, PaymentOrchestrator
+)
+
+
+class CountingGateway:
+    def __init__(self, failures=0, decline=False):
+        self.calls = []
+        self.failures = failures
+        self.decline = decline
+
+    def process_payment(self, patron_id, amount, description="", idempotency_key=None):
+        self.calls.append(idempotency_key)
+        if len(self.calls) <= self.failures:
+            raise TimeoutError("gateway timed out")
+        if self.decline:
+            return False, "", "Card declined"
+        return True, f"txn_{patron_id}_{len(self.calls)}", f"Payment of ${amount:.2f} processed successfully"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "payments.db"))
+    database.init_database()
+    database.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+
+
+def make(gateway, **kwargs):
+    sleeps = []
+    orchestrator = PaymentOrchestrator(lambda: gateway, sleep=sleeps.append, rand=lambda: 1.0, **kwargs)
+    return orchestrator, sleeps
+
+
+def test_retries_transient_errors_with_exponential_backoff(db):
+    gateway = CountingGateway(failures=2)
+    orchestrator, sleeps = make(gateway, base_delay=0.1, max_delay=0.15)
+
+    ok, txn, _ = orchestrator.process_payment("123456", 4.5, "Late fees")
+    assert ok and txn == "txn_123456_3"
+    assert sleeps == [0.1, 0.15]
+    # Every attempt carries the same gateway idempotency key
+    assert len(set(gateway.calls)) == 1
+
+
+def test_gives_up_after_max_attempts(db):
+    gateway = CountingGateway(failures=5)
+    orchestrator, _ = make(gateway, max_attempts=3)
+    with pytest.raises(TimeoutError):
+        orchestrator.process_payment("123456", 4.5, "Late fees")
+    assert len(gateway.calls) == 3
+
+
+def test_circuit_breaker_fails_fast_then_allows_a_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    gateway = CountingGateway(failures=2)
+    orchestrator, _ = make(gateway, max_attempts=2, breaker=breaker)
+
+    with pytest.raises(TimeoutError):
+        orchestrator.process_payment("123456", 4.5, "Late fees")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        orchestrator.process_payment("123456", 4.5, "Late fees")
+    assert len(gateway.calls) == 2
+
+    clock.now = 31
+    ok, _, _ = orchestrator.process_payment("123456", 4.5, "Late fees")
+    assert ok and breaker.state == CircuitBreaker.CLOSED
+
+
+def test_same_idempotency_key_charges_once(db):
+    gateway = CountingGateway()
+    orchestrator, _ = make(gateway)
+
+    first = orchestrator.process_payment("123456", 4.5, "Late fees", idempotency_key="k1")
+    second = orchestrator.process_payment("123456", 4.5, "Late fees", idempotency_key="k1")
+    assert first == second
+    assert len(gateway.calls) == 1
+
+    with pytest.raises(IdempotencyKeyReusedError):
+        orchestrator.process_payment("654321", 4.5, "Late fees", idempotency_key="k1")
+
+
+def test_declines_are_not_replayed(db):
+    gateway = CountingGateway(decline=True)
+    orchestrator, _ = make(gateway)
+    assert orchestrator.process_payment("123456", 4.5, "x", idempotency_key="k2")[0] is False
+    assert orchestrator.process_payment("123456", 4.5, "x", idempotency_key="k2")[0] is False
+    assert len(gateway.calls) == 2
+    assert database.get_payment_request("k2") is None
+
+
+def test_concurrent_duplicates_are_coalesced(db):
+    entered = []
+
+    class SlowGateway(CountingGateway):
+        def process_payment(self, *args, **kwargs):
+            # Hold the charge until every duplicate has been submitted
+            deadline = time.monotonic() + 5
+            while len(entered) < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            return super().process_payment(*args, **kwargs)
+
+    gateway = SlowGateway()
+    orchestrator, _ = make(gateway)
+    results = []
+
+    def submit():
+        entered.append(1)
+        results.append(orchestrator.process_payment("123456", 4.5, "Late fees for 'Dune'"))
+
+    threads = [threading.Thread(target=submit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(gateway.calls) == 1
+    assert len(results) == 4 and len(set(results)) == 1
+
+
+def test_pay_late_fees_replays_a_retried_request(db, monkeypatch):
+    now = datetime.now()
+    database.insert_borrow_record("123456", 1, now - timedelta(days=17), now - timedelta(days=3))
+    gateway = CountingGateway()
+    orchestrator, _ = make(gateway)
+    monkeypatch.setattr(svc, "payment_orchestrator", orchestrator)
+
+    first = svc.pay_late_fees("123456", 1, idempotency_key="retry-me")
+    again = svc.pay_late_fees("123456", 1, idempotency_key="retry-me")
+    assert first[0] is True and again == first
+    assert len(gateway.calls) == 1
+
+
+def test_api_passes_idempotency_key_header(db, monkeypatch):
+    from app import create_app
+
+    now = datetime.now()
+    database.insert_borrow_record("123456", 1, now - timedelta(days=17), now - timedelta(days=3))
+    gateway = CountingGateway()
+    orchestrator, _ = make(gateway)
+    monkeypatch.setattr(svc, "payment_orchestrator", orchestrator)
+    client = create_app().test_client()
+
+    for _ in range(2):
+        response = client.post("/api/late_fee/123456/1/pay", headers={"Idempotency-Key": "abc"})
+        assert response.status_code == 200
+    assert gateway.calls == ["abc"]
+
+
+def test_reused_key_is_rejected_for_another_patron(db, monkeypatch):
+    from app import create_app
+
+    database.insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    now = datetime.now()
+    database.insert_borrow_record("111111", 1, now - timedelta(days=17), now - timedelta(days=3))
+    database.insert_borrow_record("222222", 2, now - timedelta(days=17), now - timedelta(days=3))
+    gateway = CountingGateway()
+    orchestrator, _ = make(gateway)
+    monkeypatch.setattr(svc, "payment_orchestrator", orchestrator)
+
+    ok, _, txn = svc.pay_late_fees("111111", 1, idempotency_key="k1")
+    assert ok and txn == "txn_111111_1"
+
+    assert svc.pay_late_fees("abc", 99, idempotency_key="k1") == (
+        False, "Invalid patron ID. Must be exactly 6 digits.", None)
+    with pytest.raises(IdempotencyKeyReusedError):
+        svc.pay_late_fees("222222", 2, idempotency_key="k1")
+    with pytest.raises(IdempotencyKeyReusedError):
+        svc.pay_late_fees("111111", 2, idempotency_key="k1")
+
+    response = create_app().test_client().post("/api/late_fee/222222/2/pay", headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 409
+    assert response.get_json()["transaction_id"] is None
+    assert len(gateway.calls) == 1
+
+
+def test_reused_key_is_rejected_for_another_book_with_the_same_title(db, monkeypatch):
+    database.insert_book("Dune", "Frank Herbert", "9780441172719", 1, 1)
+    now = datetime.now()
+    for book_id in (1, 2):
+        database.insert_borrow_record("111111", book_id, now - timedelta(days=17), now - timedelta(days=3))
+    gateway = CountingGateway()
+    orchestrator, _ = make(gateway)
+    monkeypatch.setattr(svc, "payment_orchestrator", orchestrator)
+
+    assert svc.pay_late_fees("111111", 1, idempotency_key="k1")[0]
+    with pytest.raises(IdempotencyKeyReusedError):
+        svc.pay_late_fees("111111", 2, idempotency_key="k1")
+    assert len(gateway.calls) == 1
+    assert svc.pay_late_fees("111111", 2, idempotency_key="k2")[0]
+    assert len(gateway.calls) == 2
+
+
+def test_coalesced_duplicate_must_match_the_leader(db):
+    release = threading.Event()
+
+    class SlowGateway(CountingGateway):
+        def process_payment(self, *args, **kwargs):
+            release.wait(5)
+            return super().process_payment(*args, **kwargs)
+
+    gateway = SlowGateway()
+    orchestrator, _ = make(gateway)
+    leader = threading.Thread(target=orchestrator.process_payment,
+                              args=("111111", 4.5, "Late fees for 'Dune'", "k1", 1))
+    leader.start()
+    deadline = time.monotonic() + 5
+    while not orchestrator._in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(IdempotencyKeyReusedError):
+        orchestrator.process_payment("111111", 4.5, "Late fees for 'Dune'", idempotency_key="k1", book_id=2)
+    release.set()
+    leader.join()
+    assert len(gateway.calls) == 1
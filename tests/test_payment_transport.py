@@ -0,0 +1,87 @@
+import pytest
+
+from benchmarks.payment_stub_server import PaymentStubServer
+from services import payment_transport
+from services.payment_service import PaymentGateway
+from services.payment_transport import GatewayHTTPError, HTTPPaymentTransport
+
+
+@pytest.fixture
+def stub_gateway():
+    with PaymentStubServer() as server:
+        yield server
+
+
+@pytest.fixture
+def transport(stub_gateway):
+    transport = HTTPPaymentTransport(stub_gateway.url, "test_key_12345", pool_size=2)
+    yield transport
+    transport.close()
+
+
+def test_charges_reuse_one_kept_alive_connection(stub_gateway, transport):
+    gateway = PaymentGateway(transport=transport)
+    for _ in range(5):
+        ok, txn, message = gateway.process_payment("123456", 4.5, "Late fees")
+        assert ok and txn.startswith("txn_123456_")
+        assert message == "Payment of $4.50 processed successfully"
+
+    assert stub_gateway.connections == 1
+    metrics = transport.metrics()
+    assert metrics["requests"] == 5
+    assert metrics["connections_opened"] == 1
+    assert metrics["connections_idle"] == 1 and metrics["connections_in_use"] == 0
+    assert metrics["reuse_ratio"] == 0.8
+
+    transport.close()
+    assert transport.metrics()["connections_idle"] == 0
+
+
+def test_created_and_accepted_replies_count_as_success(stub_gateway, transport, monkeypatch):
+    gateway = PaymentGateway(transport=transport)
+    monkeypatch.setattr(stub_gateway, "charge", lambda body, key=None: (
+        201, {"id": "txn_123456_9", "status": "succeeded", "message": "Charged"}))
+    assert gateway.process_payment("123456", 4.5) == (True, "txn_123456_9", "Charged")
+
+    monkeypatch.setattr(stub_gateway, "refund", lambda body: (202, {"id": "refund_9", "status": "succeeded"}))
+    ok, message = gateway.refund_payment("txn_123456_9", 4.5)
+    assert ok and "refund_9" in message
+
+
+def test_declines_refunds_and_status_over_http(transport):
+    gateway = PaymentGateway(transport=transport)
+    assert gateway.process_payment("123456", 5000, "Too much") == (False, "", "Payment declined: amount exceeds limit")
+
+    ok, txn, _ = gateway.process_payment("123456", 3.0, "Late fees")
+    ok, message = gateway.refund_payment(txn, 3.0)
+    assert ok and "Refund of $3.00" in message
+    assert gateway.refund_payment("txn_unknown", 1.0) == (False, "Invalid transaction ID")
+
+    assert gateway.verify_payment_status(txn)["status"] == "completed"
+    assert gateway.verify_payment_status("txn_unknown")["status"] == "not_found"
+
+
+def test_idempotency_key_is_sent_to_the_gateway(transport):
+    gateway = PaymentGateway(transport=transport)
+    first = gateway.process_payment("123456", 4.5, "Late fees", idempotency_key="k1")
+    again = gateway.process_payment("123456", 4.5, "Late fees", idempotency_key="k1")
+    assert first == again
+
+
+def test_server_errors_raise_for_the_orchestrator_to_retry(stub_gateway, transport, monkeypatch):
+    monkeypatch.setattr(stub_gateway, "charge", lambda body, key=None: (503, {"message": "busy"}))
+    with pytest.raises(GatewayHTTPError):
+        PaymentGateway(transport=transport).process_payment("123456", 4.5)
+    assert transport.metrics()["errors"] == 1
+
+
+def test_gateway_url_from_environment_uses_shared_transport(stub_gateway, monkeypatch):
+    monkeypatch.setenv("PAYMENT_GATEWAY_URL", stub_gateway.url)
+    try:
+        first, second = PaymentGateway(), PaymentGateway()
+        assert first.transport is second.transport
+        assert first.process_payment("123456", 2.0)[0] is True
+        assert second.process_payment("654321", 2.0)[0] is True
+        assert stub_gateway.connections == 1
+    finally:
+        payment_transport.close_shared_transports()
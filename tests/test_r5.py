@@ -30,5 +30,5 @@ def test_r5_overdue_calc(monkeypatch):
     monkeypatch.setattr(database, "get_borrow_record", lambda pid, bid: {"due_date": due}, raising=False)
     stat = svc.calculate_late_fee_for_book("765432", 1)
     assert stat["days_overdue"] == 5
-    assert stat["fee_amount"] == 1.25
+    assert stat["fee_amount"] == 2.50
     assert "late fee has been calculated" in stat["status"].lower()
@@ -0,0 +1,56 @@
+import database
+import services.library_service as svc
+
+
+def add_books(*titles):
+    for i, title in enumerate(titles):
+        database.insert_book(title, f"Author {i}", f"{9990000000000 + i}", 1, 1)
+
+
+def test_exact_then_prefix_then_word_then_substring(library_db):
+    add_books("Fundune", "Children of Dune", "Dune Messiah", "Dune")
+    books, total = svc.search_books_ranked("DUNE", "title")
+    assert total == 4
+    assert [book["title"] for book in books] == ["Dune", "Dune Messiah", "Children of Dune", "Fundune"]
+
+
+def test_bm25_orders_within_a_tier(library_db, monkeypatch):
+    add_books("The Road", "The Road the Road the Road")
+    assert [book["title"] for book in svc.search_books_ranked("road", "title")[0]] == [
+        "The Road the Road the Road", "The Road"]
+
+    monkeypatch.setattr(database, "get_fts_scores", lambda terms, column: None)  # no FTS5 in this build
+    assert [book["title"] for book in svc.search_books_ranked("road", "title")[0]] == [
+        "The Road", "The Road the Road the Road"]
+
+
+def test_index_follows_title_changes(library_db):
+    assert set(database.get_fts_scores(["gats"], "title")) == {1}
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET title = 'Gatsby Returns' WHERE id = 2")
+    conn.execute("DELETE FROM books WHERE id = 1")
+    conn.commit()
+    conn.close()
+    assert set(database.get_fts_scores(["gats"], "title")) == {2}
+
+
+def test_pages_are_slices_of_the_full_ranking(library_db):
+    add_books(*(f"Volume {n} of the Saga" for n in range(25)))
+    everything, total = svc.search_books_ranked("saga", "title", limit=100)
+    pages = [svc.search_books_ranked("saga", "title", limit=10, offset=offset) for offset in (0, 10, 20)]
+    assert total == 25 and all(count == 25 for _, count in pages)
+    assert [book for page, _ in pages for book in page] == everything
+    assert svc.search_books_ranked("saga", "title", limit=10, offset=30) == ([], 25)
+
+
+def test_search_endpoints_page_through_results(library_app):
+    add_books(*(f"Volume {n} of the Saga" for n in range(25)))
+    client = library_app.test_client()
+
+    data = client.get("/api/search?q=saga&limit=10&offset=20").get_json()
+    assert (data["count"], data["limit"], data["offset"], len(data["results"])) == (25, 10, 20, 5)
+    assert client.get("/api/search?q=saga&limit=0").status_code == 400
+    assert client.get("/api/search?q=saga&offset=x").status_code == 400
+
+    page = client.get("/search?q=saga&limit=10").get_data(as_text=True)
+    assert "Showing 1&ndash;10 of 25" in page and "offset=10" in page
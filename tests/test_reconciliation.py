@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import database
+from services.reconciliation import PaymentReconciler, RateLimiter
+
+
+class LedgerGateway:
+    """Gateway whose records mostly agree with the local ledger."""
+
+    def __init__(self, records, delay=0.0):
+        self.records = records
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def verify_payment_status(self, transaction_id):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if transaction_id == "txn_boom":
+            raise ConnectionError("gateway unreachable")
+        return self.records.get(transaction_id, {"status": "not_found", "message": "Transaction not found"})
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "reconcile.db"))
+    database.init_database()
+
+
+def pay(txn, amount, record_id):
+    today = datetime.now().date().isoformat()
+    assert database.record_fee_payment(txn, record_id, "123456", 1, amount, 3, amount, today)
+
+
+def test_verifies_concurrently_and_reports_mismatches(db):
+    for i in range(6):
+        pay(f"txn_ok_{i}", 1.5, i + 1)
+    pay("txn_short", 4.0, 10)
+    pay("txn_lost", 2.0, 11)
+    pay("txn_boom", 2.0, 12)
+    records = {f"txn_ok_{i}": {"status": "completed", "amount": 1.5} for i in range(6)}
+    records["txn_short"] = {"status": "completed", "amount": 3.0}
+    gateway = LedgerGateway(records, delay=0.05)
+
+    report = PaymentReconciler(lambda: gateway, max_workers=4, rate_per_second=1000).reconcile()
+
+    assert report["checked"] == 9
+    assert report["verified"] == 8
+    assert {m["transaction_id"]: m["issue"] for m in report["mismatches"]} == {
+        "txn_short": "amount_mismatch", "txn_lost": "missing_at_gateway"}
+    assert report["errors"] == [{"transaction_id": "txn_boom", "error": "gateway unreachable"}]
+    assert gateway.max_in_flight > 1
+
+    # Results were written back; only the errored payment is still outstanding
+    assert [p["transaction_id"] for p in database.get_unverified_fee_payments()] == ["txn_boom"]
+    assert database.get_fee_payment("txn_short")["mismatch"] == "amount_mismatch"
+    assert database.get_fee_payment("txn_ok_0")["gateway_status"] == "completed"
+
+
+def test_only_the_requested_day_is_checked(db):
+    pay("txn_today", 1.5, 1)
+    gateway = LedgerGateway({"txn_today": {"status": "completed", "amount": 1.5}})
+    assert PaymentReconciler(lambda: gateway).reconcile("2000-01-01")["checked"] == 0
+    assert PaymentReconciler(lambda: gateway).reconcile(datetime.now().date().isoformat())["checked"] == 1
+
+
+def test_rate_limiter_spaces_out_calls():
+    now = [0.0]
+    calls = []
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    limiter = RateLimiter(rate=10, burst=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        limiter.acquire()
+        calls.append(now[0])
+
+    assert calls[:2] == [0.0, 0.0]
+    assert calls[-1] == pytest.approx(0.3)
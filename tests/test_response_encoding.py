@@ -0,0 +1,67 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import database
+import http_encoding
+from asgi import create_asgi_app
+from tests.test_asgi_mode import call
+
+
+@pytest.fixture
+def client(library_app):
+    for i in range(60):
+        database.insert_book(f"The Long Title Number {i}", "Author", f"{i:013d}", 2, 2)
+    return library_app.test_client()
+
+
+def test_large_search_is_gzipped_when_accepted(client):
+    plain = client.get("/api/search?q=long")
+    assert "Content-Encoding" not in plain.headers and plain.headers["Vary"] == "Accept-Encoding"
+
+    packed = client.get("/api/search?q=long", headers={"Accept-Encoding": "gzip, deflate"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert len(packed.data) < len(plain.data) / 4
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+
+    small = client.get("/api/search?q=gatsby", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers  # below compression_min_bytes
+
+
+def test_fields_projection(client):
+    data = client.get("/api/search?q=long&fields=id,title").get_json()
+    assert data["count"] == 60
+    assert data["results"][0] == {"id": 4, "title": "The Long Title Number 0"}
+
+    bad = client.get("/api/search?q=long&fields=id,price")
+    assert bad.status_code == 400 and "price" in bad.get_json()["error"]
+
+
+def test_async_search_is_projected_and_compressed(library_app, client):
+    asgi = create_asgi_app(library_app)
+    status, body = call(asgi, "GET", "/api/search", b"q=long&fields=isbn")
+    assert status == 200 and json.loads(body)["results"][0] == {"isbn": "0000000000000"}
+
+    plain = call(asgi, "GET", "/api/search", b"q=long")[1]
+    assert gzip.decompress(call(asgi, "GET", "/api/search", b"q=long", headers=[(b"accept-encoding", b"gzip")])[1]) == plain
+
+
+def test_encoding_negotiation(monkeypatch):
+    monkeypatch.setattr(http_encoding, "brotli", None)
+    assert http_encoding.choose_encoding("gzip;q=0.5, identity") == "gzip"
+    assert http_encoding.choose_encoding("*, gzip;q=0") is None
+    assert http_encoding.choose_encoding("identity") is None
+    assert http_encoding.choose_encoding(None) is None
+    monkeypatch.setattr(http_encoding, "brotli", object())
+    assert http_encoding.choose_encoding("gzip, br") == "br"
+    assert http_encoding.choose_encoding("gzip, br;q=0.2") == "gzip"
+
+
+def test_fast_json_matches_flask_output(library_app, monkeypatch):
+    payload = {"b": [1, 2.5, None], "a": {"due": datetime(2024, 1, 2, 3, 4, 5)}, "big": 2 ** 70}
+    fast = json.loads(library_app.json.dumps(payload))
+    monkeypatch.setattr(http_encoding, "orjson", None)
+    assert fast == json.loads(library_app.json.dumps(payload))
+    assert fast["a"]["due"] == "Tue, 02 Jan 2024 03:04:05 GMT"
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+import database
+import services.library_service as svc
+from services.search_query import BooleanQuery, QueryError, Term, evaluate, parse_query
+
+
+def titles(books):
+    return sorted(book["title"] for book in books)
+
+
+def test_parse_fields_phrases_and_precedence():
+    assert parse_query("author:orwell title:1984") == BooleanQuery(
+        "AND", (Term("author", ("orwell",)), Term("title", ("1984",))))
+    assert parse_query('gatsby OR (Author:"harper lee" AND isbn:978-0061)') == BooleanQuery("OR", (
+        Term(None, ("gatsby",)),
+        BooleanQuery("AND", (Term("author", ("harper", "lee")), Term("isbn", ("9780061",)))),
+    ))
+    assert parse_query("Star Wars: re:zero") == BooleanQuery(
+        "AND", (Term(None, ("star",)), Term(None, ("wars",)), Term(None, ("re", "zero"))))
+
+
+@pytest.mark.parametrize("query", ["", "orwell OR", "(orwell", "orwell )", "AND 1984", "title:!!!"])
+def test_malformed_queries(query):
+    with pytest.raises(QueryError):
+        parse_query(query)
+
+
+def test_queries_against_the_sample_catalog(library_db):
+    assert titles(svc.search_books_by_query("orwell 1984")[0]) == ["1984"]
+    assert titles(svc.search_books_by_query("author:orwell title:gatsby")[0]) == []
+    assert titles(svc.search_books_by_query("author:orw OR title:mock")[0]) == ["1984", "To Kill a Mockingbird"]
+    assert titles(svc.search_books_by_query('title:"great gats" OR isbn:9780451')[0]) == ["1984", "The Great Gatsby"]
+    assert titles(svc.search_books_by_query("isbn:978 fitzgerald")[0]) == ["The Great Gatsby"]
+    assert svc.search_books_ranked("harper", "query") == svc.search_books_by_query("harper")
+
+
+def test_index_path_matches_a_catalog_scan(library_db, monkeypatch):
+    rng = random.Random(7)
+    words = ["red", "blue", "river", "night", "garden", "stone", "winter", "house"]
+    authors = ["Ann Lee", "Bo Orwell", "Cy Stone", "Di River"]
+    for i in range(300):
+        database.insert_book(" ".join(rng.sample(words, 3)).title(), rng.choice(authors), f"97{i:011d}", 1, 1)
+
+    queries = ["river stone", "author:lee OR title:winter", "(title:red OR title:blue) author:stone",
+               'title:"night garden" OR isbn:9700000000', "isbn:97000000001 OR author:orwell garden"]
+    indexed = {query: svc.search_books_by_query(query, limit=1000) for query in queries}
+    assert evaluate(parse_query("river stone")) is not None
+
+    monkeypatch.setattr(database, "get_fts_matches", lambda expression: None)  # SQLite without FTS5
+    for query in queries:
+        books, total = svc.search_books_by_query(query, limit=1000)
+        assert total == indexed[query][1] > 0
+        assert sorted(book["id"] for book in books) == sorted(book["id"] for book in indexed[query][0])
+
+
+def test_query_search_over_http(library_app):
+    client = library_app.test_client()
+    data = client.get("/api/search", query_string={"type": "query", "q": "author:orwell title:1984"}).get_json()
+    assert [book["title"] for book in data["results"]] == ["1984"] and data["count"] == 1
+
+    bad = client.get("/api/search", query_string={"type": "query", "q": "(orwell"})
+    assert bad.status_code == 400 and bad.get_json()["error"] == "Missing ')'"
+    assert "Missing &#39;)&#39;" in client.get("/search?type=query&q=(orwell").get_data(as_text=True)
@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+from datetime import datetime, timedelta
+
+import database
+import services.library_service as svc
+from models import Book
+from storage import MemoryStorage, SQLiteStorage, memory_storage
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, monkeypatch, tmp_path):
+    if request.param == "sqlite":
+        monkeypatch.setattr(database, "DATABASE", str(tmp_path / "conformance.db"))
+        database.init_database()
+        return SQLiteStorage()
+    return MemoryStorage()
+
+
+def test_insert_and_lookup_book(store):
+    assert store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3) is True
+    book = store.get_book_by_isbn("9780441013593")
+    assert book["title"] == "Dune" and book["available_copies"] == 3
+    assert store.get_book_by_id(book["id"]) == book
+    assert store.get_book_by_id(999) is None
+    assert store.get_book_by_isbn("0000000000000") is None
+
+
+def test_duplicate_isbn_rejected(store):
+    assert store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3) is True
+    assert store.insert_book("Dune II", "Frank Herbert", "9780441013593", 1, 1) is False
+
+
+def test_all_books_ordered_by_title(store):
+    store.insert_book("Middlemarch", "George Eliot", "1111111111111", 1, 1)
+    store.insert_book("Beloved", "Toni Morrison", "2222222222222", 1, 1)
+    store.insert_book("Ulysses", "James Joyce", "3333333333333", 1, 1)
+    titles = [b["title"] for b in store.get_all_books()]
+    assert titles == ["Beloved", "Middlemarch", "Ulysses"]
+
+
+def test_returned_rows_are_copies(store):
+    store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    book = store.get_all_books()[0]
+    book.available_copies = 0
+    assert store.get_book_by_id(book["id"])["available_copies"] == 3
+
+
+def test_availability_update(store):
+    store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    book_id = store.get_book_by_isbn("9780441013593")["id"]
+    assert store.update_book_availability(book_id, -1) is True
+    assert store.get_book_by_id(book_id)["available_copies"] == 2
+
+
+def test_borrow_and_return_cycle(store):
+    store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    book_id = store.get_book_by_isbn("9780441013593")["id"]
+    now = datetime.now()
+    assert store.insert_borrow_record("123456", book_id, now - timedelta(days=20), now - timedelta(days=6))
+
+    assert store.get_patron_borrow_count("123456") == 1
+    borrowed = store.get_patron_borrowed_books("123456")
+    assert len(borrowed) == 1
+    assert borrowed[0]["title"] == "Dune" and borrowed[0]["is_overdue"] is True
+
+    record = store.get_borrow_record("123456", book_id)
+    assert record["due_date"] == now - timedelta(days=6)
+    assert record["return_date"] is None
+
+    assert store.update_borrow_record_return_date("123456", book_id, now) is True
+    assert store.get_patron_borrow_count("123456") == 0
+    assert store.get_patron_borrowed_books("123456") == []
+    assert store.get_borrow_record("123456", book_id) is None
+
+    history = store.get_borrow_records_by_patron("123456")
+    assert len(history) == 1
+    assert history[0]["isbn"] == "9780441013593" and history[0]["return_date"] == now
+
+
+def test_loans_are_per_patron(store):
+    store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    book_id = store.get_book_by_isbn("9780441013593")["id"]
+    now = datetime.now()
+    store.insert_borrow_record("111111", book_id, now, now + timedelta(days=14))
+    assert store.get_patron_borrow_count("222222") == 0
+    assert store.get_borrow_records_by_patron("222222") == []
+
+
+def test_service_layer_runs_on_memory_storage():
+    svc.use_storage(MemoryStorage())
+    try:
+        ok, _ = svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 1)
+        assert ok
+        book_id = svc.get_book_by_isbn("9780441013593")["id"]
+        ok, message = svc.borrow_book_by_patron("123456", book_id)
+        assert ok and "due date" in message.lower()
+        ok, message = svc.borrow_book_by_patron("654321", book_id)
+        assert not ok and "not available" in message.lower()
+        ok, _ = svc.return_book_by_patron("123456", book_id)
+        assert ok and svc.get_book_by_id(book_id)["available_copies"] == 1
+    finally:
+        svc.use_storage(None)
+
+
+def test_bulk_lookup_by_ids(store):
+    store.insert_book("Dune", "Frank Herbert", "9780441013593", 3, 3)
+    store.insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    dune = store.get_book_by_isbn("9780441013593")
+    books = store.get_books_by_ids([dune.id, 999, dune.id])
+    assert list(books) == [dune.id] and books[dune.id] == dune
+    assert store.get_books_by_ids([]) == {}
+
+
+def test_sqlite_storage_keeps_holds_and_full_text_search(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "features.db"))
+    database.init_database()
+    svc.use_storage(SQLiteStorage())
+    try:
+        assert svc._sqlite_backed("get_all_books", "get_book_by_id")
+        svc.add_book_to_catalog("Dune", "Frank Herbert", "9780441013593", 1)
+        book_id = svc.get_book_by_isbn("9780441013593")["id"]
+        assert svc.borrow_book_by_patron("111111", book_id)[0]
+        hold = svc.place_hold("222222", book_id)[2]
+        assert svc.return_book_by_patron("111111", book_id)[0]
+        assert svc.get_hold_status(hold["id"])["status"] == "ready"
+
+        assert svc.borrow_book_by_patron("222222", book_id)[0]
+        assert svc.get_hold_status(hold["id"])["status"] == "fulfilled"
+        assert [b["title"] for b in svc.search_books_by_query("author:herbert")[0]] == ["Dune"]
+    finally:
+        svc.use_storage(None)
+
+    svc.use_storage(MemoryStorage())
+    try:
+        assert not svc._sqlite_backed("get_all_books")
+    finally:
+        svc.use_storage(None)
+
+
+def test_memory_storage_is_safe_to_share_between_threads(monkeypatch):
+    def slow_book(*args):
+        time.sleep(0.01)  # widen the gap between the ISBN check and the insert
+        return Book(*args)
+
+    monkeypatch.setattr(memory_storage, "Book", slow_book)
+    store = MemoryStorage()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        store.insert_book("Dune", "Frank Herbert", "9780441013593", 1, 1))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+    assert [book.id for book in store.get_all_books()] == [1]
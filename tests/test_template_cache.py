@@ -0,0 +1,51 @@
+import os
+
+from app import create_app
+from config import LibraryConfig
+from services import template_cache
+
+TEMPLATES = ["add_book.html", "base.html", "catalog.html", "patron_status.html", "return_book.html", "search.html"]
+
+
+def make_app(tmp_path, cache_dir, **options):
+    return create_app(LibraryConfig(database_path=str(tmp_path / "library.db"), template_cache_dir=cache_dir, **options))
+
+
+def test_build_fills_the_cache_the_app_loads_from(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "jinja")
+    assert template_cache.build_template_cache(cache_dir) == TEMPLATES
+    assert len(os.listdir(cache_dir)) == len(TEMPLATES)
+
+    app = make_app(tmp_path, cache_dir, precompile_templates=False)
+    compiled = []
+    original = app.jinja_env.compile
+    monkeypatch.setattr(app.jinja_env, "compile", lambda *a, **k: compiled.append(a) or original(*a, **k))
+    assert app.test_client().get("/catalog").status_code == 200
+    assert compiled == []  # loaded from bytecode, not parsed
+
+    template_cache.clear_template_cache(cache_dir)
+    assert os.listdir(cache_dir) == []
+
+
+def test_create_app_compiles_every_template_up_front(tmp_path):
+    app = make_app(tmp_path, "", precompile_templates=True)
+    assert app.jinja_env.bytecode_cache is None
+    assert set(TEMPLATES) <= {name for (_, name) in app.jinja_env.cache.keys()}
+
+
+def test_unwritable_cache_never_fails_a_render(tmp_path):
+    blocked = tmp_path / "file"
+    blocked.write_text("not a directory")
+    app = make_app(tmp_path, str(blocked / "jinja"), precompile_templates=False)
+    assert app.jinja_env.bytecode_cache is None
+    assert app.test_client().get("/add_book").status_code == 200
+
+    cache_dir = tmp_path / "jinja"
+    app = make_app(tmp_path, str(cache_dir), precompile_templates=False)
+    cache_dir.rmdir()  # e.g. cleared by another deploy step
+    assert app.test_client().get("/return").status_code == 200
+
+
+def test_precompile_setting_from_environment():
+    assert LibraryConfig.from_env({"LIBRARY_PRECOMPILE_TEMPLATES": "no"}).precompile_templates is False
+    assert LibraryConfig.from_env({"LIBRARY_TEMPLATE_CACHE_DIR": ""}).template_cache_dir == ""